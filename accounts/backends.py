@@ -0,0 +1,43 @@
+"""Chargement de l'utilisateur de la session depuis le cache
+
+Le backend d'authentification par défaut relit l'utilisateur en base à
+chaque requête. Ici l'utilisateur est mis en cache avec son profil (une
+seule requête select_related au premier accès), puis relu du cache tant
+qu'il ne change pas: toute écriture sur User ou UserProfile supprime
+l'entrée (voir accounts.signals). Le cache doit être partagé entre les
+workers (REQUEST_CACHE n'est accepté qu'avec Redis): sinon une désactivation
+ou un changement de mot de passe ne seraient vus que d'un seul worker.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+USER_CACHE_KEY = 'accounts:user:{user_id}'
+
+
+def load_user(user_id):
+    """Utilisateur et profil, depuis le cache ou en une requête (None s'il n'existe pas)"""
+    key = USER_CACHE_KEY.format(user_id=user_id)
+    user = cache.get(key)
+    if user is None:
+        UserModel = get_user_model()
+        user = UserModel._default_manager.select_related('profile').filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user)
+    return user
+
+
+def invalidate_user(user_id):
+    key = USER_CACHE_KEY.format(user_id=user_id)
+    cache.delete(key)
+    # Une requête concurrente a pu remettre en cache l'état d'avant le commit
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend dont get_user lit l'utilisateur de la session depuis le cache"""
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
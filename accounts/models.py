@@ -28,5 +28,34 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Profil de {self.user.username}"
 
+    # Champs dont la modification justifie une écriture
+    TRACKED_FIELDS = ['currency', 'monthly_income_goal', 'monthly_savings_goal', 'avatar']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_dirty_fields(self):
+        """Champs suivis modifiés depuis le chargement (tous pour un profil non chargé de la base)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return list(self.TRACKED_FIELDS)
+        return [
+            name for name in self.TRACKED_FIELDS
+            if name in loaded and getattr(self, name) != loaded[name]
+        ]
+
+    def save(self, *args, **kwargs):
+        """N'écrit que les champs modifiés; un profil inchangé n'est pas réenregistré"""
+        if not self._state.adding and kwargs.get('update_fields') is None and hasattr(self, '_loaded_values'):
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + ['updated_at']
+        super().save(*args, **kwargs)
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
 
 
@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from .backends import invalidate_user
 from .models import UserProfile
 
 # Crée automatiquement un UserProfile pour chaque nouvel utilisateur
@@ -9,8 +10,21 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.get_or_create(user=instance)
 
-# Sauvegarde le UserProfile à chaque sauvegarde de User
+# Sauvegarde le UserProfile déjà chargé avec le User, seulement s'il a été modifié
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+def save_user_profile(sender, instance, created, **kwargs):
+    if not created and User.profile.is_cached(instance):
+        profile = getattr(instance, 'profile', None)
+        if profile is not None and profile.get_dirty_fields():
+            profile.save()
+
+# Retire du cache l'utilisateur de la session après toute modification
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
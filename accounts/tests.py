@@ -1,3 +1,108 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.benchmarks import BENCHMARK_SETTINGS
+from .models import UserProfile
+
+AUTH_TABLES = ('django_session', 'auth_user', 'accounts_userprofile')
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=['accounts.backends.CachedModelBackend'],
+    **BENCHMARK_SETTINGS,
+)
+class RequestPathTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('session', password='secret-password')
+
+    def auth_queries(self, queries):
+        return [query['sql'] for query in queries if any(table in query['sql'] for table in AUTH_TABLES)]
+
+    def test_warm_requests_skip_session_and_user_queries(self):
+        with CaptureQueriesContext(connection) as login:
+            self.client.post(reverse('accounts:login'), {'username': 'session', 'password': 'secret-password'})
+        # Connexion: last_login est écrit, le profil inchangé ne l'est pas
+        self.assertFalse([sql for sql in login.captured_queries if sql['sql'].startswith('UPDATE "accounts_userprofile"')])
+
+        self.client.get(reverse('accounts:profile'))
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(self.client.get(reverse('accounts:profile')).status_code, 200)
+        self.assertEqual(self.auth_queries(warm.captured_queries), [])
+
+        # Une modification du profil invalide l'utilisateur en cache
+        self.client.post(reverse('accounts:profile'), {'currency': 'USD', 'email': 'session@example.com'})
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.context['user'].profile.currency, 'USD')
+
+    def login(self):
+        client = Client()
+        client.post(reverse('accounts:login'), {'username': 'session', 'password': 'secret-password'})
+        # Session et utilisateur en cache
+        self.assertEqual(client.get(reverse('accounts:profile')).status_code, 200)
+        return client
+
+    def assertLoggedOut(self, client):
+        response = client.get(reverse('accounts:profile'))
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={reverse('accounts:profile')}")
+
+    def replay_session(self, client):
+        replay = Client()
+        replay.cookies[settings.SESSION_COOKIE_NAME] = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return replay
+
+    def test_logout_is_not_served_from_cache(self):
+        client = self.login()
+        replay = self.replay_session(client)
+        client.get(reverse('accounts:logout'))
+        self.assertLoggedOut(replay)
+
+    def test_password_change_is_not_served_from_cache(self):
+        client = self.login()
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertLoggedOut(client)
+
+    def test_deactivation_is_not_served_from_cache(self):
+        client = self.login()
+        self.user.is_active = False
+        self.user.save()
+        self.assertLoggedOut(client)
+
+    def setup_django(self, **environ):
+        # Les réglages sont lus au démarrage: on les charge dans un autre processus
+        return subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup()'],
+            cwd=settings.BASE_DIR, env={**os.environ, **environ}, capture_output=True, text=True,
+        )
+
+    def test_request_cache_requires_shared_cache(self):
+        result = self.setup_django(REQUEST_CACHE='True', CACHE_BACKEND='locmem', REDIS_URL='')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured', result.stderr)
+
+        result = self.setup_django(REQUEST_CACHE='True', CACHE_BACKEND='redis', REDIS_URL='redis://localhost:6379/0')
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_profile_writes_only_changed_fields(self):
+        profile = UserProfile.objects.get(user=self.user)
+        with CaptureQueriesContext(connection) as unchanged:
+            profile.save()
+            self.user.save()
+        self.assertFalse([query for query in unchanged.captured_queries if 'accounts_userprofile' in query['sql']])
+
+        profile.monthly_savings_goal = Decimal('200.00')
+        with CaptureQueriesContext(connection) as changed:
+            profile.save()
+        [update] = [query['sql'] for query in changed.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertIn('"monthly_savings_goal"', update)
+        self.assertNotIn('"currency"', update)
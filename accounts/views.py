@@ -56,8 +56,11 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     """Vue du profil utilisateur"""
-    # Crée le profil si il n'existe pas
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Profil chargé avec l'utilisateur; créé s'il n'existe pas
+    try:
+        profile = request.user.profile
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(user=request.user)
 
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
@@ -1,27 +1,216 @@
-from django.contrib import admin
-from .models import Category, Transaction, Budget
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.template.response import TemplateResponse
+from .budgets import evaluate_budgets
+from .caching import bump_data_version
+from .ledger import rebuild_balance_checkpoints
+from .models import (Category, Transaction, RecurringTransaction, Budget, BudgetAlert, MonthlySummary, BalanceCheckpoint,
+                     ExchangeRate, CategoryForecast, SpendingAnomaly)
+from .pagination import EstimatedCountPaginator
+from .rollups import rebuild_monthly_summaries
+from .search import search_transactions
+from .sharding import current_database
+
+# Au-delà, un filtre de la barre latérale ne liste plus les objets liés
+FILTER_CHOICES_LIMIT = 50
+
+
+class LazyRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """Filtre sur une relation qui n'énumère pas toute la table liée.
+
+    Au-delà de FILTER_CHOICES_LIMIT objets, seul l'objet sélectionné est
+    proposé: on en choisit un autre par la recherche ou l'URL.
+    """
+
+    def choices_scope(self, request):
+        """Restriction (dictionnaire de filtres) des objets liés proposés"""
+        return {}
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        scope = self.choices_scope(request)
+        related = field.remote_field.model._default_manager.filter(**scope)
+        if related[:FILTER_CHOICES_LIMIT + 1].count() > FILTER_CHOICES_LIMIT:
+            scope = {'pk__in': [value for value in self.lookup_val or [] if value.isdigit()]}
+        return field.get_choices(include_blank=False, ordering=ordering, limit_choices_to=scope)
+
+
+class CategoryListFilter(LazyRelatedFieldListFilter):
+    """Catégories de l'utilisateur sélectionné seulement"""
+
+    def choices_scope(self, request):
+        user_id = request.GET.get('user__id__exact', '')
+        return {'user_id': user_id} if user_id.isdigit() else {}
+
+
+def refresh_derived_data(user_ids):
+    """Recalcule synthèses, soldes et budgets des utilisateurs touchés par une action groupée"""
+    user_ids = sorted(user_ids)
+    if not user_ids:
+        return
+    rebuild_monthly_summaries(user_ids)
+    rebuild_balance_checkpoints(user_ids)
+    evaluate_budgets(Budget.objects.filter(user_id__in=user_ids))
+    for user_id in user_ids:
+        bump_data_version(user_id)
+
+
+class TransactionActionForm(helpers.ActionForm):
+    category = forms.IntegerField(required=False, min_value=1, label='Catégorie (id)')
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'type', 'icon', 'color', 'user', 'created_at']
-    list_filter = ['type', 'user']
+    list_filter = ['type', ('user', LazyRelatedFieldListFilter)]
+    list_select_related = ['user']
     search_fields = ['name', 'user__username']
     ordering = ['type', 'name']
+    show_full_result_count = False
 
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['date', 'type', 'category', 'amount', 'user', 'description']
-    list_filter = ['type', 'category', 'date', 'user']
+    """Transactions de tous les utilisateurs, conçue pour des millions de lignes.
+
+    Une seule requête par page (catégorie et utilisateur en jointure), un
+    nombre de résultats estimé au lieu d'un COUNT(*) complet, des filtres
+    qui n'énumèrent ni les utilisateurs ni les catégories, et des actions
+    groupées en une seule instruction UPDATE ou DELETE suivie d'un recalcul
+    des données dérivées des utilisateurs concernés.
+    """
+    list_display = ['date', 'type', 'category', 'amount', 'currency', 'user', 'description']
+    list_filter = ['type', 'currency', ('category', CategoryListFilter), 'date', ('user', LazyRelatedFieldListFilter)]
+    list_select_related = ['category', 'user']
     search_fields = ['description', 'user__username']
-    date_hierarchy = 'date'
+    search_help_text = 'Mots de la description, ou nom d’utilisateur exact'
+    autocomplete_fields = ['user', 'category']
     ordering = ['-date', '-created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    action_form = TransactionActionForm
+    actions = ['recategorize', 'delete_transactions']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Index plein texte pour la description, égalité exacte (indexée) pour l'utilisateur
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matches = search_transactions(queryset, search_term) | queryset.filter(user__username=search_term)
+        return matches, False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Remplacée par delete_transactions: delete_selected charge et supprime les lignes une à une
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Changer la catégorie (id ci-dessus) des transactions sélectionnées', permissions=['change'])
+    def recategorize(self, request, queryset):
+        category_id = request.POST.get('category', '')
+        category = Category.objects.filter(pk=category_id).first() if category_id.isdigit() else None
+        if category is None:
+            self.message_user(request, 'Indiquez l’identifiant d’une catégorie existante.', messages.ERROR)
+            return
+        with transaction.atomic(using=current_database()):
+            # Seules les transactions du propriétaire de la catégorie, de même type, sont modifiées
+            updated = queryset.filter(user_id=category.user_id, type=category.type).update(category=category)
+            refresh_derived_data([category.user_id] if updated else [])
+        self.message_user(request, f'✓ {updated} transaction(s) déplacée(s) vers {category.name}.', messages.SUCCESS)
+
+    @admin.action(description='Supprimer les transactions sélectionnées', permissions=['delete'])
+    def delete_transactions(self, request, queryset):
+        queryset = queryset.order_by().select_related(None)
+        if request.POST.get('post') != 'yes':
+            summary = queryset.aggregate(count=Count('pk'), users=Count('user_id', distinct=True), total=Sum('amount'))
+            return TemplateResponse(request, 'admin/core/transaction/delete_selected_confirmation.html', {
+                **self.admin_site.each_context(request),
+                'title': 'Supprimer les transactions sélectionnées',
+                'opts': self.model._meta,
+                'summary': summary,
+                'select_across': request.POST.get('select_across') == '1',
+                'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            })
+        with transaction.atomic(using=current_database()):
+            user_ids = set(queryset.values_list('user_id', flat=True).distinct())
+            # Suppression SQL directe, sans chargement des lignes ni signal par ligne.
+            # Elle remplace post_delete: la seule cascade (SpendingAnomaly) est
+            # supprimée ici, l'index de recherche suit par trigger, et
+            # refresh_derived_data reconstruit synthèses, soldes, budgets et
+            # version des données des utilisateurs touchés, dans la même transaction.
+            anomalies = SpendingAnomaly.objects.filter(transaction__in=queryset.values('pk'))
+            anomalies._raw_delete(anomalies.db)
+            deleted = queryset._raw_delete(queryset.db)
+            refresh_derived_data(user_ids)
+        self.message_user(request, f'✓ {deleted} transaction(s) supprimée(s).', messages.SUCCESS)
+
+
+@admin.register(RecurringTransaction)
+class RecurringTransactionAdmin(admin.ModelAdmin):
+    list_display = ['description', 'type', 'category', 'amount', 'currency', 'frequency', 'interval', 'next_date', 'is_active', 'user']
+    list_filter = ['is_active', 'frequency', 'type']
+    search_fields = ['description', 'user__username']
+    readonly_fields = ['next_date']
+    ordering = ['next_date']
 
 
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
-    list_display = ['category', 'period', 'amount', 'alert_threshold', 'user']
-    list_filter = ['period', 'user', 'category']
+    list_display = ['category', 'period', 'amount', 'alert_threshold', 'spent_amount', 'percentage_used', 'alert_state', 'user']
+    list_filter = ['alert_state', 'period', 'user', 'category']
     search_fields = ['category__name', 'user__username']
+    readonly_fields = ['spent_amount', 'percentage_used', 'alert_state', 'evaluated_at']
     ordering = ['-period']
+
+
+@admin.register(BudgetAlert)
+class BudgetAlertAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'budget', 'previous_state', 'state', 'percentage', 'user']
+    list_filter = ['state', 'created_at']
+    search_fields = ['budget__category__name', 'user__username']
+    ordering = ['-created_at']
+
+
+@admin.register(MonthlySummary)
+class MonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = ['month', 'type', 'category', 'total', 'currency', 'count', 'user']
+    list_filter = ['type', 'month']
+    search_fields = ['user__username', 'category__name']
+    ordering = ['-month']
+
+
+@admin.register(BalanceCheckpoint)
+class BalanceCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['month', 'currency', 'net', 'balance', 'user']
+    list_filter = ['month']
+    search_fields = ['user__username']
+    ordering = ['-month']
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['date', 'base', 'quote', 'rate']
+    list_filter = ['base', 'quote']
+    date_hierarchy = 'date'
+    ordering = ['-date', 'base', 'quote']
+
+
+@admin.register(CategoryForecast)
+class CategoryForecastAdmin(admin.ModelAdmin):
+    list_display = ['month', 'category', 'spent', 'projected', 'currency', 'user', 'computed_at']
+    list_filter = ['month']
+    search_fields = ['category__name', 'user__username']
+    ordering = ['-month', '-projected']
+
+
+@admin.register(SpendingAnomaly)
+class SpendingAnomalyAdmin(admin.ModelAdmin):
+    list_display = ['transaction', 'baseline', 'score', 'currency', 'user', 'detected_at']
+    search_fields = ['transaction__description', 'user__username']
+    raw_id_fields = ['transaction']
+    ordering = ['-detected_at', '-score']
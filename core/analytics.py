@@ -0,0 +1,213 @@
+"""Analyse des tendances sur colonnes NumPy
+
+Les transactions d'un utilisateur sont chargées une seule fois en colonnes
+compactes (jour depuis la première transaction en int32, montant signé en
+centimes int64, code de catégorie int16), converties dans la devise du
+profil au taux de leur date et mises en cache par version des données. Les
+séries de la page Tendances (dépenses glissantes sur 30 et 90 jours,
+variations d'un mois sur l'autre, moyennes mobiles par catégorie, solde
+cumulé) en sont tirées par opérations vectorisées, sans boucle Python par
+transaction ni par jour.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models import BigIntegerField, CharField, Value
+from django.db.models.functions import Cast, Round
+
+from .caching import cached_for_user
+from .currency import converted, get_user_currency
+from .models import Category, Transaction
+
+ROLLING_WINDOWS = (30, 90)
+TREND_DAYS = 365
+TREND_MONTHS = 12
+CATEGORY_AVERAGE_MONTHS = 3
+TOP_CATEGORIES = 6
+NO_CATEGORY = -1
+
+
+@dataclass
+class TransactionColumns:
+    """Transactions d'un utilisateur en colonnes, dans la devise `currency`"""
+    currency: str
+    origin: date
+    ids: np.ndarray
+    days: np.ndarray
+    cents: np.ndarray
+    categories: np.ndarray
+    category_ids: list
+    category_labels: list
+
+    def __len__(self):
+        return len(self.days)
+
+
+def load_columns(user, currency=None):
+    """Lit les transactions de l'utilisateur en une requête et les range en colonnes"""
+    currency = currency or get_user_currency(user)
+    labels = list(Category.objects.filter(user=user).order_by('name').values_list('pk', 'name', 'color'))
+    codes = {pk: code for code, (pk, _, _) in enumerate(labels)}
+    rows = list(
+        Transaction.objects.filter(user=user)
+        .annotate(
+            # Date en texte ISO, analysée par NumPy: évite la conversion en objet date ligne par ligne
+            day=Cast('date', CharField()),
+            cents=Cast(Round(converted('amount', currency) * Value(100)), BigIntegerField()),
+        )
+        # Une devise sans taux vers celle du profil est ignorée, comme dans les rapports
+        .filter(cents__isnull=False)
+        .order_by()
+        .values_list('pk', 'day', 'type', 'category_id', 'cents')
+    )
+    category_ids = [pk for pk, _, _ in labels]
+    category_labels = [(name, color) for _, name, color in labels]
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return TransactionColumns(
+            currency, None, empty, empty.astype(np.int32), empty, empty.astype(np.int16), category_ids, category_labels,
+        )
+
+    ids, days, types, transaction_categories, cents = zip(*rows)
+    days = np.array(days, dtype='datetime64[D]')
+    origin = days.min()
+    amounts = np.fromiter(cents, dtype=np.int64, count=len(rows))
+    return TransactionColumns(
+        currency=currency,
+        origin=origin.astype(date),
+        ids=np.fromiter(ids, dtype=np.int64, count=len(rows)),
+        days=(days - origin).astype(np.int32),
+        cents=np.where(np.array(types) == 'EXPENSE', -amounts, amounts),
+        categories=np.fromiter(
+            (codes.get(pk, NO_CATEGORY) for pk in transaction_categories), dtype=np.int16, count=len(rows)
+        ),
+        category_ids=category_ids,
+        category_labels=category_labels,
+    )
+
+
+def get_columns(user):
+    """Colonnes de l'utilisateur, en cache jusqu'à la prochaine écriture"""
+    currency = get_user_currency(user)
+    return cached_for_user(
+        user.pk, 'analytics-columns', lambda: load_columns(user, currency), params={'currency': currency}
+    )
+
+
+def daily_totals(columns, day_count, values):
+    """Somme de `values` par jour, sur les `day_count` premiers jours (centimes int64)"""
+    keep = columns.days < day_count
+    # bincount additionne en float64: exact tant que les totaux restent sous 2**53 centimes
+    totals = np.bincount(columns.days[keep], weights=values[keep], minlength=day_count)
+    return np.rint(totals).astype(np.int64)
+
+
+def rolling_sums(series, window):
+    """Somme glissante sur les `window` derniers points (fenêtre tronquée au début)"""
+    cumulative = np.concatenate(([0], np.cumsum(series)))
+    ends = np.arange(1, len(series) + 1)
+    return cumulative[ends] - cumulative[np.maximum(ends - window, 0)]
+
+
+def moving_averages(matrix, window):
+    """Moyenne mobile de chaque ligne sur `window` colonnes (fenêtre tronquée au début)"""
+    cumulative = np.concatenate((np.zeros((matrix.shape[0], 1), dtype=matrix.dtype), np.cumsum(matrix, axis=1)), axis=1)
+    ends = np.arange(1, matrix.shape[1] + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumulative[:, ends] - cumulative[:, starts]) / (ends - starts)
+
+
+def month_indexes(origin, day_count):
+    """Numéro de mois (0 = mois de `origin`) de chaque jour depuis `origin`"""
+    days = np.datetime64(origin, 'D') + np.arange(day_count)
+    months = days.astype('datetime64[M]')
+    return (months - months[0]).astype(np.int32)
+
+
+def to_units(cents):
+    return np.round(cents / 100, 2).tolist()
+
+
+def compute_trends(columns, today, days=TREND_DAYS, months=TREND_MONTHS, top=TOP_CATEGORIES):
+    """Séries de la page Tendances, prêtes pour le JSON"""
+    if not len(columns) or columns.origin > today:
+        return {'currency': columns.currency, 'daily': [], 'months': [], 'categories': []}
+
+    day_count = (today - columns.origin).days + 1
+    spend = np.where(columns.cents < 0, -columns.cents, 0)
+    daily_spend = daily_totals(columns, day_count, spend)
+    daily_net = daily_totals(columns, day_count, columns.cents)
+    rolling = {window: rolling_sums(daily_spend, window) for window in ROLLING_WINDOWS}
+    balance = np.cumsum(daily_net)
+
+    # Séries quotidiennes: les `days` derniers jours
+    first_day = max(day_count - days, 0)
+    dates = [(columns.origin + timedelta(days=offset)).isoformat() for offset in range(first_day, day_count)]
+    daily = [
+        {'date': day, 'rolling_30': rolling_30, 'rolling_90': rolling_90, 'balance': day_balance}
+        for day, rolling_30, rolling_90, day_balance in zip(
+            dates, to_units(rolling[30][first_day:]), to_units(rolling[90][first_day:]), to_units(balance[first_day:])
+        )
+    ]
+
+    # Totaux mensuels et variations d'un mois sur l'autre
+    day_months = month_indexes(columns.origin, day_count)
+    keep = columns.days < day_count
+    transaction_months = day_months[columns.days[keep]]
+    month_count = int(day_months[-1]) + 1
+    income = np.bincount(transaction_months, weights=np.maximum(columns.cents[keep], 0), minlength=month_count)
+    expense = np.bincount(transaction_months, weights=spend[keep], minlength=month_count)
+    delta = np.diff(expense, prepend=0)
+    previous = np.concatenate(([0], expense[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(previous > 0, delta * 100 / previous, np.nan)
+
+    first_month = max(month_count - months, 0)
+    month_starts = np.datetime64(columns.origin, 'M') + np.arange(first_month, month_count)
+    month_rows = [
+        {
+            'label': start.astype(date).strftime('%b %Y'),
+            'income': round(float(income_cents) / 100, 2),
+            'expense': round(float(expense_cents) / 100, 2),
+            'delta': round(float(delta_cents) / 100, 2),
+            'change': None if np.isnan(pct) else round(float(pct), 1),
+        }
+        for start, income_cents, expense_cents, delta_cents, pct in zip(
+            month_starts, income[first_month:], expense[first_month:], delta[first_month:], change[first_month:]
+        )
+    ]
+
+    # Moyennes mobiles des dépenses des principales catégories
+    categorized = keep & (columns.categories != NO_CATEGORY) & (columns.cents < 0)
+    category_count = len(columns.category_labels)
+    categories = []
+    if category_count and categorized.any():
+        cells = columns.categories[categorized].astype(np.int64) * month_count + day_months[columns.days[categorized]]
+        matrix = np.bincount(
+            cells, weights=-columns.cents[categorized], minlength=category_count * month_count
+        ).reshape(category_count, month_count)
+        averages = moving_averages(matrix, CATEGORY_AVERAGE_MONTHS)
+        recent = matrix[:, first_month:].sum(axis=1)
+        for code in np.argsort(-recent, kind='stable')[:top]:
+            if recent[code] <= 0:
+                break
+            name, color = columns.category_labels[code]
+            categories.append({
+                'name': name,
+                'color': color,
+                'total': round(float(recent[code]) / 100, 2),
+                'averages': to_units(averages[code, first_month:]),
+            })
+
+    return {
+        'currency': columns.currency,
+        'daily': daily,
+        'months': month_rows,
+        'categories': categories,
+    }
+
+
+def get_trends(user, today=None):
+    """Tendances de l'utilisateur à partir des colonnes en cache"""
+    return compute_trends(get_columns(user), today or date.today())
@@ -0,0 +1,215 @@
+"""Banc de performance des vues principales
+
+Pour chaque volume de données, un utilisateur dédié est généré puis chaque
+vue est appelée via le client de test. On mesure le temps total, le nombre
+de requêtes SQL, le temps passé en SQL et le pic mémoire Python, et on les
+compare aux budgets déclarés dans VIEW_BUDGETS.
+"""
+import statistics
+import subprocess
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .caching import bump_data_version
+from .models import Transaction
+from .synthetic import create_users, populate_user
+
+DEFAULT_SIZES = [1_000, 100_000]
+BENCHMARK_SEED = 2024
+BENCHMARK_MONTHS = 36
+
+# Le client de test ne doit dépendre ni du manifeste des fichiers statiques ni des hôtes de production
+BENCHMARK_SETTINGS = {
+    'ALLOWED_HOSTS': ['testserver'],
+    'STORAGES': {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+}
+
+
+@dataclass(frozen=True)
+class ViewBudget:
+    """Budget d'une vue: requêtes SQL maximum et latence médiane maximum (ms) par volume"""
+    url_name: str
+    queries: int
+    latency_ms: dict
+    query_string: str = ''
+
+    def latency_for(self, size):
+        """Budget de latence du plus petit volume déclaré couvrant `size`"""
+        for declared in sorted(self.latency_ms):
+            if size <= declared:
+                return self.latency_ms[declared]
+        return self.latency_ms[max(self.latency_ms)]
+
+
+VIEW_BUDGETS = {
+    'dashboard': ViewBudget('core:dashboard', queries=12, latency_ms={1_000: 250, 100_000: 400, 1_000_000: 800}),
+    'transaction_list': ViewBudget('core:transaction_list', queries=6,
+                                   latency_ms={1_000: 250, 100_000: 400, 1_000_000: 800}),
+    'transaction_search': ViewBudget('core:transaction_list', queries=6, query_string='q=cour',
+                                     latency_ms={1_000: 250, 100_000: 400, 1_000_000: 800}),
+    'budget_list': ViewBudget('core:budget_list', queries=6, latency_ms={1_000: 250, 100_000: 400, 1_000_000: 800}),
+    'reports': ViewBudget('core:reports', queries=8, latency_ms={1_000: 300, 100_000: 1_500, 1_000_000: 10_000}),
+    'reports_search': ViewBudget('core:reports', queries=8, query_string='q=loyer',
+                                 latency_ms={1_000: 300, 100_000: 500, 1_000_000: 1_000}),
+    # Graphiques: +1 requête pour l'ETag relu en base avec le cache locmem (core.caching.user_etag)
+    'chart_monthly': ViewBudget('core:chart_monthly', queries=5, latency_ms={1_000: 100, 100_000: 150, 1_000_000: 300}),
+    'chart_balance': ViewBudget('core:chart_balance', queries=5, latency_ms={1_000: 100, 100_000: 150, 1_000_000: 300}),
+    'chart_report': ViewBudget('core:chart_report', queries=6,
+                               latency_ms={1_000: 200, 100_000: 1_500, 1_000_000: 10_000}),
+    'trends': ViewBudget('core:trends', queries=6, latency_ms={1_000: 250, 100_000: 1_000, 1_000_000: 2_000}),
+    'chart_trends': ViewBudget('core:chart_trends', queries=6,
+                               latency_ms={1_000: 200, 100_000: 1_000, 1_000_000: 2_000}),
+    'export_csv': ViewBudget('core:export_csv', queries=5,
+                             latency_ms={1_000: 300, 100_000: 6_000, 1_000_000: 60_000}),
+}
+
+
+@dataclass
+class ViewResult:
+    """Mesures d'une vue pour un volume de données"""
+    view: str
+    size: int
+    status: int
+    wall_ms: float
+    wall_ms_runs: list
+    queries: int
+    sql_ms: float
+    warm_ms: float
+    warm_queries: int
+    peak_memory_kb: float
+    response_bytes: int
+    violations: list = field(default_factory=list)
+
+
+def seed_benchmark_user(size, seed=BENCHMARK_SEED, months=BENCHMARK_MONTHS):
+    """Retourne un utilisateur possédant exactement `size` transactions, généré si besoin"""
+    [(index, user_id)] = create_users(1, prefix=f'bench{size}')
+    if Transaction.objects.filter(user_id=user_id).count() != size:
+        populate_user(user_id, index, seed=seed, transaction_count=size, months_count=months,
+                      today=date.today())
+    return user_id
+
+
+def consume(response):
+    """Lit entièrement la réponse (les exports sont en flux) et retourne sa taille"""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure_request(client, url):
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        response = client.get(url)
+        size = consume(response)
+        elapsed = (time.perf_counter() - started) * 1000
+    sql_ms = sum(float(query['time']) for query in captured.captured_queries) * 1000
+    return response.status_code, elapsed, len(captured), sql_ms, size
+
+
+def measure_view(client, user_id, name, budget, size, repeat=3, latency_factor=1.0):
+    """Mesure une vue: `repeat` appels à froid (cache invalidé), un appel à chaud, un appel sous tracemalloc"""
+    url = reverse(budget.url_name) + (f'?{budget.query_string}' if budget.query_string else '')
+
+    runs = []
+    for _ in range(repeat):
+        bump_data_version(user_id)
+        runs.append(measure_request(client, url))
+    status, _, queries, _, response_bytes = runs[0]
+    _, warm_ms, warm_queries, _, _ = measure_request(client, url)
+
+    bump_data_version(user_id)
+    tracemalloc.start()
+    try:
+        measure_request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = ViewResult(
+        view=name,
+        size=size,
+        status=status,
+        wall_ms=round(statistics.median(run[1] for run in runs), 2),
+        wall_ms_runs=[round(run[1], 2) for run in runs],
+        queries=max(run[2] for run in runs),
+        sql_ms=round(statistics.median(run[3] for run in runs), 2),
+        warm_ms=round(warm_ms, 2),
+        warm_queries=warm_queries,
+        peak_memory_kb=round(peak / 1024, 1),
+        response_bytes=response_bytes,
+    )
+    if status != 200:
+        result.violations.append(f"statut HTTP {status}")
+    if result.queries > budget.queries:
+        result.violations.append(f"{result.queries} requêtes SQL (budget: {budget.queries})")
+    latency_budget = budget.latency_for(size) * latency_factor
+    if result.wall_ms > latency_budget:
+        result.violations.append(f"{result.wall_ms:.0f} ms (budget: {latency_budget:.0f} ms)")
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, views=None, repeat=3, latency_factor=1.0, progress=None):
+    """Exécute le banc et retourne le rapport (dictionnaire sérialisable en JSON)"""
+    budgets = {name: VIEW_BUDGETS[name] for name in (views or VIEW_BUDGETS)}
+    results = []
+    with override_settings(**BENCHMARK_SETTINGS):
+        for size in sizes:
+            started = time.perf_counter()
+            user_id = seed_benchmark_user(size)
+            if progress:
+                progress(f"{size} transactions prêtes en {time.perf_counter() - started:.1f}s")
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            for name, budget in budgets.items():
+                result = measure_view(client, user_id, name, budget, size, repeat, latency_factor)
+                results.append(result)
+                if progress:
+                    progress(f"{size:>9} {name:<18} {result.wall_ms:>9.1f} ms {result.queries:>3} req.")
+
+    return {
+        'commit': current_commit(),
+        'database': connection.vendor,
+        'date': date.today().isoformat(),
+        'repeat': repeat,
+        'latency_factor': latency_factor,
+        'budgets': {name: asdict(budget) for name, budget in budgets.items()},
+        'results': [asdict(result) for result in results],
+        'passed': not any(result.violations for result in results),
+    }
+
+
+def compare_reports(previous, current):
+    """Lignes « vue / volume: avant -> après » pour deux rapports"""
+    before = {(row['view'], row['size']): row for row in previous.get('results', [])}
+    lines = []
+    for row in current['results']:
+        old = before.get((row['view'], row['size']))
+        if old is None:
+            continue
+        change = (row['wall_ms'] - old['wall_ms']) / old['wall_ms'] * 100 if old['wall_ms'] else 0
+        lines.append(
+            f"{row['view']} / {row['size']}: {old['wall_ms']:.1f} -> {row['wall_ms']:.1f} ms ({change:+.0f}%), "
+            f"{old['queries']} -> {row['queries']} requêtes"
+        )
+    return lines
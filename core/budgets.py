@@ -0,0 +1,117 @@
+"""Consommation des budgets, évaluée à l'écriture et enregistrée sur le budget
+
+Chaque création, modification ou suppression d'une dépense recalcule le ou
+les budgets (utilisateur, catégorie, période) concernés en une requête et
+consigne un BudgetAlert lorsque l'état d'alerte change.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Budget, BudgetAlert
+from .sharding import current_database
+
+ALERT_STATES = [Budget.STATE_ALERT, Budget.STATE_EXCEEDED]
+ALERT_HISTORY_DISPLAYED = 20
+KEYS_PER_QUERY = 500
+# Plus grande valeur de percentage_used et BudgetAlert.percentage (max_digits=10, decimal_places=2)
+PERCENTAGE_LIMIT = Decimal('99999999.99')
+
+
+def budget_key(values):
+    """Clé (user_id, category_id, période) d'une dépense, ou None si aucun budget ne peut la concerner"""
+    if isinstance(values, dict):
+        user_id, category_id, trans_type, day = (
+            values['user_id'], values['category_id'], values['type'], values['date']
+        )
+    else:
+        user_id, category_id, trans_type, day = values.user_id, values.category_id, values.type, values.date
+    if trans_type != 'EXPENSE' or category_id is None:
+        return None
+    if isinstance(day, str):
+        day = day[:7]
+    else:
+        day = day.strftime('%Y-%m')
+    return (user_id, category_id, day)
+
+
+def evaluate_budgets(budgets, record_events=True):
+    """Recalcule et enregistre la consommation d'un queryset de budgets.
+
+    Retourne la liste des BudgetAlert créées (changements d'état).
+    """
+    now = timezone.now()
+    events = []
+    with transaction.atomic(using=current_database(), savepoint=False):
+        evaluated = list(budgets.select_for_update().with_progress())
+        for budget in evaluated:
+            # Petit budget, grosse dépense: le pourcentage déborderait la colonne
+            percentage = min(budget.percentage, PERCENTAGE_LIMIT)
+            if budget.exceeded:
+                state = Budget.STATE_EXCEEDED
+            elif budget.over_threshold:
+                state = Budget.STATE_ALERT
+            else:
+                state = Budget.STATE_OK
+            if record_events and state != budget.alert_state:
+                events.append(BudgetAlert(
+                    user_id=budget.user_id,
+                    budget=budget,
+                    previous_state=budget.alert_state,
+                    state=state,
+                    spent=budget.spent,
+                    percentage=percentage,
+                ))
+            budget.spent_amount = budget.spent
+            budget.percentage_used = percentage
+            budget.alert_state = state
+            budget.evaluated_at = now
+        Budget.objects.bulk_update(
+            evaluated, ['spent_amount', 'percentage_used', 'alert_state', 'evaluated_at'], batch_size=500,
+        )
+        BudgetAlert.objects.bulk_create(events)
+    return events
+
+
+def evaluate_budget_keys(keys):
+    """Recalcule les budgets correspondant à des clés (user_id, category_id, période), par tranches.
+
+    Chaque tranche est lue avec trois filtres IN: quelques budgets voisins
+    peuvent être réévalués en plus, ce qui est sans effet sur leur état.
+    """
+    keys = sorted(key for key in keys if key)
+    for start in range(0, len(keys), KEYS_PER_QUERY):
+        chunk = keys[start:start + KEYS_PER_QUERY]
+        user_ids, category_ids, periods = (set(values) for values in zip(*chunk))
+        evaluate_budgets(Budget.objects.filter(
+            user_id__in=user_ids, category_id__in=category_ids, period__in=periods,
+        ))
+
+
+def record_budget_change(previous, current):
+    """Recalcule les budgets touchés par la création, modification ou suppression d'une transaction"""
+    keys = set()
+    if previous is not None:
+        keys.add(budget_key(previous))
+    if current is not None:
+        keys.add(budget_key(current))
+    evaluate_budget_keys(keys)
+
+
+def record_budget_bulk_insert(transactions):
+    evaluate_budget_keys({budget_key(trans) for trans in transactions})
+
+
+def get_budget_alerts(user, period):
+    """Budgets de la période ayant atteint leur seuil d'alerte (une requête indexée)"""
+    return list(
+        Budget.objects.filter(user=user, period=period, alert_state__in=ALERT_STATES).select_related('category')
+    )
+
+
+def get_alert_history(user, limit=ALERT_HISTORY_DISPLAYED):
+    """Derniers changements d'état des budgets de l'utilisateur"""
+    return list(
+        BudgetAlert.objects.filter(user=user).select_related('budget__category')[:limit]
+    )
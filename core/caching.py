@@ -0,0 +1,163 @@
+"""Cache des calculs par utilisateur, invalidé par une version des données.
+
+Chaque écriture sur les transactions, catégories ou budgets d'un utilisateur
+incrémente sa version (voir core.signals). Les résultats sont mis en cache
+sous une clé qui contient cette version: après une écriture, les anciennes
+entrées ne sont plus jamais lues et expirent d'elles-mêmes. Une version
+globale, incrémentée au chargement des taux de change, invalide les
+résultats de tous les utilisateurs.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Max, Subquery
+
+from accounts.models import UserProfile
+from .models import Category, ExchangeRate, Transaction
+
+DATA_VERSION_KEY = 'finance:data-version:{user_id}'
+GLOBAL_VERSION_KEY = 'finance:data-version:global'
+CACHED_KEY = 'finance:{name}:{user_id}:{version}:{digest}'
+
+_MISSING = object()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, 'FINANCE_CACHE_ALIAS', 'default')]
+
+
+def _initial_version():
+    # Basée sur l'horloge: si la clé est évincée, la nouvelle version reste
+    # supérieure à toutes celles déjà utilisées
+    return int(time.time() * 1000)
+
+
+def _incr(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def get_data_version(user_id):
+    """Version courante des données de l'utilisateur (version propre et version globale)"""
+    cache = get_cache()
+    key = DATA_VERSION_KEY.format(user_id=user_id)
+    versions = cache.get_many([key, GLOBAL_VERSION_KEY])
+    for missing in {key, GLOBAL_VERSION_KEY} - set(versions):
+        cache.add(missing, _initial_version(), timeout=None)
+        versions[missing] = cache.get(missing)
+    return f'{versions[key]}.{versions[GLOBAL_VERSION_KEY]}'
+
+
+def bump_data_version(user_id):
+    """Invalide tous les résultats en cache de l'utilisateur"""
+    return _incr(get_cache(), DATA_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_global_version():
+    """Invalide les résultats en cache de tous les utilisateurs"""
+    return _incr(get_cache(), GLOBAL_VERSION_KEY)
+
+
+def _record(name, outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+        _stats[f'{name}:{outcome}'] += 1
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cached_for_user(user_id, name, compute, params=None, timeout=DEFAULT_TIMEOUT):
+    """Retourne compute() mis en cache pour (utilisateur, nom, paramètres, version)"""
+    key = CACHED_KEY.format(
+        name=name, user_id=user_id, version=get_data_version(user_id), digest=_digest(params)
+    )
+
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _record(name, 'hits')
+        return value
+
+    _record(name, 'misses')
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+def cache_is_shared():
+    """Faux pour le cache en mémoire du processus, que les autres processus ne voient pas"""
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def data_state(user_id):
+    """État des données de l'utilisateur lu en base, en une requête.
+
+    Nombre et dernière modification des transactions et des catégories,
+    dernier taux de change chargé et devise du profil.
+    """
+    def scalar(queryset):
+        # Sous-requête scalaire: l'agrégat porte sur les transactions
+        return Max(Subquery(queryset[:1]))
+
+    categories = Category.objects.filter(user_id=user_id).order_by()
+    state = Transaction.objects.filter(user_id=user_id).aggregate(
+        count=Count('pk'),
+        updated=Max('updated_at'),
+        categories=scalar(categories.values('user_id').annotate(count=Count('pk')).values('count')),
+        categories_updated=scalar(categories.order_by('-updated_at').values('updated_at')),
+        rate=scalar(ExchangeRate.objects.order_by('-pk').values('pk')),
+        currency=scalar(UserProfile.objects.filter(user_id=user_id).values('currency')),
+    )
+    return sorted(state.items())
+
+
+def user_etag(user_id, name, params=None):
+    """ETag d'une réponse calculée à partir des données de l'utilisateur.
+
+    Avec un cache partagé, il suit la version des données, sans requête SQL.
+    En mémoire du processus, les écritures des commandes et des autres
+    workers n'incrémentent pas la version vue ici: l'état est relu en base.
+    """
+    state = get_data_version(user_id) if cache_is_shared() else data_state(user_id)
+    return _digest([name, user_id, state, params])
+
+
+def get_cache_stats():
+    """Compteurs de succès/échecs du cache pour ce processus"""
+    with _stats_lock:
+        stats = dict(_stats)
+    hits, misses = stats.get('hits', 0), stats.get('misses', 0)
+    by_name = {}
+    for key, count in stats.items():
+        if ':' in key:
+            name, outcome = key.rsplit(':', 1)
+            by_name.setdefault(name, {'hits': 0, 'misses': 0})[outcome] = count
+    cache = get_cache()
+    return {
+        'pid': os.getpid(),
+        'backend': f'{type(cache).__module__}.{type(cache).__name__}',
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        'by_name': by_name,
+    }
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
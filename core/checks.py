@@ -0,0 +1,23 @@
+"""Vérifications de configuration (`python manage.py check`, lancées aussi par runserver et migrate)"""
+from django.core import checks
+from django.core.cache.backends.locmem import LocMemCache
+
+from .caching import get_cache
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Le cache en mémoire du processus n'est partagé ni entre les workers ni avec les commandes.
+
+    Signalé hors --deploy aussi: même avec runserver, une commande qui écrit
+    (import_transactions, materialize_recurring, rebalance_shards...)
+    incrémente des versions de données que le serveur ne voit pas.
+    """
+    if isinstance(get_cache(), LocMemCache):
+        return [checks.Warning(
+            "Le cache est en mémoire du processus (CACHE_BACKEND=locmem): les écritures des autres workers "
+            "et des commandes de gestion n'invalident pas ses résultats, qui restent périmés.",
+            hint="Définissez REDIS_URL ou CACHE_BACKEND=file/db.",
+            id='core.W001',
+        )]
+    return []
@@ -0,0 +1,50 @@
+"""Exécution concurrente de blocs ORM pour les vues asynchrones
+
+L'ORM asynchrone de Django exécute toutes les requêtes d'une requête HTTP
+sur un même thread (thread_sensitive=True): elles restent séquentielles.
+Ici chaque bloc tourne dans un thread du pool, avec sa propre connexion,
+pour que la latence soit celle du bloc le plus lent et non leur somme.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+
+from .middleware import instrument_thread
+
+
+def _in_worker(func):
+    def run():
+        # Ferme les connexions expirées ou cassées de ce thread (CONN_MAX_AGE)
+        close_old_connections()
+        # Connexions de ce thread: leurs requêtes comptent pour la requête HTTP (SQLInstrumentationMiddleware)
+        with instrument_thread():
+            return func()
+    return run
+
+
+async def run_concurrently(blocks):
+    """Exécute un dictionnaire {nom: fonction synchrone} en parallèle et retourne {nom: résultat}"""
+    results = await asyncio.gather(*(
+        sync_to_async(_in_worker(func), thread_sensitive=False)()
+        for func in blocks.values()
+    ))
+    return dict(zip(blocks, results))
+
+
+def async_login_required(view):
+    """Équivalent de login_required pour une vue asynchrone.
+
+    L'utilisateur chargé est replacé sur request.user pour que le rendu du
+    gabarit ne relise pas la session.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
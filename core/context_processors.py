@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from .currency import currency_symbol, get_user_currency
+from .models import DEFAULT_CURRENCY
+
+
+def currency(request):
+    """Symbole de la devise du profil, lu seulement si le gabarit l'affiche"""
+    user = getattr(request, 'user', None)
+
+    def symbol():
+        if user is None or not user.is_authenticated:
+            return currency_symbol(DEFAULT_CURRENCY)
+        return currency_symbol(get_user_currency(user))
+
+    return {'currency_symbol': SimpleLazyObject(symbol)}
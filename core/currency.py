@@ -0,0 +1,212 @@
+"""Conversion des montants dans la devise du profil
+
+Les taux (table ExchangeRate) sont chargés hors ligne depuis un fichier.
+Les agrégats convertissent dans la requête SQL: chaque ligne est multipliée
+par le taux de sa devise, lu par une sous-requête corrélée sur l'index
+(base, quote, date). Une ligne déjà dans la devise cible n'interroge pas la
+table des taux. Les calculs restants en Python passent par RateCache.
+"""
+import bisect
+import csv
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from accounts.models import UserProfile
+
+from .models import CURRENCY_CHOICES, CURRENCY_SYMBOLS, DEFAULT_CURRENCY, ExchangeRate, MonthlySummary
+from .sharding import shard_aliases
+
+ONE = Decimal('1')
+CENT = Decimal('0.01')
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=10)
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+CURRENCIES = [code for code, _ in CURRENCY_CHOICES]
+RATE_CACHE_TTL = 300
+
+
+def get_user_currency(user):
+    """Devise du profil de l'utilisateur (EUR sans profil)"""
+    if UserProfile.user.field.remote_field.is_cached(user):
+        # Profil chargé avec l'utilisateur (accounts.backends.CachedModelBackend)
+        profile = getattr(user, 'profile', None)
+        return profile.currency if profile is not None else DEFAULT_CURRENCY
+    currency = UserProfile.objects.filter(user=user).values_list('currency', flat=True).first()
+    return currency or DEFAULT_CURRENCY
+
+
+def currency_symbol(code):
+    return CURRENCY_SYMBOLS.get(code, code)
+
+
+def _outer(value):
+    """Référence à une colonne de la requête courante, vue depuis la sous-requête des taux"""
+    if isinstance(value, OuterRef):
+        return OuterRef(value)
+    if isinstance(value, F):
+        return OuterRef(value.name)
+    return OuterRef(value)
+
+
+def conversion_rate(target, currency='currency', day='date'):
+    """Taux de la devise `currency` vers `target` à la date `day`.
+
+    `target` est un code devise ou une référence (F, OuterRef) à une colonne,
+    `day` un nom de colonne, une référence ou une date. Le taux retenu est le
+    dernier connu à cette date, à défaut le premier connu après. Sans aucun
+    taux pour la paire, le résultat est NULL.
+    """
+    day_ref = Value(day) if isinstance(day, date) else _outer(day)
+    quote = Value(target) if isinstance(target, str) else _outer(target)
+    rates = ExchangeRate.objects.filter(base=OuterRef(currency), quote=quote)
+    before = rates.filter(date__lte=day_ref).order_by('-date').values('rate')[:1]
+    after = rates.filter(date__gt=day_ref).order_by('date').values('rate')[:1]
+    return Case(
+        When(Q(**{currency: target}), then=Value(ONE)),
+        default=Coalesce(Subquery(before, output_field=RATE_FIELD), Subquery(after, output_field=RATE_FIELD)),
+        output_field=RATE_FIELD,
+    )
+
+
+def converted(field, target, currency='currency', day='date'):
+    """Expression: la colonne `field` convertie dans la devise `target`"""
+    return ExpressionWrapper(F(field) * conversion_rate(target, currency, day), output_field=AMOUNT_FIELD)
+
+
+class RateCache:
+    """Taux de change en mémoire du processus, par paire et par date.
+
+    Chaque paire est lue en une requête puis servie par recherche
+    dichotomique sur les dates; les entrées expirent après `ttl` secondes.
+    """
+
+    def __init__(self, ttl=RATE_CACHE_TTL):
+        self.ttl = ttl
+        self._pairs = {}
+        self._lock = threading.Lock()
+
+    def _load(self, base, quote):
+        rows = list(
+            ExchangeRate.objects.filter(base=base, quote=quote).order_by('date').values_list('date', 'rate')
+        )
+        return time.monotonic(), [row[0] for row in rows], [row[1] for row in rows]
+
+    def _pair(self, base, quote):
+        with self._lock:
+            entry = self._pairs.get((base, quote))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            entry = self._load(base, quote)
+            with self._lock:
+                self._pairs[(base, quote)] = entry
+        return entry
+
+    def rate(self, base, quote, day):
+        """Dernier taux connu à la date `day` (à défaut le premier connu après), ou None"""
+        if base == quote:
+            return ONE
+        _, dates, rates = self._pair(base, quote)
+        if not dates:
+            return None
+        index = bisect.bisect_right(dates, day)
+        return rates[index - 1] if index else rates[0]
+
+    def convert(self, amount, base, quote, day):
+        """Montant converti, arrondi au centime (None sans taux pour la paire)"""
+        rate = self.rate(base, quote, day)
+        if rate is None:
+            return None
+        return (Decimal(amount) * rate).quantize(CENT)
+
+    def clear(self):
+        with self._lock:
+            self._pairs.clear()
+
+
+rate_cache = RateCache()
+
+
+class RateFileError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"ligne {line}: {message}")
+        self.line = line
+        self.message = message
+
+
+def read_rates(stream):
+    """Lit un fichier CSV date,base,quote,rate et retourne {(date, base, quote): taux}"""
+    rates = {}
+    reader = csv.DictReader(stream)
+    missing = {'date', 'base', 'quote', 'rate'} - set(reader.fieldnames or [])
+    if missing:
+        raise RateFileError(1, f"colonnes manquantes: {', '.join(sorted(missing))}")
+    for line, row in enumerate(reader, start=2):
+        try:
+            day = date.fromisoformat(row['date'].strip())
+            rate = Decimal(row['rate'].strip())
+        except (ValueError, InvalidOperation):
+            raise RateFileError(line, f"date ou taux invalide: {row['date']!r}, {row['rate']!r}")
+        base, quote = row['base'].strip().upper(), row['quote'].strip().upper()
+        if base not in CURRENCIES or quote not in CURRENCIES:
+            raise RateFileError(line, f"devise non prise en charge: {base}/{quote}")
+        if rate <= 0:
+            raise RateFileError(line, f"taux non positif: {rate}")
+        rates[(day, base, quote)] = rate
+    return rates
+
+
+def complete_rates(rates):
+    """Ajoute les paires inverses et croisées de chaque date (via une devise commune)"""
+    by_day = defaultdict(dict)
+    for (day, base, quote), rate in rates.items():
+        by_day[day][(base, quote)] = rate
+    completed = {}
+    for day, pairs in by_day.items():
+        known = dict(pairs)
+        for (base, quote), rate in pairs.items():
+            known.setdefault((quote, base), ONE / rate)
+        # Taux croisés: base -> pivot -> quote
+        for pivot in CURRENCIES:
+            for base in CURRENCIES:
+                for quote in CURRENCIES:
+                    if base != quote and (base, quote) not in known \
+                            and (base, pivot) in known and (pivot, quote) in known:
+                        known[(base, quote)] = known[(base, pivot)] * known[(pivot, quote)]
+        for (base, quote), rate in known.items():
+            if base != quote:
+                completed[(day, base, quote)] = rate.quantize(Decimal('1e-10'))
+    return completed
+
+
+def load_rates(rates, batch_size=1000):
+    """Enregistre {(date, base, quote): taux}, remplace les taux existants; retourne le nombre de lignes
+
+    Chaque shard a sa copie de la table: les conversions se font dans ses requêtes.
+    """
+    completed = sorted(complete_rates(rates).items())
+    for alias in shard_aliases():
+        rows = [ExchangeRate(date=day, base=base, quote=quote, rate=rate) for (day, base, quote), rate in completed]
+        with transaction.atomic(using=alias):
+            ExchangeRate.objects.using(alias).bulk_create(
+                rows, batch_size=batch_size,
+                update_conflicts=True, unique_fields=['base', 'quote', 'date'], update_fields=['rate'],
+            )
+    rate_cache.clear()
+    return len(completed)
+
+
+def foreign_currency_users():
+    """Identifiants des utilisateurs ayant des montants dans une autre devise que celle de leur profil"""
+    profile_currency = UserProfile.objects.filter(user_id=OuterRef('user_id')).values('currency')[:1]
+    return (
+        MonthlySummary.objects
+        .annotate(target=Coalesce(Subquery(profile_currency), Value(DEFAULT_CURRENCY)))
+        .exclude(currency=F('target'))
+        .values('user_id')
+        .distinct()
+    )
@@ -0,0 +1,174 @@
+"""Agrégations du tableau de bord calculées en un nombre fixe de requêtes
+
+Les montants sont lus dans la synthèse mensuelle (MonthlySummary) plutôt
+que dans les transactions brutes, et convertis dans la devise du profil par
+la requête d'agrégation: au taux du jour pour le mois en cours, au taux du
+début de chaque mois pour l'historique.
+"""
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Q, Sum
+
+from .caching import cached_for_user
+from .currency import converted, get_user_currency
+from .forecasting import get_anomalies, get_forecasts
+from .budgets import get_budget_alerts
+from .ledger import get_balance, get_balance_history
+from .models import MonthlySummary, Transaction
+
+ZERO = Decimal('0.00')
+RECENT_TRANSACTIONS = 10
+
+
+def get_totals(user, today=None, currency=None):
+    """Revenus et dépenses du mois en cours en une seule requête"""
+    today = today or date.today()
+    currency = currency or get_user_currency(user)
+    total = converted('total', currency, day=today)
+    totals = MonthlySummary.objects.filter(user=user, month=today.replace(day=1)).aggregate(
+        income_month=Sum(total, filter=Q(type='INCOME')),
+        expense_month=Sum(total, filter=Q(type='EXPENSE')),
+    )
+    return {key: (value or ZERO).quantize(ZERO) for key, value in totals.items()}
+
+
+def get_months_data(user, today=None, months=6, currency=None):
+    """Revenus et dépenses des `months` derniers mois, groupés par mois"""
+    today = today or date.today()
+    currency = currency or get_user_currency(user)
+    total = converted('total', currency, day='month')
+    first_month = today.replace(day=1) - relativedelta(months=months - 1)
+
+    rows = (
+        MonthlySummary.objects
+        .filter(user=user, month__gte=first_month, month__lte=today.replace(day=1))
+        .values('month')
+        .annotate(
+            income=Sum(total, filter=Q(type='INCOME')),
+            expense=Sum(total, filter=Q(type='EXPENSE')),
+        )
+        .order_by()
+    )
+    by_month = {row['month']: row for row in rows}
+
+    months_data = []
+    for i in range(months):
+        month_date = first_month + relativedelta(months=i)
+        row = by_month.get(month_date, {})
+        months_data.append({
+            'label': month_date.strftime('%b %Y'),
+            'income': float(row.get('income') or ZERO),
+            'expense': float(row.get('expense') or ZERO),
+        })
+    return months_data
+
+
+def get_category_data(user, today=None, currency=None):
+    """Répartition des dépenses du mois en cours par catégorie"""
+    today = today or date.today()
+    currency = currency or get_user_currency(user)
+
+    rows = (
+        MonthlySummary.objects
+        .filter(
+            user=user,
+            type='EXPENSE',
+            category__type='EXPENSE',
+            month=today.replace(day=1),
+        )
+        .values('category_id', 'category__name', 'category__color')
+        .annotate(converted_total=Sum(converted('total', currency, day=today)))
+        .order_by('category__name')
+    )
+    return [
+        {
+            'name': row['category__name'],
+            'amount': float(row['converted_total']),
+            'color': row['category__color'],
+        }
+        for row in rows
+        if row['converted_total'] and row['converted_total'] > 0
+    ]
+
+
+def compute_dashboard_stats(user, today=None):
+    """Montants affichés en tête du tableau de bord (les graphiques sont servis en JSON)"""
+    today = today or date.today()
+    currency = get_user_currency(user)
+    totals = get_totals(user, today, currency)
+    return {
+        'currency': currency,
+        'income_month': totals['income_month'],
+        'expense_month': totals['expense_month'],
+        'balance': totals['income_month'] - totals['expense_month'],
+        'total_balance': get_balance(user, currency, today),
+    }
+
+
+def get_dashboard_stats(user, today=None):
+    """Statistiques du tableau de bord, en cache jusqu'à la prochaine écriture"""
+    today = today or date.today()
+    return cached_for_user(
+        user.pk, 'dashboard', lambda: compute_dashboard_stats(user, today), params={'today': today}
+    )
+
+
+def dashboard_blocks(user, today=None):
+    """Blocs indépendants de la page du tableau de bord: {nom: fonction}.
+
+    La vue synchrone les appelle l'un après l'autre, la vue asynchrone en
+    parallèle (voir core.concurrency).
+    """
+    today = today or date.today()
+    return {
+        'stats': lambda: get_dashboard_stats(user, today),
+        'recent_transactions': lambda: list(
+            Transaction.objects.filter(user=user).select_related('category')[:RECENT_TRANSACTIONS]
+        ),
+        'budget_alerts': lambda: get_budget_alerts(user, today.strftime('%Y-%m')),
+        # Résultats précalculés par la commande compute_forecasts
+        'forecasts': lambda: get_forecasts(user, today),
+        'anomalies': lambda: get_anomalies(user, today),
+    }
+
+
+def dashboard_context(results):
+    """Contexte du gabarit dashboard.html à partir des résultats des blocs"""
+    stats = results['stats']
+    return {
+        'income_month': stats['income_month'],
+        'expense_month': stats['expense_month'],
+        'balance': stats['balance'],
+        'total_balance': stats['total_balance'],
+        'recent_transactions': results['recent_transactions'],
+        'budget_alerts': results['budget_alerts'],
+        'forecasts': results['forecasts'],
+        'anomalies': results['anomalies'],
+    }
+
+
+def get_monthly_chart(user, today=None, months=6):
+    """Données du graphique d'évolution mensuelle, en cache"""
+    today = today or date.today()
+    return cached_for_user(
+        user.pk, 'chart-monthly', lambda: get_months_data(user, today, months),
+        params={'today': today, 'months': months},
+    )
+
+
+def get_category_chart(user, today=None):
+    """Données du graphique des dépenses du mois par catégorie, en cache"""
+    today = today or date.today()
+    return cached_for_user(
+        user.pk, 'chart-categories', lambda: get_category_data(user, today), params={'today': today}
+    )
+
+
+def get_balance_chart(user, today=None):
+    """Données du graphique d'historique du solde, en cache"""
+    today = today or date.today()
+    return cached_for_user(
+        user.pk, 'chart-balance', lambda: get_balance_history(user, today), params={'today': today}
+    )
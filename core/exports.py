@@ -0,0 +1,54 @@
+"""Export CSV en flux, à mémoire constante"""
+import csv
+import zlib
+
+from .models import Transaction
+
+EXPORT_CHUNK_SIZE = 2000
+CSV_HEADER = ['Date', 'Type', 'Catégorie', 'Montant', 'Devise', 'Description']
+
+
+class Echo:
+    """Pseudo-fichier dont write() retourne la ligne au lieu de la stocker"""
+    def write(self, value):
+        return value
+
+
+def csv_rows(transactions, chunk_size=EXPORT_CHUNK_SIZE):
+    """Génère les lignes CSV des transactions, lues par lots avec le nom de catégorie joint"""
+    writer = csv.writer(Echo())
+    type_labels = dict(Transaction.TYPE_CHOICES)
+    rows = (
+        transactions
+        .order_by('-date', '-created_at', 'id')
+        .values_list('date', 'type', 'category__name', 'amount', 'currency', 'description')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    yield '\ufeff' + writer.writerow(CSV_HEADER)  # BOM pour Excel
+    for trans_date, trans_type, category_name, amount, currency, description in rows:
+        yield writer.writerow([
+            trans_date.strftime('%Y-%m-%d'),
+            type_labels.get(trans_type, trans_type),
+            category_name or '',
+            str(amount),
+            currency,
+            description,
+        ])
+
+
+def gzip_stream(chunks, batch_size=64 * 1024):
+    """Compresse un flux de chaînes au format gzip, par blocs d'environ `batch_size` octets"""
+    compressor = zlib.compressobj(wbits=31)  # en-tête et pied gzip
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= batch_size:
+            compressed = compressor.compress(b''.join(buffer))
+            buffer, size = [], 0
+            if compressed:
+                yield compressed
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
@@ -0,0 +1,211 @@
+"""Projection des dépenses de fin de mois et détection des dépenses inhabituelles
+
+Les deux calculs partent des colonnes NumPy de core.analytics et traitent
+toutes les catégories d'un utilisateur à la fois:
+
+- projection: dépensé à date + dépense mensuelle moyenne de la catégorie x
+  part du mois qui reste habituellement à dépenser après ce jour (profil
+  quotidien cumulé des mois précédents);
+- anomalie: z-score robuste (médiane et écart absolu médian des dépenses de
+  la catégorie sur un an) au-dessus de ANOMALY_SCORE.
+
+La commande compute_forecasts enregistre les résultats chaque nuit: le
+tableau de bord ne fait que les lire.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .analytics import NO_CATEGORY, load_columns
+from .models import Budget, CategoryForecast, SpendingAnomaly
+from .sharding import current_database
+
+HISTORY_MONTHS = 12
+ANOMALY_HISTORY_DAYS = 365
+ANOMALY_RECENT_DAYS = 30
+ANOMALY_MIN_SAMPLES = 8
+ANOMALY_SCORE = 3.5
+# 0.6745 = quantile 75 % de la loi normale: rend le score comparable à un z-score
+MAD_SCALE = 0.6745
+# Sans écart absolu médian (montants le plus souvent identiques): écart absolu moyen x sqrt(pi/2)
+MEAN_DEVIATION_SCALE = 1.2533
+DAYS_IN_MONTH = 31
+USERS_PER_BATCH = 200
+FORECASTS_DISPLAYED = 5
+ANOMALIES_DISPLAYED = 5
+
+
+@dataclass
+class ForecastResult:
+    users: int = 0
+    forecasts: int = 0
+    anomalies: int = 0
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(round(cents))) / 100
+
+
+def group_medians(groups, values):
+    """Médiane de `values` par groupe; `groups` trié, `values` trié dans chaque groupe"""
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    counts = np.diff(np.r_[starts, len(groups)])
+    medians = (values[starts + (counts - 1) // 2] + values[starts + counts // 2]) / 2
+    return starts, counts, medians
+
+
+def forecast_categories(columns, today, history_months=HISTORY_MONTHS):
+    """[(code catégorie, dépensé à date, projection)] en centimes, pour le mois de `today`"""
+    if not len(columns) or columns.origin > today:
+        return []
+    dates = np.datetime64(columns.origin, 'D') + columns.days
+    months = dates.astype('datetime64[M]')
+    current = np.datetime64(today, 'M')
+    history = min(history_months, int(current - np.datetime64(columns.origin, 'M')))
+    spending = (columns.cents < 0) & (columns.categories != NO_CATEGORY) & (dates <= np.datetime64(today, 'D'))
+    category_count = len(columns.category_ids)
+
+    this_month = spending & (months == current)
+    spent = np.bincount(
+        columns.categories[this_month], weights=-columns.cents[this_month], minlength=category_count
+    )
+
+    remaining = np.zeros(category_count)
+    if history:
+        # Dépenses des mois précédents par catégorie, mois et jour du mois
+        past = spending & (months >= current - history) & (months < current)
+        month_offsets = (months[past] - (current - history)).astype(np.int64)
+        day_offsets = (dates[past] - months[past].astype('datetime64[D]')).astype(np.int64)
+        cells = (columns.categories[past].astype(np.int64) * history + month_offsets) * DAYS_IN_MONTH + day_offsets
+        daily = np.bincount(
+            cells, weights=-columns.cents[past], minlength=category_count * history * DAYS_IN_MONTH
+        ).reshape(category_count, history, DAYS_IN_MONTH)
+
+        cumulative = np.cumsum(daily, axis=2)
+        totals = cumulative[:, :, -1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Part du mois dépensée au jour `today.day`, moyenne sur les mois où la catégorie a servi
+            shares = np.where(totals > 0, cumulative[:, :, today.day - 1] / totals, np.nan)
+            share = np.nanmean(np.where(np.isnan(shares).all(axis=1, keepdims=True), 1.0, shares), axis=1)
+        remaining = totals.mean(axis=1) * (1 - share)
+
+    projected = spent + remaining
+    return [
+        (code, spent[code], projected[code])
+        for code in np.flatnonzero(projected > 0)
+    ]
+
+
+def detect_anomalies(columns, today):
+    """[(indice de la transaction, médiane de la catégorie, score)] des dépenses récentes inhabituelles"""
+    if not len(columns) or columns.origin > today:
+        return []
+    day = (today - columns.origin).days
+    sample = (
+        (columns.cents < 0) & (columns.categories != NO_CATEGORY)
+        & (columns.days <= day) & (columns.days > day - ANOMALY_HISTORY_DAYS)
+    )
+    indexes = np.flatnonzero(sample)
+    if not len(indexes):
+        return []
+
+    amounts = -columns.cents[indexes].astype(np.float64)
+    categories = columns.categories[indexes]
+    order = np.lexsort((amounts, categories))
+    indexes, amounts, categories = indexes[order], amounts[order], categories[order]
+    starts, counts, medians = group_medians(categories, amounts)
+    group = np.repeat(np.arange(len(starts)), counts)
+
+    deviations = np.abs(amounts - medians[group])
+    deviation_order = np.lexsort((deviations, group))
+    _, _, mads = group_medians(group, deviations[deviation_order])
+    mean_deviations = np.bincount(group, weights=deviations) / counts
+    scale = np.where(mads > 0, mads / MAD_SCALE, mean_deviations * MEAN_DEVIATION_SCALE)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(scale[group] > 0, (amounts - medians[group]) / scale[group], 0)
+    flagged = (
+        (scores > ANOMALY_SCORE)
+        & (counts[group] >= ANOMALY_MIN_SAMPLES)
+        & (columns.days[indexes] > day - ANOMALY_RECENT_DAYS)
+    )
+    return [
+        (index, median, score)
+        for index, median, score in zip(indexes[flagged], medians[group][flagged], scores[flagged])
+    ]
+
+
+def compute_user_results(user, today, now):
+    """Prévisions et anomalies d'un utilisateur, prêtes à enregistrer"""
+    columns = load_columns(user)
+    month = today.replace(day=1)
+    forecasts = [
+        CategoryForecast(
+            user_id=user.pk, category_id=columns.category_ids[code], month=month, currency=columns.currency,
+            spent=cents_to_decimal(spent), projected=cents_to_decimal(projected), computed_at=now,
+        )
+        for code, spent, projected in forecast_categories(columns, today)
+    ]
+    anomalies = [
+        SpendingAnomaly(
+            user_id=user.pk, transaction_id=int(columns.ids[index]), currency=columns.currency,
+            baseline=cents_to_decimal(median), score=Decimal(f'{score:.2f}'), detected_at=now,
+        )
+        for index, median, score in detect_anomalies(columns, today)
+    ]
+    return forecasts, anomalies
+
+
+def compute_forecasts(users, today=None, batch_size=USERS_PER_BATCH):
+    """Recalcule et remplace les prévisions du mois et les anomalies, par lots d'utilisateurs"""
+    today = today or date.today()
+    now = timezone.now()
+    result = ForecastResult()
+    users = list(users)
+    for start in range(0, len(users), batch_size):
+        chunk = users[start:start + batch_size]
+        forecasts, anomalies = [], []
+        for user in chunk:
+            user_forecasts, user_anomalies = compute_user_results(user, today, now)
+            forecasts += user_forecasts
+            anomalies += user_anomalies
+        user_ids = [user.pk for user in chunk]
+        with transaction.atomic(using=current_database()):
+            CategoryForecast.objects.filter(user_id__in=user_ids, month=today.replace(day=1)).delete()
+            SpendingAnomaly.objects.filter(user_id__in=user_ids).delete()
+            CategoryForecast.objects.bulk_create(forecasts, batch_size=1000)
+            SpendingAnomaly.objects.bulk_create(anomalies, batch_size=1000)
+        result.users += len(chunk)
+        result.forecasts += len(forecasts)
+        result.anomalies += len(anomalies)
+    return result
+
+
+def get_forecasts(user, today, limit=FORECASTS_DISPLAYED):
+    """Projections enregistrées du mois (devise actuelle du profil), avec le budget de la catégorie"""
+    period = today.strftime('%Y-%m')
+    budget = Budget.objects.filter(
+        user_id=OuterRef('user_id'), category_id=OuterRef('category_id'), period=period,
+    ).values('amount')[:1]
+    forecasts = list(
+        CategoryForecast.objects.filter(user=user, month=today.replace(day=1), currency=F('user__profile__currency'))
+        .annotate(budget=Subquery(budget))
+        .select_related('category')[:limit]
+    )
+    for forecast in forecasts:
+        forecast.over_budget = forecast.budget is not None and forecast.projected > forecast.budget
+    return forecasts
+
+
+def get_anomalies(user, today, limit=ANOMALIES_DISPLAYED):
+    """Dépenses inhabituelles enregistrées, des plus récentes aux plus anciennes"""
+    return list(
+        SpendingAnomaly.objects.filter(user=user, transaction__date__gt=today - timedelta(days=ANOMALY_RECENT_DAYS))
+        .select_related('transaction__category')
+        .order_by('-transaction__date', '-score')[:limit]
+    )
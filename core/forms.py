@@ -1,5 +1,9 @@
 from django import forms
+from .currency import get_user_currency
 from .models import Transaction, Category, Budget
+from .importers import detect_format
+from .search import search_transactions
+from .utils import normalize_period
 from datetime import date
 
 
@@ -7,11 +11,12 @@ class TransactionForm(forms.ModelForm):
     """Formulaire standard pour les transactions"""
     class Meta:
         model = Transaction
-        fields = ['type', 'category', 'amount', 'date', 'description']
+        fields = ['type', 'category', 'amount', 'currency', 'date', 'description']
         widgets = {
             'type': forms.Select(attrs={'class': 'form-select'}),
             'category': forms.Select(attrs={'class': 'form-select'}),
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+            'currency': forms.Select(attrs={'class': 'form-select'}),
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'description': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
         }
@@ -23,6 +28,8 @@ class TransactionForm(forms.ModelForm):
         
         if not self.instance.pk:
             self.fields['date'].initial = date.today()
+            if user:
+                self.fields['currency'].initial = get_user_currency(user)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -33,6 +40,14 @@ class TransactionForm(forms.ModelForm):
             raise forms.ValidationError(
                 "Le type de transaction doit correspondre au type de catégorie sélectionnée."
             )
+        
+        # unique_together (recurring, date): `recurring` n'étant pas éditable,
+        # validate_unique ne le vérifie pas
+        trans_date = cleaned_data.get('date')
+        if self.instance.recurring_id and trans_date and Transaction.objects.filter(
+            recurring_id=self.instance.recurring_id, date=trans_date,
+        ).exclude(pk=self.instance.pk).exists():
+            self.add_error('date', "Cette récurrence a déjà une transaction à cette date.")
         return cleaned_data
 
 
@@ -63,6 +78,12 @@ class BudgetForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if user:
             self.fields['category'].queryset = Category.objects.filter(user=user, type='EXPENSE')
+    
+    def clean_period(self):
+        try:
+            return normalize_period(self.cleaned_data['period'])
+        except ValueError:
+            raise forms.ValidationError("Période invalide: utilisez le format YYYY-MM (ex. 2026-03).")
 
 
 class ReportFilterForm(forms.Form):
@@ -70,8 +91,52 @@ class ReportFilterForm(forms.Form):
     end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
     category = forms.ModelChoiceField(queryset=Category.objects.none(), required=False, widget=forms.Select(attrs={'class': 'form-select'}))
     type = forms.ChoiceField(choices=[('', 'Tous'), ('INCOME', 'Revenu'), ('EXPENSE', 'Dépense')], required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    q = forms.CharField(required=False, max_length=200, label='Recherche', widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Description...', 'type': 'search'}))
     
     def __init__(self, user=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
             self.fields['category'].queryset = Category.objects.filter(user=user)
+    
+    def filter_queryset(self, transactions):
+        """Applique les filtres validés à un queryset de transactions"""
+        if self.cleaned_data.get('start_date'):
+            transactions = transactions.filter(date__gte=self.cleaned_data['start_date'])
+        if self.cleaned_data.get('end_date'):
+            transactions = transactions.filter(date__lte=self.cleaned_data['end_date'])
+        if self.cleaned_data.get('category'):
+            transactions = transactions.filter(category=self.cleaned_data['category'])
+        if self.cleaned_data.get('type'):
+            transactions = transactions.filter(type=self.cleaned_data['type'])
+        if self.cleaned_data.get('q'):
+            transactions = search_transactions(transactions, self.cleaned_data['q'])
+        return transactions
+
+
+class TransactionImportForm(forms.Form):
+    """Formulaire d'import de relevé bancaire"""
+    FORMAT_CHOICES = [
+        ('', 'Détection automatique'),
+        ('csv', 'CSV'),
+        ('ofx', 'OFX / QFX'),
+        ('qif', 'QIF'),
+    ]
+    ENCODING_CHOICES = [
+        ('utf-8-sig', 'UTF-8'),
+        ('latin-1', 'ISO-8859-1 (Latin-1)'),
+        ('cp1252', 'Windows-1252'),
+    ]
+    
+    file = forms.FileField(label='Fichier', widget=forms.ClearableFileInput(attrs={'class': 'form-control'}))
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False, label='Format', widget=forms.Select(attrs={'class': 'form-select'}))
+    encoding = forms.ChoiceField(choices=ENCODING_CHOICES, initial='utf-8-sig', label='Encodage', widget=forms.Select(attrs={'class': 'form-select'}))
+    create_categories = forms.BooleanField(required=False, initial=True, label='Créer les catégories manquantes', widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        uploaded = cleaned_data.get('file')
+        if uploaded and not cleaned_data.get('format') and not detect_format(uploaded.name):
+            raise forms.ValidationError(
+                "Format non reconnu: choisissez CSV, OFX ou QIF."
+            )
+        return cleaned_data
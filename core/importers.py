@@ -0,0 +1,340 @@
+"""Import en masse de relevés bancaires (CSV, OFX, QIF)
+
+Le fichier est lu en flux, les catégories sont résolues à partir d'une table
+en mémoire propre à l'utilisateur et les transactions sont insérées par lots
+avec bulk_create dans une seule transaction de base de données.
+"""
+import csv
+import io
+import itertools
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.db import transaction as db_transaction
+
+from .currency import get_user_currency
+from .models import Category, Transaction
+from .sharding import current_database
+from .signals import transactions_bulk_created
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_AMOUNT = Decimal('99999999.99')
+FORMATS = ['csv', 'ofx', 'qif']
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.txt': 'csv', '.ofx': 'ofx', '.qfx': 'ofx', '.qif': 'qif'}
+
+# Formats français en premier: 03/04/2025 est lu comme le 3 avril
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y', '%Y%m%d', '%m/%d/%Y', "%m/%d'%y"]
+
+TYPE_ALIASES = {
+    'income': 'INCOME', 'revenu': 'INCOME', 'credit': 'INCOME', 'crédit': 'INCOME',
+    'expense': 'EXPENSE', 'dépense': 'EXPENSE', 'depense': 'EXPENSE', 'debit': 'EXPENSE', 'débit': 'EXPENSE',
+}
+
+CSV_COLUMNS = {
+    'date': 'date',
+    'type': 'type',
+    'catégorie': 'category', 'categorie': 'category', 'category': 'category',
+    'montant': 'amount', 'amount': 'amount',
+    'description': 'description', 'libellé': 'description', 'libelle': 'description', 'memo': 'description',
+}
+
+
+class ImportRowError(ValueError):
+    """Ligne du fichier importé rejetée"""
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+        self.message = message
+
+
+@dataclass
+class ParsedRow:
+    """Ligne normalisée, prête à devenir une Transaction"""
+    line: int
+    date: object
+    amount: Decimal
+    type: str
+    category: str = ''
+    description: str = ''
+
+
+@dataclass
+class ImportResult:
+    """Bilan d'un import: transactions créées et rapport d'erreurs ligne par ligne"""
+    created: int = 0
+    categories_created: int = 0
+    errors: list = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def rows(self):
+        return self.created + len(self.errors)
+
+
+def detect_format(filename):
+    """Déduit le format (csv, ofx, qif) de l'extension du fichier"""
+    return FORMAT_EXTENSIONS.get(Path(filename or '').suffix.lower())
+
+
+def parse_date(value, formats=DATE_FORMATS):
+    value = (value or '').strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide: {value!r}")
+
+
+def parse_amount(value):
+    """Lit un montant au format français (1 234,56) ou anglais (1,234.56)"""
+    cleaned = re.sub(r'[\s\u00a0\u202f€$£]', '', value or '')
+    if ',' in cleaned and '.' in cleaned:
+        decimal_sep = ',' if cleaned.rindex(',') > cleaned.rindex('.') else '.'
+        thousands_sep = '.' if decimal_sep == ',' else ','
+        cleaned = cleaned.replace(thousands_sep, '').replace(decimal_sep, '.')
+    else:
+        cleaned = cleaned.replace(',', '.')
+    try:
+        return Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"Montant invalide: {value!r}")
+
+
+def normalize_row(line, raw):
+    """Convertit les champs bruts d'une ligne en ParsedRow, ou lève ImportRowError"""
+    try:
+        trans_date = parse_date(raw.get('date'))
+        amount = parse_amount(raw.get('amount'))
+    except ValueError as exc:
+        raise ImportRowError(line, str(exc))
+
+    raw_type = (raw.get('type') or '').strip()
+    if raw_type:
+        trans_type = TYPE_ALIASES.get(raw_type.casefold(), raw_type.upper())
+        if trans_type not in ('INCOME', 'EXPENSE'):
+            raise ImportRowError(line, f"Type inconnu: {raw_type!r}")
+    else:
+        trans_type = 'EXPENSE' if amount < 0 else 'INCOME'
+
+    amount = abs(amount).quantize(Decimal('0.01'))
+    if amount < Decimal('0.01'):
+        raise ImportRowError(line, "Le montant doit être supérieur à zéro")
+    if amount > MAX_AMOUNT:
+        raise ImportRowError(line, f"Montant trop élevé: {amount}")
+
+    category = (raw.get('category') or '').strip()
+    if len(category) > 100:
+        raise ImportRowError(line, "Nom de catégorie trop long (100 caractères maximum)")
+
+    return ParsedRow(
+        line=line,
+        date=trans_date,
+        amount=amount,
+        type=trans_type,
+        category=category,
+        description=(raw.get('description') or '').strip(),
+    )
+
+
+def read_csv(stream):
+    """Lit un CSV avec en-tête (séparateur ; ou , détecté sur la première ligne)"""
+    header = stream.readline()
+    if not header:
+        return
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    reader = csv.reader(itertools.chain([header], stream), delimiter=delimiter)
+    columns = [CSV_COLUMNS.get(name.strip().lstrip('\ufeff').casefold()) for name in next(reader)]
+    if 'date' not in columns or 'amount' not in columns:
+        raise ImportRowError(1, "En-tête CSV invalide: colonnes Date et Montant requises")
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        yield reader.line_num, {
+            column: value for column, value in zip(columns, values) if column
+        }
+
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def read_ofx(stream, chunk_size=64 * 1024):
+    """Lit les blocs <STMTTRN> d'un fichier OFX/QFX par morceaux"""
+    buffer = ''
+    number = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        last_end = 0
+        for match in OFX_TRANSACTION.finditer(buffer):
+            number += 1
+            fields = {name.upper(): value.strip() for name, value in OFX_FIELD.findall(match.group(1))}
+            yield number, {
+                'date': fields.get('DTPOSTED', '')[:8],
+                'amount': fields.get('TRNAMT'),
+                'description': ' - '.join(filter(None, [fields.get('NAME'), fields.get('MEMO')])),
+            }
+            last_end = match.end()
+        buffer = buffer[last_end:]
+        # Ne conserve que le début d'un éventuel bloc incomplet
+        opening = buffer.upper().find('<STMTTRN>')
+        buffer = buffer[opening:] if opening >= 0 else buffer[-len('<STMTTRN>'):]
+        if not chunk:
+            break
+
+
+def read_qif(stream):
+    """Lit les enregistrements d'un fichier QIF (champs D, T/U, P, M, L, fin ^)"""
+    record = {}
+    start = None
+    for line_number, line in enumerate(stream, start=1):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if record:
+                yield start, record
+            record, start = {}, None
+            continue
+        if start is None:
+            start = line_number
+        if code == 'D':
+            record['date'] = value
+        elif code in ('T', 'U'):
+            record['amount'] = value
+        elif code == 'P':
+            record['description'] = value
+        elif code == 'M':
+            record['description'] = ' - '.join(filter(None, [record.get('description'), value]))
+        elif code == 'L' and not value.startswith('['):
+            # Les virements [Compte] ne sont pas des catégories
+            record['category'] = value.split(':')[0]
+    if record:
+        yield start, record
+
+
+READERS = {'csv': read_csv, 'ofx': read_ofx, 'qif': read_qif}
+
+
+class TransactionImporter:
+    """Importe des lignes de relevé pour un utilisateur, par lots"""
+
+    def __init__(self, user, batch_size=DEFAULT_BATCH_SIZE, create_categories=True, dry_run=False):
+        self.user = user
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        # Les relevés n'indiquent pas de devise: celle du profil
+        self.currency = get_user_currency(user)
+        self.categories = {
+            (category.name.casefold(), category.type): category
+            for category in Category.objects.filter(user=user)
+        }
+
+    def resolve_categories(self, rows, result):
+        """Résout les catégories d'un lot, crée les manquantes en une requête.
+
+        Les catégories sont indexées par (nom, type): une ligne ne peut donc
+        être rattachée qu'à une catégorie de même type qu'elle.
+        """
+        missing = {}
+        for row in rows:
+            key = (row.category.casefold(), row.type)
+            if row.category and key not in self.categories:
+                missing.setdefault(key, row.category)
+        if not missing:
+            return []
+
+        if not self.create_categories:
+            rejected = []
+            for row in rows:
+                key = (row.category.casefold(), row.type)
+                if key in missing:
+                    other_type = any(name == key[0] for name, _ in self.categories)
+                    message = (
+                        "Le type de transaction doit correspondre au type de catégorie"
+                        if other_type else f"Catégorie inconnue: {row.category}"
+                    )
+                    rejected.append(ImportRowError(row.line, message))
+            return rejected
+
+        created = [
+            Category(user=self.user, name=name, type=trans_type)
+            for (_, trans_type), name in missing.items()
+        ]
+        if not self.dry_run:
+            Category.objects.bulk_create(created)
+            if any(category.pk is None for category in created):
+                # Base sans RETURNING: on relit les catégories créées
+                created = list(Category.objects.filter(
+                    user=self.user, name__in=[category.name for category in created]
+                ))
+        for category in created:
+            self.categories[(category.name.casefold(), category.type)] = category
+        result.categories_created += len(missing)
+        return []
+
+    def flush(self, rows, result):
+        rejected = self.resolve_categories(rows, result)
+        rejected_lines = {error.line for error in rejected}
+        result.errors.extend(rejected)
+
+        transactions = [
+            Transaction(
+                user=self.user,
+                category=self.categories.get((row.category.casefold(), row.type)) if row.category else None,
+                type=row.type,
+                amount=row.amount,
+                currency=self.currency,
+                date=row.date,
+                description=row.description,
+            )
+            for row in rows
+            if row.line not in rejected_lines
+        ]
+        if transactions and not self.dry_run:
+            Transaction.objects.bulk_create(transactions, batch_size=self.batch_size)
+            transactions_bulk_created.send(sender=Transaction, transactions=transactions)
+        result.created += len(transactions)
+
+    def run(self, raw_rows):
+        """Importe un itérable de (numéro de ligne, champs bruts)"""
+        result = ImportResult(dry_run=self.dry_run)
+        pending = []
+        with db_transaction.atomic(using=current_database()):
+            try:
+                for line, raw in raw_rows:
+                    try:
+                        pending.append(normalize_row(line, raw))
+                    except ImportRowError as error:
+                        result.errors.append(error)
+                        continue
+                    if len(pending) >= self.batch_size:
+                        self.flush(pending, result)
+                        pending = []
+            except ImportRowError as error:
+                # Erreur bloquante du lecteur (en-tête invalide...)
+                result.errors.append(error)
+            if pending:
+                self.flush(pending, result)
+            if self.dry_run:
+                db_transaction.set_rollback(True)
+        result.errors.sort(key=lambda error: error.line)
+        return result
+
+
+def import_file(user, binary_file, fmt=None, filename='', encoding='utf-8-sig', **options):
+    """Importe un fichier binaire (upload ou fichier ouvert) pour `user`"""
+    fmt = fmt or detect_format(filename)
+    if fmt not in READERS:
+        raise ValueError(f"Format de fichier non pris en charge: {filename or fmt}")
+    stream = io.TextIOWrapper(binary_file, encoding=encoding, errors='replace', newline='')
+    try:
+        return TransactionImporter(user, **options).run(READERS[fmt](stream))
+    finally:
+        stream.detach()
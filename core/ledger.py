@@ -0,0 +1,299 @@
+"""Registre des soldes: un point de solde cumulé par mois, par utilisateur et par devise
+
+Le solde de tous les temps est celui du dernier point de chaque devise; le
+solde à une date donnée est celui du mois précédent plus les transactions du
+mois jusqu'à cette date. Une transaction du mois M décale le solde de M et de
+tous les mois suivants de sa devise, en une seule requête UPDATE. Les soldes
+des différentes devises sont convertis dans la devise du profil à la lecture
+(voir core.currency.RateCache).
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from .currency import get_user_currency, rate_cache
+from .models import BalanceCheckpoint, Transaction
+from .rollups import BULK_THRESHOLD, BULK_USERS, month_start
+from .sharding import current_database
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def signed_amount(trans_type, amount):
+    """Effet d'une transaction sur le solde: + pour un revenu, - pour une dépense"""
+    amount = Decimal(amount)
+    return amount if trans_type == 'INCOME' else -amount
+
+
+def apply_balance_delta(user_id, month, currency, amount, exists=False):
+    """Ajoute `amount` au mois `month` et au solde cumulé des mois suivants de la devise.
+
+    `exists`: le point du mois est connu (il a une synthèse mensuelle), une
+    seule requête suffit.
+    """
+    checkpoints = BalanceCheckpoint.objects.filter(user_id=user_id, currency=currency)
+    if exists:
+        month_net = Case(When(month=month, then=Value(amount)), default=Value(ZERO), output_field=DecimalField())
+        checkpoints.filter(month__gte=month).update(net=F('net') + month_net, balance=F('balance') + amount)
+        return
+    with transaction.atomic(using=current_database(), savepoint=False):
+        if not checkpoints.filter(month=month).update(net=F('net') + amount):
+            previous = (
+                checkpoints.filter(month__lt=month).order_by('-month').values_list('balance', flat=True).first()
+            )
+            try:
+                with transaction.atomic(using=current_database()):
+                    BalanceCheckpoint.objects.create(
+                        user_id=user_id, month=month, currency=currency, net=amount, balance=previous or ZERO,
+                    )
+            except IntegrityError:
+                # Une autre requête a créé le point entre-temps
+                checkpoints.filter(month=month).update(net=F('net') + amount)
+        checkpoints.filter(month__gte=month).update(balance=F('balance') + amount)
+
+
+def apply_balance_deltas(deltas, existing=frozenset()):
+    """Applique un dictionnaire {(user_id, mois, devise): montant signé}; `existing`: points connus"""
+    for key, amount in sorted(deltas.items()):
+        if amount:
+            apply_balance_delta(*key, amount, exists=key in existing)
+
+
+def apply_bulk_balance_deltas(deltas):
+    """Applique de nombreux deltas en quelques requêtes par tranche d'utilisateurs.
+
+    Les points de solde des utilisateurs concernés sont verrouillés, décalés
+    en Python puis écrits par bulk_update; les mois manquants sont créés par
+    bulk_create. En cas de création concurrente, la tranche est rejouée
+    mois par mois.
+    """
+    if len(deltas) < BULK_THRESHOLD:
+        return apply_balance_deltas(deltas)
+    by_user = defaultdict(dict)
+    for (user_id, month, currency), amount in deltas.items():
+        if amount:
+            by_user[user_id][(month, currency)] = amount
+    user_ids = sorted(by_user)
+    for start in range(0, len(user_ids), BULK_USERS):
+        chunk = {user_id: by_user[user_id] for user_id in user_ids[start:start + BULK_USERS]}
+        try:
+            with transaction.atomic(using=current_database()):
+                apply_balance_deltas_chunk(chunk)
+        except IntegrityError:
+            apply_balance_deltas({
+                (user_id, month, currency): amount
+                for user_id, months in chunk.items() for (month, currency), amount in months.items()
+            })
+
+
+def apply_balance_deltas_chunk(by_user):
+    checkpoints = defaultdict(dict)
+    for checkpoint in BalanceCheckpoint.objects.select_for_update().filter(user_id__in=list(by_user)):
+        checkpoints[(checkpoint.user_id, checkpoint.currency)][checkpoint.month] = checkpoint
+
+    series = defaultdict(dict)
+    for user_id, months in by_user.items():
+        for (month, currency), amount in months.items():
+            series[(user_id, currency)][month] = amount
+
+    updated, created = [], []
+    for (user_id, currency), months in series.items():
+        existing = checkpoints[(user_id, currency)]
+        shift = ZERO
+        previous = ZERO
+        for month in sorted(set(existing) | set(months)):
+            amount = months.get(month, ZERO)
+            shift += amount
+            checkpoint = existing.get(month)
+            if checkpoint is None:
+                created.append(BalanceCheckpoint(
+                    user_id=user_id, month=month, currency=currency, net=amount, balance=previous + shift,
+                ))
+                continue
+            previous = checkpoint.balance
+            if shift or amount:
+                checkpoint.net += amount
+                checkpoint.balance += shift
+                updated.append(checkpoint)
+    BalanceCheckpoint.objects.bulk_update(updated, ['net', 'balance'], batch_size=1000)
+    BalanceCheckpoint.objects.bulk_create(created, batch_size=1000)
+
+
+def record_balance_change(previous, current, existing=frozenset()):
+    """Met à jour le registre après création, modification ou suppression d'une transaction.
+
+    `previous` est l'instantané des valeurs avant modification (ou None),
+    `current` la transaction enregistrée (ou None en cas de suppression),
+    `existing` les (user_id, mois, devise) dont le point de solde existe.
+    """
+    deltas = defaultdict(Decimal)
+    if previous is not None:
+        deltas[(previous['user_id'], month_start(previous['date']), previous['currency'])] -= signed_amount(
+            previous['type'], previous['amount']
+        )
+    if current is not None:
+        deltas[(current.user_id, month_start(current.date), current.currency)] += signed_amount(
+            current.type, current.amount
+        )
+    apply_balance_deltas(deltas, existing)
+
+
+def record_balance_bulk_insert(transactions):
+    """Met à jour le registre pour des transactions insérées avec bulk_create"""
+    deltas = defaultdict(Decimal)
+    for trans in transactions:
+        deltas[(trans.user_id, month_start(trans.date), trans.currency)] += signed_amount(trans.type, trans.amount)
+    apply_bulk_balance_deltas(deltas)
+
+
+def compute_checkpoints(user_ids=None):
+    """{(user_id, devise): [(mois, solde du mois, solde cumulé), ...]} calculé depuis les transactions"""
+    transactions = Transaction.objects.all()
+    if user_ids is not None:
+        transactions = transactions.filter(user_id__in=user_ids)
+    rows = (
+        transactions
+        .annotate(month=TruncMonth('date'))
+        .values('user_id', 'currency', 'month')
+        .annotate(
+            income=Sum('amount', filter=Q(type='INCOME')),
+            expense=Sum('amount', filter=Q(type='EXPENSE')),
+        )
+        .order_by('user_id', 'currency', 'month')
+    )
+    checkpoints = defaultdict(list)
+    balances = defaultdict(Decimal)
+    for row in rows:
+        key = (row['user_id'], row['currency'])
+        # SQLite additionne les décimaux en flottants: on revient au centime
+        net = ((row['income'] or ZERO) - (row['expense'] or ZERO)).quantize(CENT)
+        balances[key] += net
+        checkpoints[key].append((row['month'], net, balances[key]))
+    return checkpoints
+
+
+def rebuild_balance_checkpoints(user_ids=None, batch_size=1000):
+    """Reconstruit le registre à partir des transactions (idempotent)"""
+    computed = compute_checkpoints(user_ids)
+    checkpoints = BalanceCheckpoint.objects.all()
+    if user_ids is not None:
+        checkpoints = checkpoints.filter(user_id__in=user_ids)
+
+    with transaction.atomic(using=current_database()):
+        checkpoints.delete()
+        BalanceCheckpoint.objects.bulk_create(
+            [
+                BalanceCheckpoint(user_id=user_id, currency=currency, month=month, net=net, balance=balance)
+                for (user_id, currency), rows in computed.items()
+                for month, net, balance in rows
+            ],
+            batch_size=batch_size,
+        )
+    return sum(len(rows) for rows in computed.values())
+
+
+def verify_balance_checkpoints(user_ids=None):
+    """Compare le registre aux transactions brutes et retourne les écarts"""
+    computed = {
+        (user_id, currency, month): (net, balance)
+        for (user_id, currency), rows in compute_checkpoints(user_ids).items()
+        for month, net, balance in rows
+    }
+    checkpoints = BalanceCheckpoint.objects.all()
+    if user_ids is not None:
+        checkpoints = checkpoints.filter(user_id__in=user_ids)
+    stored = {
+        (row['user_id'], row['currency'], row['month']): (row['net'], row['balance'])
+        for row in checkpoints.values('user_id', 'currency', 'month', 'net', 'balance')
+    }
+
+    mismatches = []
+    for key in sorted(set(computed) | set(stored)):
+        expected = computed.get(key)
+        actual = stored.get(key)
+        # Un mois vidé de ses transactions peut garder un point de solde net nul
+        if expected is None and actual is not None and actual[0] == 0:
+            expected = actual
+        if expected != actual:
+            mismatches.append({'key': key, 'expected': expected, 'actual': actual})
+    return mismatches
+
+
+def convert_balances(balances, currency, day):
+    """Somme de {devise: solde} convertie dans `currency` au taux du jour `day`.
+
+    Une devise sans aucun taux vers `currency` est ignorée, comme dans les
+    agrégats SQL.
+    """
+    total = ZERO
+    for source, balance in balances.items():
+        amount = rate_cache.convert(balance, source, currency, day)
+        if amount is not None:
+            total += amount
+    return total
+
+
+def get_balance(user, currency=None, today=None):
+    """Solde de tous les temps: le dernier point de chaque devise, converti au taux du jour"""
+    currency = currency or get_user_currency(user)
+    latest = (
+        BalanceCheckpoint.objects.filter(user_id=OuterRef('user_id'), currency=OuterRef('currency'))
+        .order_by('-month').values('month')[:1]
+    )
+    balances = dict(
+        BalanceCheckpoint.objects.filter(user=user, month=Subquery(latest)).values_list('currency', 'balance')
+    )
+    return convert_balances(balances, currency, today or date.today())
+
+
+def get_balance_at(user, day, currency=None):
+    """Solde en fin de journée `day`: point du mois précédent + transactions du mois jusqu'à `day`"""
+    currency = currency or get_user_currency(user)
+    month = month_start(day)
+    previous = (
+        BalanceCheckpoint.objects.filter(user_id=OuterRef('user_id'), currency=OuterRef('currency'), month__lt=month)
+        .order_by('-month').values('month')[:1]
+    )
+    balances = defaultdict(Decimal, BalanceCheckpoint.objects.filter(
+        user=user, month=Subquery(previous)
+    ).values_list('currency', 'balance'))
+    tail = (
+        Transaction.objects.filter(user=user, date__gte=month, date__lte=day)
+        .values('currency')
+        .annotate(income=Sum('amount', filter=Q(type='INCOME')), expense=Sum('amount', filter=Q(type='EXPENSE')))
+        .order_by()
+    )
+    for row in tail:
+        balances[row['currency']] += ((row['income'] or ZERO) - (row['expense'] or ZERO)).quantize(CENT)
+    return convert_balances(balances, currency, day).quantize(CENT)
+
+
+def get_balance_history(user, today=None, currency=None):
+    """Solde en fin de mois, du premier mois d'activité jusqu'au mois courant"""
+    today = today or date.today()
+    currency = currency or get_user_currency(user)
+    rows = list(
+        BalanceCheckpoint.objects.filter(user=user).order_by('month').values_list('month', 'currency', 'balance')
+    )
+    if not rows:
+        return []
+    by_month = defaultdict(dict)
+    for month, source, balance in rows:
+        by_month[month][source] = balance
+    history = []
+    month, last_month = rows[0][0], max(rows[-1][0], today.replace(day=1))
+    balances = {}
+    while month <= last_month:
+        # Les mois sans transaction reprennent le solde du mois précédent
+        balances.update(by_month.get(month, {}))
+        # Converti au taux de fin de mois (du jour pour le mois courant)
+        day = min(month + relativedelta(months=1, days=-1), today)
+        history.append({'label': month.strftime('%b %Y'), 'balance': float(convert_balances(balances, currency, day))})
+        month += relativedelta(months=1)
+    return history
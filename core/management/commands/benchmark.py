@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmarks import DEFAULT_SIZES, VIEW_BUDGETS, compare_reports, run_benchmarks
+
+
+def parse_size(value):
+    """Accepte 1000, 100k ou 1M"""
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    value = value.strip().lower()
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+class Command(BaseCommand):
+    help = "Mesure les vues principales (temps, requêtes SQL, mémoire) et vérifie leurs budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                            help="Volumes de transactions, séparés par des virgules (ex: 1k,100k,1M)")
+        parser.add_argument('--view', action='append', dest='views', choices=sorted(VIEW_BUDGETS),
+                            help="Limiter à cette vue (répétable)")
+        parser.add_argument('--repeat', type=int, default=3, help="Appels à froid par vue (défaut: 3)")
+        parser.add_argument('--latency-factor', type=float, default=1.0,
+                            help="Multiplicateur des budgets de latence (machine lente: 2, 3...)")
+        parser.add_argument('--output', default='benchmark-report.json',
+                            help="Rapport JSON (défaut: benchmark-report.json)")
+        parser.add_argument('--compare', help="Rapport JSON précédent à comparer")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Conserver la base de test (et les données générées) entre deux exécutions")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [parse_size(value) for value in options['sizes'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError(f"Volumes invalides: {options['sizes']}")
+
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as report_file:
+                    previous = json.load(report_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Rapport de comparaison illisible: {exc}")
+
+        # Les données du banc sont générées dans la base de test, jamais dans la base réelle
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            report = run_benchmarks(
+                sizes=sizes,
+                views=options['views'],
+                repeat=max(1, options['repeat']),
+                latency_factor=options['latency_factor'],
+                progress=self.stdout.write,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        with open(options['output'], 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2, ensure_ascii=False)
+
+        if previous:
+            for line in compare_reports(previous, report):
+                self.stdout.write(line)
+
+        violations = [
+            f"{row['view']} / {row['size']}: {violation}"
+            for row in report['results']
+            for violation in row['violations']
+        ]
+        if violations:
+            for violation in violations:
+                self.stderr.write(violation)
+            raise CommandError(f"{len(violations)} budget(s) dépassé(s), rapport: {options['output']}")
+        self.stdout.write(self.style.SUCCESS(f"✓ Tous les budgets sont respectés, rapport: {options['output']}"))
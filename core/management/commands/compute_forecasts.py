@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.forecasting import USERS_PER_BATCH, ForecastResult, compute_forecasts
+from core.models import Transaction
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Précalcule les projections de fin de mois et les dépenses inhabituelles (tâche de nuit)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+        parser.add_argument('--today', help="Date de calcul (YYYY-MM-DD, défaut: aujourd'hui)")
+        parser.add_argument('--batch-size', type=int, default=USERS_PER_BATCH,
+                            help=f"Utilisateurs enregistrés par transaction (défaut: {USERS_PER_BATCH})")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options['today']) if options['today'] else date.today()
+        except ValueError:
+            raise CommandError(f"Date invalide: {options['today']}")
+        total = ForecastResult()
+        for alias in shard_aliases():
+            with on_shard(alias):
+                # Utilisateurs ayant des transactions sur ce shard (la table User est sur `default`)
+                user_ids = Transaction.objects.order_by().values_list('user_id', flat=True).distinct()
+                if options['user_ids']:
+                    user_ids = user_ids.filter(user_id__in=options['user_ids'])
+                shard_users = User.objects.filter(pk__in=list(user_ids)).order_by('pk')
+                result = compute_forecasts(shard_users.iterator(), today, options['batch_size'])
+            total.users += result.users
+            total.forecasts += result.forecasts
+            total.anomalies += result.anomalies
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {total.users} utilisateur(s), {total.forecasts} prévision(s), "
+            f"{total.anomalies} dépense(s) inhabituelle(s)"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.budgets import evaluate_budgets
+from core.models import Budget
+from core.sharding import on_shard, shard_aliases
+from core.utils import normalize_period
+
+
+class Command(BaseCommand):
+    help = "Recalcule la consommation et l'état d'alerte enregistrés sur les budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+        parser.add_argument('--period', help="Limiter à cette période (YYYY-MM)")
+        parser.add_argument('--no-events', action='store_true',
+                            help="Ne pas consigner les changements d'état dans l'historique")
+
+    def handle(self, *args, **options):
+        if options['period']:
+            # Les périodes sont enregistrées sous la forme YYYY-MM
+            try:
+                options['period'] = normalize_period(options['period'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        count, events = 0, []
+        for alias in shard_aliases():
+            with on_shard(alias):
+                budgets = Budget.objects.all()
+                if options['user_ids']:
+                    budgets = budgets.filter(user_id__in=options['user_ids'])
+                if options['period']:
+                    budgets = budgets.filter(period=options['period'])
+                events += evaluate_budgets(budgets, record_events=not options['no_events'])
+                count += budgets.count()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {count} budget(s) évalué(s), {len(events)} changement(s) d'état"
+        ))
@@ -0,0 +1,68 @@
+import multiprocessing
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from core.synthetic import DEFAULT_BATCH_SIZE, DEFAULT_PASSWORD, create_users, populate_user
+
+
+def populate_chunk(job):
+    """Point d'entrée d'un worker: génère une liste d'utilisateurs"""
+    users, options = job
+    return sum(populate_user(user_id, index, **options) for index, user_id in users)
+
+
+class Command(BaseCommand):
+    help = "Génère des données de démonstration déterministes (utilisateurs, catégories, transactions, budgets)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1, help="Nombre d'utilisateurs (défaut: 1)")
+        parser.add_argument('--transactions', type=int, default=500,
+                            help="Nombre de transactions par utilisateur (défaut: 500)")
+        parser.add_argument('--months', type=int, default=24, help="Historique couvert en mois (défaut: 24)")
+        parser.add_argument('--seed', type=int, default=42, help="Graine aléatoire (défaut: 42)")
+        parser.add_argument('--prefix', default='demo', help="Préfixe des noms d'utilisateur (défaut: demo)")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD,
+                            help=f"Mot de passe des comptes créés (défaut: {DEFAULT_PASSWORD})")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processus parallèles (PostgreSQL uniquement, défaut: 1)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Taille des lots d'insertion (défaut: {DEFAULT_BATCH_SIZE})")
+        parser.add_argument('--today', type=date.fromisoformat,
+                            help="Date de fin de l'historique, YYYY-MM-DD (défaut: aujourd'hui)")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['transactions'] < 0 or options['months'] < 1:
+            raise CommandError("--users et --months doivent être positifs, --transactions ne peut être négatif")
+
+        workers = max(1, options['workers'])
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write("SQLite n'accepte qu'un écrivain à la fois: génération séquentielle")
+            workers = 1
+
+        started = time.monotonic()
+        users = create_users(options['users'], prefix=options['prefix'], password=options['password'])
+        populate_options = {
+            'seed': options['seed'],
+            'transaction_count': options['transactions'],
+            'months_count': options['months'],
+            'batch_size': options['batch_size'],
+            'today': options['today'],
+        }
+
+        if workers == 1:
+            total = populate_chunk((users, populate_options))
+        else:
+            # Chaque processus ouvre sa propre connexion
+            connections.close_all()
+            jobs = [(users[i::workers], populate_options) for i in range(workers)]
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                total = sum(pool.map(populate_chunk, jobs))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {len(users)} utilisateur(s), {total} transaction(s) générées en {elapsed:.1f}s "
+            f"(mot de passe: {options['password']})"
+        ))
@@ -0,0 +1,51 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import DEFAULT_BATCH_SIZE, FORMATS, detect_format, import_file
+from core.sharding import for_user
+
+
+class Command(BaseCommand):
+    help = "Importe un relevé bancaire (CSV, OFX, QIF) pour un utilisateur"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="Nom d'utilisateur destinataire")
+        parser.add_argument('path', help="Chemin du fichier à importer")
+        parser.add_argument('--format', choices=FORMATS, help="Format du fichier (déduit de l'extension par défaut)")
+        parser.add_argument('--encoding', default='utf-8-sig', help="Encodage du fichier (défaut: utf-8-sig)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Taille des lots d'insertion (défaut: {DEFAULT_BATCH_SIZE})")
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help="Rejeter les lignes dont la catégorie n'existe pas")
+        parser.add_argument('--dry-run', action='store_true', help="Valider sans rien enregistrer")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable: {options['username']}")
+        if not options['format'] and not detect_format(options['path']):
+            raise CommandError("Format non reconnu, précisez --format")
+
+        try:
+            with for_user(user.pk), open(options['path'], 'rb') as binary_file:
+                result = import_file(
+                    user,
+                    binary_file,
+                    fmt=options['format'],
+                    filename=options['path'],
+                    encoding=options['encoding'],
+                    batch_size=options['batch_size'],
+                    create_categories=not options['no_create_categories'],
+                    dry_run=options['dry_run'],
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stderr.write(f"ligne {error.line}: {error.message}")
+        prefix = "[simulation] " if result.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {prefix}{result.created} transaction(s) importée(s), "
+            f"{result.categories_created} catégorie(s) créée(s), {len(result.errors)} erreur(s)"
+        ))
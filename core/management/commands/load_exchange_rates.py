@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.budgets import evaluate_budgets
+from core.caching import bump_global_version
+from core.currency import RateFileError, foreign_currency_users, load_rates, read_rates
+from core.models import Budget
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Charge des taux de change depuis un fichier CSV (date,base,quote,rate)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Chemin du fichier de taux")
+        parser.add_argument('--encoding', default='utf-8-sig', help="Encodage du fichier (défaut: utf-8-sig)")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as stream:
+                rates = read_rates(stream)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except RateFileError as exc:
+            raise CommandError(f"Fichier de taux invalide, {exc}")
+
+        count = load_rates(rates)
+        # Les montants convertis changent: caches et budgets des comptes multi-devises
+        bump_global_version()
+        events = []
+        for alias in shard_aliases():
+            with on_shard(alias):
+                events += evaluate_budgets(Budget.objects.filter(user_id__in=foreign_currency_users()))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {len(rates)} taux lu(s), {count} taux enregistré(s) avec les paires inverses et croisées, "
+            f"{len(events)} changement(s) d'état de budget"
+        ))
@@ -0,0 +1,39 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.recurring import DEFAULT_BATCH_SIZE, MaterializeResult, materialize_due
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Crée les transactions dues des transactions récurrentes de tous les utilisateurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--today', help="Date de référence YYYY-MM-DD (défaut: aujourd'hui)")
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"Nombre de calendriers traités par lot (défaut: {DEFAULT_BATCH_SIZE})")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options['today']) if options['today'] else date.today()
+        except ValueError:
+            raise CommandError(f"Date invalide: {options['today']} (format attendu: YYYY-MM-DD)")
+
+        started = time.perf_counter()
+        result = MaterializeResult()
+        for alias in shard_aliases():
+            with on_shard(alias):
+                shard = materialize_due(today, user_ids=options['user_ids'], batch_size=options['batch_size'])
+            result.schedules += shard.schedules
+            result.created += shard.created
+            result.skipped += shard.skipped
+            result.finished += shard.finished
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {result.created} transaction(s) créée(s) pour {result.schedules} récurrence(s), "
+            f"{result.skipped} déjà présente(s), {result.finished} terminée(s) "
+            f"en {time.perf_counter() - started:.1f}s"
+        ))
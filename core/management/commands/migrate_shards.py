@@ -0,0 +1,17 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.sharding import on_shard, set_id_offsets, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Applique les migrations sur chaque shard et place ses identifiants dans sa plage"
+
+    def handle(self, *args, **options):
+        for alias in shard_aliases():
+            # Les migrations de données (RunPython) passent par le routeur: elles visent ce shard
+            with on_shard(alias):
+                call_command('migrate', database=alias, interactive=False, verbosity=options['verbosity'] - 1,
+                             stdout=self.stdout, stderr=self.stderr)
+            set_id_offsets(alias)
+            self.stdout.write(self.style.SUCCESS(f"✓ Shard {alias} à jour"))
@@ -0,0 +1,51 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import UserShard
+from core.sharding import COPY_BATCH_SIZE, DEFAULT, move_user, placement, shard_aliases, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = "Déplace les utilisateurs dont le shard ne correspond plus au hachage (après l'ajout d'un shard)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+        parser.add_argument('--batch-size', type=int, default=COPY_BATCH_SIZE,
+                            help=f"Taille des lots de copie (défaut: {COPY_BATCH_SIZE})")
+        parser.add_argument('--dry-run', action='store_true', help="Lister les déplacements sans rien modifier")
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError("Un seul shard configuré (SHARD_DATABASE_URLS vide)")
+        aliases = set(shard_aliases())
+        # Sans entrée dans l'annuaire: comptes antérieurs au partitionnement, sur `default`
+        current = dict(UserShard.objects.values_list('user_id', 'database'))
+        users = User.objects.order_by('pk')
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+
+        moves = []
+        for user_id in users.values_list('pk', flat=True).iterator():
+            source = current.get(user_id, DEFAULT)
+            if source not in aliases:
+                raise CommandError(f"user={user_id}: shard {source} absent de la configuration")
+            if source != placement(user_id):
+                moves.append((user_id, source, placement(user_id)))
+
+        started, rows = time.perf_counter(), 0
+        for user_id, source, target in moves:
+            if options['dry_run']:
+                self.stdout.write(f"user={user_id}: {source} → {target}")
+                continue
+            copied = move_user(user_id, source, target, options['batch_size'])
+            rows += copied
+            self.stdout.write(f"user={user_id}: {source} → {target}, {copied} ligne(s)")
+
+        prefix = "[simulation] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {prefix}{len(moves)} utilisateur(s) déplacé(s), {rows} ligne(s) copiée(s) "
+            f"en {time.perf_counter() - started:.1f}s"
+        ))
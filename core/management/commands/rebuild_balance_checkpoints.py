@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ledger import rebuild_balance_checkpoints, verify_balance_checkpoints
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Reconstruit (ou vérifie) le registre des soldes à partir des transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Taille des lots d'insertion (défaut: 1000)")
+        parser.add_argument('--check', action='store_true',
+                            help="Vérifier le registre sans le modifier")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = []
+            for alias in shard_aliases():
+                with on_shard(alias):
+                    mismatches += verify_balance_checkpoints(options['user_ids'])
+            for mismatch in mismatches:
+                user_id, month = mismatch['key']
+                self.stderr.write(
+                    f"user={user_id} mois={month:%Y-%m}: attendu {mismatch['expected']}, trouvé {mismatch['actual']}"
+                )
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} écart(s) détecté(s), relancez sans --check")
+            self.stdout.write(self.style.SUCCESS("✓ Registre des soldes cohérent"))
+            return
+
+        count = 0
+        for alias in shard_aliases():
+            with on_shard(alias):
+                count += rebuild_balance_checkpoints(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✓ {count} points de solde reconstruits"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import rebuild_monthly_summaries
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la table MonthlySummary à partir des transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Taille des lots d'insertion (défaut: 1000)")
+
+    def handle(self, *args, **options):
+        count = 0
+        for alias in shard_aliases():
+            with on_shard(alias):
+                count += rebuild_monthly_summaries(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✓ {count} lignes de synthèse reconstruites"))
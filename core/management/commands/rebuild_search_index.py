@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des descriptions de transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Alias de la base (défaut: default)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        backend = rebuild_search_index(options['database'])
+        if backend == 'python':
+            self.stdout.write(self.style.WARNING(
+                "Aucun index plein texte sur cette base: la recherche utilise le repli Python"
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Index {backend} reconstruit en {time.perf_counter() - started:.1f}s"
+        ))
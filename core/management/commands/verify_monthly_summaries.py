@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rollups import verify_monthly_summaries
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Vérifie la table MonthlySummary par rapport aux transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Limiter à cet identifiant d'utilisateur (répétable)")
+
+    def handle(self, *args, **options):
+        mismatches = []
+        for alias in shard_aliases():
+            with on_shard(alias):
+                mismatches += verify_monthly_summaries(options['user_ids'])
+        for mismatch in mismatches:
+            user_id, month, category_id, trans_type = mismatch['key']
+            expected_total, expected_count = mismatch['expected']
+            actual_total, actual_count = mismatch['actual']
+            self.stderr.write(
+                f"user={user_id} mois={month:%Y-%m} catégorie={category_id} type={trans_type}: "
+                f"attendu {expected_total}€ ({expected_count}), trouvé {actual_total}€ ({actual_count})"
+            )
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} écart(s) détecté(s), lancez rebuild_monthly_summaries"
+            )
+        self.stdout.write(self.style.SUCCESS("✓ Synthèse mensuelle cohérente"))
@@ -0,0 +1,209 @@
+"""Instrumentation SQL par requête: nombre, durée et requêtes répétées
+
+Chaque requête HTTP enregistre ses requêtes SQL via connection.execute_wrapper.
+Le texte SQL reçu est déjà paramétré (%s), il sert donc directement de clé
+de regroupement; la normalisation des listes IN n'est faite qu'au moment du
+rapport, ce qui garde un coût négligeable par requête SQL.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .routers import pin_to_primary, replica_configured, track_writes
+from .sharding import for_user, sharding_enabled
+
+logger = logging.getLogger('core.sql')
+
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+QUOTED_VALUE = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+\b')
+
+# Compteurs de la requête HTTP en cours, retrouvés par les threads de core.concurrency
+_current_stats = contextvars.ContextVar('sql_query_stats', default=None)
+
+
+def fingerprint(sql):
+    """Forme d'une requête: littéraux et listes IN remplacés par des jokers"""
+    sql = PLACEHOLDER_LIST.sub('%s, ...', sql)
+    sql = QUOTED_VALUE.sub('?', sql)
+    return NUMBER.sub('?', sql)
+
+
+class QueryStats:
+    """Compteurs SQL d'une requête HTTP"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        # Les blocs des vues asynchrones comptent depuis plusieurs threads
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.duration += elapsed
+                self.count += 1
+                self.statements[sql] += 1
+
+    def fingerprints(self):
+        shapes = Counter()
+        for sql, count in self.statements.items():
+            shapes[fingerprint(sql)] += count
+        return shapes
+
+    @property
+    def duplicates(self):
+        """Requêtes exécutées en trop (même forme déjà vue dans la requête HTTP)"""
+        return sum(count - 1 for count in self.fingerprints().values() if count > 1)
+
+    def instrument(self):
+        """Installe l'enregistreur sur toutes les connexions configurées"""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+def instrument_thread():
+    """Compte aussi les requêtes de ce thread (connexions propres au thread) pour la requête HTTP en cours"""
+    stats = _current_stats.get()
+    return stats.instrument() if stats is not None else nullcontext()
+
+
+class SQLInstrumentationMiddleware:
+    """Mesure les requêtes SQL de chaque vue.
+
+    Ajoute un en-tête Server-Timing, écrit une ligne de journal par requête
+    HTTP et, au-delà de SQL_INSTRUMENTATION_QUERY_THRESHOLD requêtes, les
+    formes SQL les plus répétées (N+1). Activé par SQL_INSTRUMENTATION.
+    Les blocs des vues asynchrones (core.concurrency) s'ajoutent aux compteurs.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SQL_INSTRUMENTATION_QUERY_THRESHOLD', 50)
+        self.headers = getattr(settings, 'SQL_INSTRUMENTATION_HEADERS', True)
+        self.top = getattr(settings, 'SQL_INSTRUMENTATION_TOP_FINGERPRINTS', 5)
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        token = _current_stats.set(stats)
+        try:
+            with stats.instrument():
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        elapsed = time.perf_counter() - started
+
+        if self.headers:
+            duplicates = stats.duplicates
+            response['Server-Timing'] = ', '.join([
+                f'sql;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+                f'sql-dup;desc="{duplicates} duplicates"',
+                f'app;dur={elapsed * 1000:.1f}',
+            ])
+
+        if response.streaming:
+            # Les exports exécutent leurs requêtes pendant l'envoi du flux
+            response.streaming_content = self.stream(response.streaming_content, request, response, stats, started)
+        else:
+            self.report(request, response, stats, elapsed)
+        return response
+
+    def stream(self, content, request, response, stats, started):
+        with stats.instrument():
+            yield from content
+        self.report(request, response, stats, time.perf_counter() - started)
+
+    def report(self, request, response, stats, elapsed):
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'sql_ms': round(stats.duration * 1000, 1),
+            'duplicates': stats.duplicates,
+            'total_ms': round(elapsed * 1000, 1),
+        }
+        logger.info(' '.join(f'{key}={value}' for key, value in fields.items()), extra={'sql': fields})
+
+        if stats.count > self.threshold:
+            repeated = [
+                (count, shape) for shape, count in stats.fingerprints().most_common(self.top) if count > 1
+            ]
+            logger.warning(
+                "%s %s: %d requêtes SQL (seuil: %d)%s",
+                request.method, request.path, stats.count, self.threshold,
+                ''.join(f'\n  {count}x {shape}' for count, shape in repeated),
+                extra={'sql': {**fields, 'repeated': repeated}},
+            )
+
+
+class PrimaryPinningMiddleware:
+    """Garde sur le primaire les lectures qui suivent une écriture de l'utilisateur.
+
+    Pose l'état de requête consulté par core.routers.ReadReplicaRouter: après
+    une écriture, le reste de la requête lit le primaire, et le navigateur y
+    est épinglé (cookie) pour les requêtes des REPLICA_PIN_SECONDS suivantes.
+    Inutilisé sans base `replica`.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_writes() as state:
+            response = self.get_response(request)
+        if state.wrote:
+            pin_to_primary(response)
+        return response
+
+
+class ShardMiddleware:
+    """Envoie les requêtes de la vue sur le shard de l'utilisateur connecté.
+
+    Les réponses en flux (export CSV) lisent pendant l'envoi: chaque morceau
+    est produit sur le même shard. Inutilisé sans SHARD_DATABASE_URLS.
+    """
+
+    def __init__(self, get_response):
+        if not sharding_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.get_response(request)
+        with for_user(user.pk):
+            response = self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(response.streaming_content, user.pk)
+        return response
+
+    def stream(self, content, user_id):
+        iterator, end = iter(content), object()
+        while True:
+            with for_user(user_id):
+                chunk = next(iterator, end)
+            if chunk is end:
+                return
+            yield chunk
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:04
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_monthly_summaries(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    MonthlySummary = apps.get_model('core', 'MonthlySummary')
+    rows = (
+        Transaction.objects
+        .annotate(month=TruncMonth('date'))
+        .values('user_id', 'month', 'category_id', 'type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    MonthlySummary.objects.bulk_create(
+        [MonthlySummary(**row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('type', models.CharField(choices=[('INCOME', 'Revenu'), ('EXPENSE', 'Dépense')], max_length=10, verbose_name='Type')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total')),
+                ('count', models.IntegerField(default=0, verbose_name='Nombre de transactions')),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='core.category', verbose_name='Catégorie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Synthèse mensuelle',
+                'verbose_name_plural': 'Synthèses mensuelles',
+                'ordering': ['-month'],
+                'unique_together': {('user', 'month', 'category', 'type')},
+            },
+        ),
+        migrations.RunPython(populate_monthly_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:20
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_balance_checkpoints(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    BalanceCheckpoint = apps.get_model('core', 'BalanceCheckpoint')
+    rows = (
+        Transaction.objects
+        .annotate(month=TruncMonth('date'))
+        .values('user_id', 'month')
+        .annotate(
+            income=Sum('amount', filter=Q(type='INCOME')),
+            expense=Sum('amount', filter=Q(type='EXPENSE')),
+        )
+        .order_by('user_id', 'month')
+    )
+    checkpoints = []
+    balances = {}
+    for row in rows.iterator():
+        net = (row['income'] or Decimal('0.00')) - (row['expense'] or Decimal('0.00'))
+        balances[row['user_id']] = balances.get(row['user_id'], Decimal('0.00')) + net
+        checkpoints.append(BalanceCheckpoint(
+            user_id=row['user_id'], month=row['month'], net=net, balance=balances[row['user_id']],
+        ))
+    BalanceCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_transaction_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('net', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Solde du mois')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16, verbose_name='Solde cumulé en fin de mois')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Point de solde',
+                'verbose_name_plural': 'Points de solde',
+                'ordering': ['-month'],
+                'unique_together': {('user', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_balance_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:23
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def evaluate_existing_budgets(apps, schema_editor):
+    Budget = apps.get_model('core', 'Budget')
+    MonthlySummary = apps.get_model('core', 'MonthlySummary')
+    now = timezone.now()
+    for budget in Budget.objects.iterator():
+        spent = MonthlySummary.objects.filter(
+            user_id=budget.user_id,
+            category_id=budget.category_id,
+            type='EXPENSE',
+            month=f'{budget.period}-01',
+        ).values_list('total', flat=True).first() or Decimal('0.00')
+        percentage = spent * 100 / budget.amount
+        if spent > budget.amount:
+            state = 'EXCEEDED'
+        elif percentage >= budget.alert_threshold:
+            state = 'ALERT'
+        else:
+            state = 'OK'
+        Budget.objects.filter(pk=budget.pk).update(
+            spent_amount=spent, percentage_used=percentage, alert_state=state, evaluated_at=now,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_balancecheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_state', models.CharField(choices=[('OK', 'Normal'), ('ALERT', 'Seuil atteint'), ('EXCEEDED', 'Dépassé')], max_length=10, verbose_name='État précédent')),
+                ('state', models.CharField(choices=[('OK', 'Normal'), ('ALERT', 'Seuil atteint'), ('EXCEEDED', 'Dépassé')], max_length=10, verbose_name='Nouvel état')),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Montant dépensé')),
+                ('percentage', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Pourcentage utilisé')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Alerte budgétaire',
+                'verbose_name_plural': 'Alertes budgétaires',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='alert_state',
+            field=models.CharField(choices=[('OK', 'Normal'), ('ALERT', 'Seuil atteint'), ('EXCEEDED', 'Dépassé')], default='OK', editable=False, max_length=10, verbose_name='État'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='evaluated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Dernière évaluation'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='percentage_used',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10, verbose_name='Pourcentage utilisé'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='spent_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Montant dépensé'),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'period', 'alert_state'], name='budget_user_period_state_idx'),
+        ),
+        migrations.AddField(
+            model_name='budgetalert',
+            name='budget',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='core.budget', verbose_name='Budget'),
+        ),
+        migrations.AddField(
+            model_name='budgetalert',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_alerts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='budgetalert',
+            index=models.Index(fields=['user', '-created_at'], name='budgetalert_user_created_idx'),
+        ),
+        migrations.RunPython(evaluate_existing_budgets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:25
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_budget_alert_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Montant')),
+                ('type', models.CharField(choices=[('INCOME', 'Revenu'), ('EXPENSE', 'Dépense')], max_length=10, verbose_name='Type')),
+                ('description', models.TextField(blank=True, verbose_name='Description')),
+                ('frequency', models.CharField(choices=[('WEEKLY', 'Hebdomadaire'), ('MONTHLY', 'Mensuelle')], default='MONTHLY', max_length=10, verbose_name='Fréquence')),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Toutes les N semaines ou N mois', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Intervalle')),
+                ('day_of_month', models.PositiveSmallIntegerField(blank=True, help_text='Échéances mensuelles: ramené au dernier jour pour les mois plus courts (jour de la date de début par défaut)', null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(31)], verbose_name='Jour du mois')),
+                ('start_date', models.DateField(verbose_name='Date de début')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='Date de fin')),
+                ('next_date', models.DateField(editable=False, verbose_name='Prochaine échéance')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_transactions', to='core.category', verbose_name='Catégorie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Transaction récurrente',
+                'verbose_name_plural': 'Transactions récurrentes',
+                'ordering': ['next_date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='recurring',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='core.recurringtransaction', verbose_name='Récurrence'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transaction',
+            unique_together={('recurring', 'date')},
+        ),
+        migrations.AddIndex(
+            model_name='recurringtransaction',
+            index=models.Index(fields=['is_active', 'next_date'], name='recurring_due_idx'),
+        ),
+    ]
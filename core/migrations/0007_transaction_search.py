@@ -0,0 +1,74 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'core_transaction_fts'
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, content='core_transaction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER core_transaction_fts_insert AFTER INSERT ON core_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END""",
+    f"""CREATE TRIGGER core_transaction_fts_delete AFTER DELETE ON core_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    f"""CREATE TRIGGER core_transaction_fts_update AFTER UPDATE OF description ON core_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS core_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS core_transaction_fts_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+# L'expression doit rester identique à core.search.PG_VECTOR
+POSTGRESQL_CREATE = [
+    """CREATE INDEX IF NOT EXISTS transaction_description_fts_idx ON core_transaction
+        USING GIN (to_tsvector('french'::regconfig, "core_transaction"."description"))""",
+]
+
+POSTGRESQL_DROP = ["DROP INDEX IF EXISTS transaction_description_fts_idx"]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+                cursor.execute("DROP TABLE temp.fts5_probe")
+        except OperationalError:
+            # SQLite compilé sans FTS5: la recherche utilise le repli Python
+            return
+        statements = SQLITE_CREATE
+    elif vendor == 'postgresql':
+        statements = POSTGRESQL_CREATE
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recurringtransaction'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:44
+
+import django.core.validators
+from decimal import Decimal
+import importlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+search = importlib.import_module('core.migrations.0007_transaction_search')
+
+# Statements de 0007 qui créent les déclencheurs (sans la table FTS5 ni le rebuild)
+SQLITE_TRIGGERS = [statement for statement in search.SQLITE_CREATE if statement.startswith('CREATE TRIGGER')]
+
+
+def has_fts_table(schema_editor):
+    return search.FTS_TABLE in schema_editor.connection.introspection.table_names()
+
+
+def drop_search_triggers(apps, schema_editor):
+    # SQLite reconstruit core_transaction pour ajouter la colonne: ses déclencheurs disparaissent
+    if schema_editor.connection.vendor == 'sqlite' and has_fts_table(schema_editor):
+        for statement in search.SQLITE_DROP[:-1]:
+            schema_editor.execute(statement)
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite' and has_fts_table(schema_editor):
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def copy_profile_currency(apps, schema_editor):
+    """Les montants existants sont dans la devise déclarée par le profil de leur utilisateur"""
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    currencies = {}
+    for user_id, currency in UserProfile.objects.exclude(currency='EUR').values_list('user_id', 'currency'):
+        currencies.setdefault(currency, []).append(user_id)
+    for name in ['Transaction', 'RecurringTransaction', 'MonthlySummary', 'BalanceCheckpoint']:
+        model = apps.get_model('core', name)
+        for currency, user_ids in currencies.items():
+            model.objects.filter(user_id__in=user_ids).update(currency=currency)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('core', '0007_transaction_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, create_search_triggers),
+        migrations.AlterUniqueTogether(
+            name='balancecheckpoint',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlysummary',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='balancecheckpoint',
+            name='currency',
+            field=models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], default='EUR', max_length=3, verbose_name='Devise'),
+        ),
+        migrations.AddField(
+            model_name='monthlysummary',
+            name='currency',
+            field=models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], default='EUR', max_length=3, verbose_name='Devise'),
+        ),
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='currency',
+            field=models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], default='EUR', max_length=3, verbose_name='Devise'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], default='EUR', max_length=3, verbose_name='Devise'),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+        migrations.RunPython(copy_profile_currency, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='balancecheckpoint',
+            unique_together={('user', 'month', 'currency')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlysummary',
+            unique_together={('user', 'month', 'category', 'type', 'currency')},
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('base', models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], max_length=3, verbose_name='Devise de base')),
+                ('quote', models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], max_length=3, verbose_name='Devise de cotation')),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20, validators=[django.core.validators.MinValueValidator(Decimal('0'))], verbose_name='Taux')),
+            ],
+            options={
+                'verbose_name': 'Taux de change',
+                'verbose_name_plural': 'Taux de change',
+                'ordering': ['-date'],
+                'unique_together': {('base', 'quote', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_multi_currency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendingAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], default='EUR', max_length=3, verbose_name='Devise')),
+                ('baseline', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Montant médian de la catégorie')),
+                ('score', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Score (z-score robuste)')),
+                ('detected_at', models.DateTimeField(verbose_name='Détectée le')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly', to='core.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spending_anomalies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Dépense inhabituelle',
+                'verbose_name_plural': 'Dépenses inhabituelles',
+                'ordering': ['-detected_at', '-score'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('currency', models.CharField(choices=[('EUR', '€ Euro'), ('USD', '$ Dollar'), ('GBP', '£ Livre'), ('XOF', 'CFA Franc')], default='EUR', max_length=3, verbose_name='Devise')),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Dépensé à date')),
+                ('projected', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Projection fin de mois')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculé le')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='core.category', verbose_name='Catégorie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_forecasts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Prévision de fin de mois',
+                'verbose_name_plural': 'Prévisions de fin de mois',
+                'ordering': ['-month', '-projected'],
+                'unique_together': {('user', 'category', 'month')},
+            },
+        ),
+    ]
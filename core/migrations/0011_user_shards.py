@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-18 03:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0010_transaction_admin_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('database', models.CharField(help_text='Alias dans DATABASES', max_length=64, verbose_name='Base')),
+                ('moved_at', models.DateTimeField(blank=True, null=True, verbose_name='Déplacé le')),
+            ],
+            options={
+                'verbose_name': 'Shard utilisateur',
+                'verbose_name_plural': 'Shards utilisateurs',
+            },
+        ),
+    ]
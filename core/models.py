@@ -1,7 +1,19 @@
-from django.db import models
+from django.db import models, router, transaction as db_transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Cast, Coalesce, Concat
+from dateutil.relativedelta import relativedelta
+from datetime import timedelta
 from decimal import Decimal
+import calendar
+
+from accounts.models import UserProfile
+from .utils import normalize_period
+
+CURRENCY_CHOICES = UserProfile.CURRENCY_CHOICES
+DEFAULT_CURRENCY = 'EUR'
+CURRENCY_SYMBOLS = {'EUR': '€', 'USD': '$', 'GBP': '£', 'XOF': 'FCFA'}
 
 
 class Category(models.Model):
@@ -17,6 +29,8 @@ class Category(models.Model):
     icon = models.CharField(max_length=50, default='💰', verbose_name='Icône')
     color = models.CharField(max_length=7, default='#3498db', verbose_name='Couleur')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Un renommage change les graphiques: suivi par l'ETag (core.caching.data_state)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Catégorie'
@@ -38,29 +52,224 @@ class Transaction(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='transactions', verbose_name='Catégorie')
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))], verbose_name='Montant')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=DEFAULT_CURRENCY, verbose_name='Devise')
     type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name='Type')
     date = models.DateField(verbose_name='Date')
     description = models.TextField(blank=True, verbose_name='Description')
+    # Échéance d'origine: (recurring, date) rend la matérialisation idempotente
+    recurring = models.ForeignKey('RecurringTransaction', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='transactions', verbose_name='Récurrence')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Champs dont dépendent la synthèse mensuelle, le registre des soldes et les budgets
+    SNAPSHOT_FIELDS = ['user_id', 'date', 'category_id', 'type', 'amount', 'currency']
+    
     class Meta:
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         ordering = ['-date', '-created_at']
+        unique_together = ['recurring', 'date']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='transaction_user_date_idx'),
+            models.Index(fields=['user', 'type', 'date'], name='transaction_user_type_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='transaction_user_cat_date_idx'),
+            # Liste de l'admin, tous utilisateurs confondus, triée par date
+            models.Index(fields=['date', 'created_at'], name='transaction_date_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.get_type_display()} - {self.amount}€ - {self.date}"
+        return f"{self.get_type_display()} - {self.amount} {self.currency} - {self.date}"
+    
+    @property
+    def currency_symbol(self):
+        return CURRENCY_SYMBOLS.get(self.currency, self.currency)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État enregistré: instantané avant modification sans relire la ligne (voir core.signals)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def get_saved_state(self):
+        """Valeurs de SNAPSHOT_FIELDS telles que chargées, ou None si elles n'ont pas toutes été chargées"""
+        loaded = getattr(self, '_loaded_values', {})
+        if not all(name in loaded for name in self.SNAPSHOT_FIELDS):
+            return None
+        return {name: loaded[name] for name in self.SNAPSHOT_FIELDS}
+    
+    def lock_saved_state(self, using):
+        """Valeurs de SNAPSHOT_FIELDS de la ligne en base, verrouillée jusqu'à la fin de la transaction.
+
+        None si la ligne n'existe pas (ou plus).
+        """
+        if self.pk is None:
+            return None
+        return (
+            type(self)._base_manager.using(using).select_for_update()
+            .filter(pk=self.pk).values(*self.SNAPSHOT_FIELDS).first()
+        )
+    
+    def save(self, *args, **kwargs):
+        # Assurer que le type correspond à la catégorie (inutile de relire une catégorie inchangée)
+        saved = self.get_saved_state() or {}
+        changed = (saved.get('category_id'), saved.get('type')) != (self.category_id, self.type)
+        if self.category_id and changed and self.category.type != self.type:
+            raise ValueError("Le type de transaction doit correspondre au type de catégorie")
+        # La ligne et ses données dérivées (post_save, voir core.signals) sont validées ensemble
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with db_transaction.atomic(using=using, savepoint=False):
+            # État précédent relu en base et non pris des valeurs chargées: une
+            # instance périmée (formulaire soumis deux fois) fausserait les deltas
+            self._previous_state = self.lock_saved_state(using)
+            super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        names = self.SNAPSHOT_FIELDS if update_fields is None else [
+            self._meta.get_field(name).attname for name in update_fields
+        ]
+        loaded = getattr(self, '_loaded_values', {})
+        self._loaded_values = {**loaded, **{name: getattr(self, name) for name in names}}
+    
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with db_transaction.atomic(using=using, savepoint=False):
+            # Comme save(): la synthèse retire la ligne telle qu'enregistrée
+            self._previous_state = self.lock_saved_state(using)
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class RecurringTransaction(models.Model):
+    """Transaction répétée selon un calendrier (salaire, loyer, abonnement)"""
+    WEEKLY = 'WEEKLY'
+    MONTHLY = 'MONTHLY'
+    FREQUENCY_CHOICES = [
+        (WEEKLY, 'Hebdomadaire'),
+        (MONTHLY, 'Mensuelle'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_transactions')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_transactions', verbose_name='Catégorie')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))], verbose_name='Montant')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=DEFAULT_CURRENCY, verbose_name='Devise')
+    type = models.CharField(max_length=10, choices=Transaction.TYPE_CHOICES, verbose_name='Type')
+    description = models.TextField(blank=True, verbose_name='Description')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=MONTHLY, verbose_name='Fréquence')
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)], verbose_name='Intervalle', help_text='Toutes les N semaines ou N mois')
+    day_of_month = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(31)],
+        verbose_name='Jour du mois',
+        help_text='Échéances mensuelles: ramené au dernier jour pour les mois plus courts (jour de la date de début par défaut)'
+    )
+    start_date = models.DateField(verbose_name='Date de début')
+    end_date = models.DateField(null=True, blank=True, verbose_name='Date de fin')
+    next_date = models.DateField(editable=False, verbose_name='Prochaine échéance')
+    is_active = models.BooleanField(default=True, verbose_name='Active')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Transaction récurrente'
+        verbose_name_plural = 'Transactions récurrentes'
+        ordering = ['next_date']
+        indexes = [
+            models.Index(fields=['is_active', 'next_date'], name='recurring_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.description or self.get_type_display()} - {self.amount} {self.currency} ({self.get_frequency_display()})"
     
     def save(self, *args, **kwargs):
         # Assurer que le type correspond à la catégorie
         if self.category and self.category.type != self.type:
             raise ValueError("Le type de transaction doit correspondre au type de catégorie")
+        if self.next_date is None:
+            self.next_date = self.first_occurrence()
         super().save(*args, **kwargs)
+    
+    def month_occurrence(self, month_start):
+        """Échéance d'un mois, le jour choisi étant ramené à la fin des mois courts"""
+        day = self.day_of_month or self.start_date.day
+        return month_start.replace(day=min(day, calendar.monthrange(month_start.year, month_start.month)[1]))
+    
+    def first_occurrence(self):
+        """Première échéance à partir de la date de début"""
+        if self.frequency == self.WEEKLY:
+            return self.start_date
+        occurrence = self.month_occurrence(self.start_date.replace(day=1))
+        if occurrence < self.start_date:
+            occurrence = self.month_occurrence(self.start_date.replace(day=1) + relativedelta(months=1))
+        return occurrence
+    
+    def following_occurrence(self, day):
+        """Échéance suivant celle du `day`"""
+        if self.frequency == self.WEEKLY:
+            return day + timedelta(weeks=self.interval)
+        return self.month_occurrence(day.replace(day=1) + relativedelta(months=self.interval))
+
+
+class BudgetQuerySet(models.QuerySet):
+    """Requêtes sur les budgets avec calcul groupé de la consommation"""
+    
+    def with_progress(self):
+        """Annote spent, percentage, remaining, exceeded et over_threshold en une seule requête
+
+        Les dépenses de chaque devise sont converties dans la devise du profil
+        au taux du début de la période.
+        """
+        from .currency import converted
+        
+        profile_currency = UserProfile.objects.filter(user_id=models.OuterRef('user_id')).values('currency')[:1]
+        spent = (
+            MonthlySummary.objects.filter(
+                user_id=models.OuterRef('user_id'),
+                category_id=models.OuterRef('category_id'),
+                type='EXPENSE',
+                month=Cast(Concat(models.OuterRef('period'), models.Value('-01')), models.DateField()),
+            )
+            .order_by()
+            .values('user_id')
+            .annotate(spent=models.Sum(converted('total', models.OuterRef('target_currency'), day='month')))
+            .values('spent')
+        )
+        decimal = models.DecimalField(max_digits=14, decimal_places=2)
+        
+        return self.annotate(
+            target_currency=Coalesce(models.Subquery(profile_currency), models.Value(DEFAULT_CURRENCY)),
+        ).annotate(
+            spent=Coalesce(models.Subquery(spent, output_field=decimal), models.Value(Decimal('0.00')), output_field=decimal),
+        ).annotate(
+            # Budget à zéro: 0 %, comme get_percentage_used (et pas de division par zéro sur PostgreSQL)
+            percentage=models.Case(
+                models.When(amount__gt=0, then=models.F('spent') * 100 / models.F('amount')),
+                default=models.Value(Decimal('0.00')),
+                output_field=decimal,
+            ),
+            remaining=models.ExpressionWrapper(models.F('amount') - models.F('spent'), output_field=decimal),
+            exceeded=models.Case(
+                models.When(spent__gt=models.F('amount'), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+            over_threshold=models.Case(
+                models.When(percentage__gte=models.F('alert_threshold'), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
 
 
 class Budget(models.Model):
     """Budget mensuel pour une catégorie de dépenses"""
+    STATE_OK = 'OK'
+    STATE_ALERT = 'ALERT'
+    STATE_EXCEEDED = 'EXCEEDED'
+    STATE_CHOICES = [
+        (STATE_OK, 'Normal'),
+        (STATE_ALERT, 'Seuil atteint'),
+        (STATE_EXCEEDED, 'Dépassé'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets', verbose_name='Catégorie')
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))], verbose_name='Montant budgété')
@@ -71,30 +280,46 @@ class Budget(models.Model):
         verbose_name='Seuil d\'alerte (%)',
         help_text='Pourcentage du budget à partir duquel une alerte est déclenchée'
     )
+    # Consommation recalculée à chaque écriture d'une transaction concernée (voir core.budgets)
+    spent_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), editable=False, verbose_name='Montant dépensé')
+    percentage_used = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), editable=False, verbose_name='Pourcentage utilisé')
+    alert_state = models.CharField(max_length=10, choices=STATE_CHOICES, default=STATE_OK, editable=False, verbose_name='État')
+    evaluated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Dernière évaluation')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = BudgetQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Budget'
         verbose_name_plural = 'Budgets'
         ordering = ['-period']
         unique_together = ['user', 'category', 'period']
+        indexes = [
+            models.Index(fields=['user', 'period', 'alert_state'], name='budget_user_period_state_idx'),
+        ]
     
     def __str__(self):
         return f"Budget {self.category.name} - {self.period}"
     
+    def clean(self):
+        # Période canonique: with_progress et l'évaluation à l'écriture comparent 'YYYY-MM'
+        try:
+            self.period = normalize_period(self.period)
+        except ValueError as exc:
+            raise ValidationError({'period': str(exc)})
+    
+    def save(self, *args, **kwargs):
+        # Même normalisation hors formulaire (ValueError si la période est invalide)
+        self.period = normalize_period(self.period)
+        super().save(*args, **kwargs)
+    
     def get_spent_amount(self):
-        """Calcule le montant dépensé pour ce budget"""
-        from datetime import datetime
-        year, month = map(int, self.period.split('-'))
-        spent = Transaction.objects.filter(
-            user=self.user,
-            category=self.category,
-            type='EXPENSE',
-            date__year=year,
-            date__month=month
-        ).aggregate(total=models.Sum('amount'))['total'] or Decimal('0.00')
-        return spent
+        """Montant dépensé pour ce budget"""
+        # Valeur annotée par Budget.objects.with_progress(), sinon valeur enregistrée
+        if hasattr(self, 'spent'):
+            return self.spent
+        return self.spent_amount
     
     def get_percentage_used(self):
         """Calcule le pourcentage du budget utilisé"""
@@ -110,3 +335,135 @@ class Budget(models.Model):
     def is_exceeded(self):
         """Vérifie si le budget est dépassé"""
         return self.get_spent_amount() > self.amount
+
+
+class BudgetAlert(models.Model):
+    """Changement d'état d'alerte d'un budget (historique)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budget_alerts')
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts', verbose_name='Budget')
+    previous_state = models.CharField(max_length=10, choices=Budget.STATE_CHOICES, verbose_name='État précédent')
+    state = models.CharField(max_length=10, choices=Budget.STATE_CHOICES, verbose_name='Nouvel état')
+    spent = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Montant dépensé')
+    percentage = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Pourcentage utilisé')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Alerte budgétaire'
+        verbose_name_plural = 'Alertes budgétaires'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='budgetalert_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.budget} : {self.get_previous_state_display()} → {self.get_state_display()}"
+
+
+class MonthlySummary(models.Model):
+    """Cumul mensuel des transactions par utilisateur, catégorie et type"""
+    TYPE_CHOICES = Transaction.TYPE_CHOICES
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_summaries')
+    month = models.DateField(verbose_name='Mois', help_text='Premier jour du mois')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name='monthly_summaries', verbose_name='Catégorie')
+    type = models.CharField(max_length=10, choices=TYPE_CHOICES, verbose_name='Type')
+    # Une ligne par devise: la conversion se fait à la lecture (voir core.currency)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=DEFAULT_CURRENCY, verbose_name='Devise')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Total')
+    count = models.IntegerField(default=0, verbose_name='Nombre de transactions')
+    
+    class Meta:
+        verbose_name = 'Synthèse mensuelle'
+        verbose_name_plural = 'Synthèses mensuelles'
+        ordering = ['-month']
+        unique_together = ['user', 'month', 'category', 'type', 'currency']
+    
+    def __str__(self):
+        return f"{self.get_type_display()} - {self.month:%Y-%m} - {self.total} {self.currency}"
+
+
+class BalanceCheckpoint(models.Model):
+    """Solde cumulé d'un utilisateur à la fin de chaque mois ayant des transactions"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    month = models.DateField(verbose_name='Mois', help_text='Premier jour du mois')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=DEFAULT_CURRENCY, verbose_name='Devise')
+    net = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Solde du mois')
+    balance = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'), verbose_name='Solde cumulé en fin de mois')
+    
+    class Meta:
+        verbose_name = 'Point de solde'
+        verbose_name_plural = 'Points de solde'
+        ordering = ['-month']
+        unique_together = ['user', 'month', 'currency']
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.balance} {self.currency}"
+
+
+class ExchangeRate(models.Model):
+    """Taux de change quotidien: 1 unité de `base` vaut `rate` unités de `quote`"""
+    date = models.DateField(verbose_name='Date')
+    base = models.CharField(max_length=3, choices=CURRENCY_CHOICES, verbose_name='Devise de base')
+    quote = models.CharField(max_length=3, choices=CURRENCY_CHOICES, verbose_name='Devise de cotation')
+    rate = models.DecimalField(max_digits=20, decimal_places=10, validators=[MinValueValidator(Decimal('0'))], verbose_name='Taux')
+    
+    class Meta:
+        verbose_name = 'Taux de change'
+        verbose_name_plural = 'Taux de change'
+        ordering = ['-date']
+        unique_together = ['base', 'quote', 'date']
+    
+    def __str__(self):
+        return f"{self.date} - 1 {self.base} = {self.rate} {self.quote}"
+
+
+class CategoryForecast(models.Model):
+    """Projection des dépenses d'une catégorie en fin de mois, précalculée chaque nuit (voir core.forecasting)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_forecasts')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='forecasts', verbose_name='Catégorie')
+    month = models.DateField(verbose_name='Mois', help_text='Premier jour du mois')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=DEFAULT_CURRENCY, verbose_name='Devise')
+    spent = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Dépensé à date')
+    projected = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Projection fin de mois')
+    computed_at = models.DateTimeField(verbose_name='Calculé le')
+    
+    class Meta:
+        verbose_name = 'Prévision de fin de mois'
+        verbose_name_plural = 'Prévisions de fin de mois'
+        ordering = ['-month', '-projected']
+        unique_together = ['user', 'category', 'month']
+    
+    def __str__(self):
+        return f"{self.category.name} - {self.month:%Y-%m} - {self.projected} {self.currency}"
+
+
+class SpendingAnomaly(models.Model):
+    """Dépense très au-dessus du niveau habituel de sa catégorie, détectée chaque nuit (voir core.forecasting)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spending_anomalies')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='anomaly')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=DEFAULT_CURRENCY, verbose_name='Devise')
+    baseline = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='Montant médian de la catégorie')
+    score = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Score (z-score robuste)')
+    detected_at = models.DateTimeField(verbose_name='Détectée le')
+    
+    class Meta:
+        verbose_name = 'Dépense inhabituelle'
+        verbose_name_plural = 'Dépenses inhabituelles'
+        ordering = ['-detected_at', '-score']
+    
+    def __str__(self):
+        return f"{self.transaction} (médiane {self.baseline} {self.currency}, score {self.score})"
+
+
+class UserShard(models.Model):
+    """Base qui contient les données financières d'un utilisateur (voir core.sharding)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    database = models.CharField(max_length=64, verbose_name='Base', help_text='Alias dans DATABASES')
+    moved_at = models.DateTimeField(null=True, blank=True, verbose_name='Déplacé le')
+    
+    class Meta:
+        verbose_name = 'Shard utilisateur'
+        verbose_name_plural = 'Shards utilisateurs'
+    
+    def __str__(self):
+        return f"{self.user_id} → {self.database}"
@@ -0,0 +1,146 @@
+"""Pagination par curseur (keyset) pour les listes de transactions, et pagination à nombre estimé pour l'admin"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+# Au-delà, une table sans filtre n'est plus comptée mais estimée
+ESTIMATE_THRESHOLD = 100_000
+# Une liste filtrée est comptée jusqu'à cette limite seulement
+COUNT_LIMIT = 10_000
+
+
+@dataclass
+class KeysetPage:
+    """Page de résultats avec les curseurs vers les pages voisines"""
+    object_list: list
+    next_cursor: str = None
+    previous_cursor: str = None
+    has_next: bool = False
+    has_previous: bool = False
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class InvalidCursor(ValueError):
+    """Curseur illisible ou altéré"""
+
+
+class KeysetPaginator:
+    """Pagine un queryset sur un ordre total sans OFFSET.
+
+    Chaque page est obtenue par un filtre « après / avant la dernière ligne
+    vue », ce qui garde un coût constant même sur les pages profondes.
+    """
+
+    def __init__(self, queryset, ordering=('-date', '-created_at', 'id'), per_page=50):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            model = self.queryset.model
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def _seek(self, values, reverse=False):
+        """Q sélectionnant les lignes situées après le curseur (avant si `reverse`)"""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            greater = descending == reverse
+            step = Q(**{f'{name}__gt' if greater else f'{name}__lt': value})
+            condition |= equal & step
+            equal &= Q(**{name: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, after=None, before=None):
+        """Retourne la page suivant `after`, précédant `before`, ou la première page"""
+        queryset = self.queryset
+        if before:
+            rows = list(
+                queryset.filter(self._seek(self.decode_cursor(before), reverse=True))
+                .order_by(*self._reversed_ordering())[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            if after:
+                queryset = queryset.filter(self._seek(self.decode_cursor(after)))
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = bool(after)
+
+        page = KeysetPage(rows, has_next=has_next and bool(rows), has_previous=has_previous and bool(rows))
+        if page.has_next:
+            page.next_cursor = self.encode_cursor(rows[-1])
+        if page.has_previous:
+            page.previous_cursor = self.encode_cursor(rows[0])
+        return page
+
+
+def estimate_row_count(model, using='default'):
+    """Nombre de lignes approché d'une table, sans la parcourir (None si inconnu)"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # Statistiques de l'autovacuum: -1 tant que la table n'a jamais été analysée
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    # Clé primaire auto-incrémentée: le plus grand identifiant majore le nombre de lignes (lecture d'index)
+    return model._default_manager.using(using).aggregate(last=Max('pk'))['last']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator de l'admin qui ne fait jamais de COUNT(*) complet sur une grande table.
+
+    Sans filtre, le nombre de lignes est estimé (statistiques PostgreSQL,
+    sinon plus grand identifiant) dès qu'il dépasse ESTIMATE_THRESHOLD. Avec
+    filtres, le comptage s'arrête à COUNT_LIMIT: les pages au-delà ne sont
+    pas proposées, la recherche ou les filtres permettent d'affiner.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
@@ -0,0 +1,96 @@
+"""Matérialisation des transactions récurrentes
+
+Les échéances dues de tous les utilisateurs sont traitées par lots de
+calendriers: une lecture des échéances déjà présentes, un bulk_create des
+transactions manquantes, un bulk_update des prochaines échéances. La clé
+unique (recurring, date) de Transaction garantit qu'une nouvelle exécution,
+même concurrente ou interrompue, ne crée jamais de doublon.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+from django.db import transaction as db_transaction
+
+from .models import RecurringTransaction, Transaction
+from .sharding import current_database
+from .signals import transactions_bulk_created
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class MaterializeResult:
+    schedules: int = 0
+    created: int = 0
+    skipped: int = 0
+    finished: int = 0
+
+
+def due_occurrences(schedule, today):
+    """Échéances dues d'un calendrier jusqu'à `today` inclus, et la prochaine échéance"""
+    occurrences = []
+    day = schedule.next_date
+    while day <= today and (schedule.end_date is None or day <= schedule.end_date):
+        occurrences.append(day)
+        day = schedule.following_occurrence(day)
+    return occurrences, day
+
+
+def materialize_batch(schedules, today, result):
+    """Crée les transactions dues d'un lot de calendriers verrouillés"""
+    ids = [schedule.pk for schedule in schedules]
+    existing = set(
+        Transaction.objects.filter(
+            recurring_id__in=ids, date__gte=min(schedule.next_date for schedule in schedules),
+        ).values_list('recurring_id', 'date')
+    )
+
+    transactions = []
+    for schedule in schedules:
+        occurrences, schedule.next_date = due_occurrences(schedule, today)
+        for day in occurrences:
+            if (schedule.pk, day) in existing:
+                result.skipped += 1
+                continue
+            transactions.append(Transaction(
+                user_id=schedule.user_id,
+                category_id=schedule.category_id,
+                type=schedule.type,
+                amount=schedule.amount,
+                date=day,
+                description=schedule.description,
+                currency=schedule.currency,
+                recurring_id=schedule.pk,
+            ))
+        if schedule.end_date is not None and schedule.next_date > schedule.end_date:
+            schedule.is_active = False
+            result.finished += 1
+
+    if transactions:
+        Transaction.objects.bulk_create(transactions, batch_size=DEFAULT_BATCH_SIZE)
+        transactions_bulk_created.send(sender=Transaction, transactions=transactions)
+    RecurringTransaction.objects.bulk_update(schedules, ['next_date', 'is_active'], batch_size=DEFAULT_BATCH_SIZE)
+    result.schedules += len(schedules)
+    result.created += len(transactions)
+
+
+def materialize_due(today=None, user_ids=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Matérialise toutes les échéances dues jusqu'à `today`, par lots de calendriers"""
+    today = today or date.today()
+    due = RecurringTransaction.objects.filter(is_active=True, next_date__lte=today)
+    if user_ids is not None:
+        due = due.filter(user_id__in=user_ids)
+
+    result = MaterializeResult()
+    last_pk = 0
+    while True:
+        with db_transaction.atomic(using=current_database()):
+            # Les calendriers verrouillés par une autre exécution sont laissés à celle-ci
+            schedules = list(
+                due.filter(pk__gt=last_pk).order_by('pk').select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not schedules:
+                break
+            materialize_batch(schedules, today, result)
+        last_pk = schedules[-1].pk
+    return result
@@ -0,0 +1,98 @@
+"""Agrégations de la page rapports, mises en cache par filtre et version des données
+
+Chaque transaction est convertie dans la devise du profil au taux de sa date,
+dans la requête GROUP BY elle-même.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .caching import cached_for_user
+from .currency import converted, get_user_currency
+from .models import DEFAULT_CURRENCY
+from .search import ranked_transactions
+
+ZERO = Decimal('0.00')
+
+
+def normalize_filters(cleaned_data):
+    """Représentation canonique des filtres validés de ReportFilterForm"""
+    category = cleaned_data.get('category')
+    return {
+        'start_date': cleaned_data['start_date'].isoformat() if cleaned_data.get('start_date') else None,
+        'end_date': cleaned_data['end_date'].isoformat() if cleaned_data.get('end_date') else None,
+        'category': category.pk if category else None,
+        'type': cleaned_data.get('type') or None,
+        'q': ' '.join((cleaned_data.get('q') or '').split()) or None,
+    }
+
+
+def compute_report(transactions, currency=DEFAULT_CURRENCY):
+    """Totaux et répartition par catégorie en une seule requête GROUP BY"""
+    rows = (
+        transactions
+        .values('type', 'category_id', 'category__name', 'category__color', 'category__type')
+        .annotate(total=Sum(converted('amount', currency)), count=Count('id'))
+        .order_by('category__name')
+    )
+
+    report = {
+        'total_income': ZERO,
+        'total_expense': ZERO,
+        'transaction_count': 0,
+        'categories_income': [],
+        'categories_expense': [],
+    }
+    for row in rows:
+        total = (row['total'] or ZERO).quantize(ZERO)
+        report['transaction_count'] += row['count']
+        if row['type'] == 'INCOME':
+            report['total_income'] += total
+        elif row['type'] == 'EXPENSE':
+            report['total_expense'] += total
+
+        if row['category_id'] is None or total <= 0:
+            continue
+        breakdown = 'categories_income' if row['category__type'] == 'INCOME' else 'categories_expense'
+        report[breakdown].append({
+            'name': row['category__name'],
+            'amount': float(total),
+            'color': row['category__color'],
+        })
+
+    report['net_balance'] = report['total_income'] - report['total_expense']
+    return report
+
+
+def get_report(user, transactions, filters):
+    """Rapport lu en cache, ou calculé puis mis en cache"""
+    currency = get_user_currency(user)
+    return cached_for_user(
+        user.pk, 'report', lambda: compute_report(transactions, currency), params={**filters, 'currency': currency}
+    )
+
+
+def report_blocks(user, transactions, filters, displayed):
+    """Blocs indépendants de la page des rapports: {nom: fonction}
+
+    Avec une recherche, la liste est classée par pertinence.
+    """
+    return {
+        'report': lambda: get_report(user, transactions, filters),
+        'transactions': lambda: ranked_transactions(
+            transactions.select_related('category'), filters.get('q'), displayed
+        ),
+    }
+
+
+def report_context(form, results):
+    """Contexte du gabarit reports/reports.html à partir des résultats des blocs"""
+    report = results['report']
+    return {
+        'form': form,
+        'transactions': results['transactions'],
+        'transaction_count': report['transaction_count'],
+        'total_income': report['total_income'],
+        'total_expense': report['total_expense'],
+        'net_balance': report['net_balance'],
+    }
@@ -0,0 +1,210 @@
+"""Maintenance incrémentale de la table MonthlySummary"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import MonthlySummary, Transaction
+from .sharding import current_database
+
+ZERO = Decimal('0.00')
+# Au-delà, un lot de deltas est appliqué par lecture groupée et bulk_update
+BULK_THRESHOLD = 20
+BULK_USERS = 500
+
+
+def month_start(day):
+    """Premier jour du mois d'une date (ou d'une chaîne YYYY-MM-DD)"""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return day.replace(day=1)
+
+
+def summary_key(values):
+    """Clé (user_id, mois, category_id, type, devise) d'une transaction ou d'un instantané"""
+    if isinstance(values, dict):
+        return (
+            values['user_id'], month_start(values['date']), values['category_id'], values['type'], values['currency']
+        )
+    return (values.user_id, month_start(values.date), values.category_id, values.type, values.currency)
+
+
+def apply_delta(key, amount, count):
+    """Ajoute `amount` et `count` à la ligne de synthèse correspondant à `key`.
+
+    Retourne True si la ligne existait déjà.
+    """
+    user_id, month, category_id, trans_type, currency = key
+    rows = MonthlySummary.objects.filter(
+        user_id=user_id, month=month, category_id=category_id, type=trans_type, currency=currency
+    )
+    updated = rows.update(total=F('total') + amount, count=F('count') + count)
+    if not updated:
+        try:
+            with transaction.atomic(using=current_database()):
+                MonthlySummary.objects.create(
+                    user_id=user_id, month=month, category_id=category_id,
+                    type=trans_type, currency=currency, total=amount, count=count,
+                )
+        except IntegrityError:
+            # Une autre requête a créé la ligne entre-temps
+            rows.update(total=F('total') + amount, count=F('count') + count)
+    if count < 0:
+        rows.filter(count__lte=0).delete()
+    return bool(updated)
+
+
+def apply_deltas(deltas):
+    """Applique un dictionnaire {clé: [montant, nombre]} à la table de synthèse.
+
+    Retourne les (user_id, mois, devise) dont une ligne de synthèse existait déjà.
+    """
+    existing = set()
+    for key, (amount, count) in deltas.items():
+        if (amount or count) and apply_delta(key, amount, count):
+            user_id, month, _, _, currency = key
+            existing.add((user_id, month, currency))
+    return existing
+
+
+def apply_bulk_deltas(deltas):
+    """Applique de nombreux deltas en quelques requêtes par tranche d'utilisateurs.
+
+    Les lignes existantes sont verrouillées et mises à jour par bulk_update,
+    les manquantes créées par bulk_create. Si une autre requête crée une
+    ligne entre-temps, la tranche est rejouée clé par clé.
+    """
+    if len(deltas) < BULK_THRESHOLD:
+        return apply_deltas(deltas)
+    by_user = defaultdict(dict)
+    for key, delta in deltas.items():
+        if delta[0] or delta[1]:
+            by_user[key[0]][key] = delta
+    user_ids = sorted(by_user)
+    for start in range(0, len(user_ids), BULK_USERS):
+        chunk = {key: delta for user_id in user_ids[start:start + BULK_USERS] for key, delta in by_user[user_id].items()}
+        try:
+            with transaction.atomic(using=current_database()):
+                apply_deltas_chunk(chunk)
+        except IntegrityError:
+            apply_deltas(chunk)
+
+
+def apply_deltas_chunk(deltas):
+    rows = MonthlySummary.objects.select_for_update().filter(
+        user_id__in={key[0] for key in deltas}, month__in={key[1] for key in deltas},
+    )
+    found, updated, emptied = set(), [], []
+    for row in rows:
+        key = (row.user_id, row.month, row.category_id, row.type, row.currency)
+        if key not in deltas:
+            continue
+        found.add(key)
+        row.total += deltas[key][0]
+        row.count += deltas[key][1]
+        (updated if row.count > 0 else emptied).append(row)
+    MonthlySummary.objects.bulk_update(updated, ['total', 'count'], batch_size=1000)
+    MonthlySummary.objects.filter(pk__in=[row.pk for row in emptied]).delete()
+    MonthlySummary.objects.bulk_create(
+        [
+            MonthlySummary(
+                user_id=user_id, month=month, category_id=category_id,
+                type=trans_type, currency=currency, total=amount, count=count,
+            )
+            for (user_id, month, category_id, trans_type, currency), (amount, count) in deltas.items()
+            if (user_id, month, category_id, trans_type, currency) not in found and count > 0
+        ],
+        batch_size=1000,
+    )
+
+
+def record_transaction_change(previous, current):
+    """Met à jour la synthèse après création, modification ou suppression.
+
+    `previous` est l'instantané des valeurs avant modification (ou None),
+    `current` la transaction enregistrée (ou None en cas de suppression).
+    Retourne les (user_id, mois, devise) dont une ligne de synthèse existait déjà.
+    """
+    deltas = defaultdict(lambda: [ZERO, 0])
+    if previous is not None:
+        delta = deltas[summary_key(previous)]
+        delta[0] -= Decimal(previous['amount'])
+        delta[1] -= 1
+    if current is not None:
+        delta = deltas[summary_key(current)]
+        delta[0] += Decimal(current.amount)
+        delta[1] += 1
+    return apply_deltas(deltas)
+
+
+def record_bulk_insert(transactions):
+    """Met à jour la synthèse pour des transactions insérées avec bulk_create"""
+    deltas = defaultdict(lambda: [ZERO, 0])
+    for trans in transactions:
+        delta = deltas[summary_key(trans)]
+        delta[0] += Decimal(trans.amount)
+        delta[1] += 1
+    apply_bulk_deltas(deltas)
+
+
+def compute_summaries(user_ids=None):
+    """Agrège les transactions brutes par utilisateur, mois, catégorie, type et devise"""
+    transactions = Transaction.objects.all()
+    if user_ids is not None:
+        transactions = transactions.filter(user_id__in=user_ids)
+    rows = (
+        transactions
+        .annotate(month=TruncMonth('date'))
+        .values('user_id', 'month', 'category_id', 'type', 'currency')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    return {
+        (row['user_id'], row['month'], row['category_id'], row['type'], row['currency']): (row['total'], row['count'])
+        for row in rows
+    }
+
+
+def rebuild_monthly_summaries(user_ids=None, batch_size=1000):
+    """Reconstruit entièrement la synthèse à partir des transactions"""
+    computed = compute_summaries(user_ids)
+    summaries = MonthlySummary.objects.all()
+    if user_ids is not None:
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    with transaction.atomic(using=current_database()):
+        summaries.delete()
+        MonthlySummary.objects.bulk_create(
+            [
+                MonthlySummary(
+                    user_id=user_id, month=month, category_id=category_id,
+                    type=trans_type, currency=currency, total=total, count=count,
+                )
+                for (user_id, month, category_id, trans_type, currency), (total, count) in computed.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(computed)
+
+
+def verify_monthly_summaries(user_ids=None):
+    """Compare la synthèse aux transactions brutes et retourne les écarts"""
+    computed = compute_summaries(user_ids)
+    summaries = MonthlySummary.objects.filter(count__gt=0)
+    if user_ids is not None:
+        summaries = summaries.filter(user_id__in=user_ids)
+    stored = {
+        (row['user_id'], row['month'], row['category_id'], row['type'], row['currency']): (row['total'], row['count'])
+        for row in summaries.values('user_id', 'month', 'category_id', 'type', 'currency', 'total', 'count')
+    }
+
+    mismatches = []
+    for key in sorted(set(computed) | set(stored), key=str):
+        expected = computed.get(key, (ZERO, 0))
+        actual = stored.get(key, (ZERO, 0))
+        if Decimal(expected[0]) != Decimal(actual[0]) or expected[1] != actual[1]:
+            mismatches.append({'key': key, 'expected': expected, 'actual': actual})
+    return mismatches
@@ -0,0 +1,148 @@
+"""Routage des lectures analytiques vers un réplica en lecture seule
+
+Les vues décorées par replica_reads (rapports, tendances, export) lisent
+les données de l'application core sur la base `replica` (READ_REPLICA_URL).
+Tout le reste, et toutes les écritures, va au primaire. Un utilisateur qui
+vient d'écrire reste sur le primaire: pour la fin de la requête en cours
+(état de requête posé par PrimaryPinningMiddleware) et pendant
+REPLICA_PIN_SECONDS ensuite, le temps que le réplica rattrape son retard.
+Cet épinglage voyage dans un cookie: il suit le navigateur quel que soit le
+worker qui sert la requête suivante, sans dépendre d'un cache partagé.
+"""
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+# Seules les données de l'application sont lues sur le réplica: sessions,
+# utilisateurs et cache en base restent sur le primaire
+REPLICA_APPS = {'core'}
+PIN_COOKIE = 'primary_pin'
+DEFAULT_PIN_SECONDS = 10
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+
+@dataclass
+class RequestState:
+    """Écritures de la requête HTTP en cours"""
+    wrote: bool = False
+
+
+def replica_configured():
+    return REPLICA in connections.databases
+
+
+@contextmanager
+def use_replica():
+    """Lectures des modèles de REPLICA_APPS sur le réplica dans ce bloc"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """État d'une requête HTTP: après une écriture, ses lectures restent sur le primaire"""
+    state = RequestState()
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+def pin_to_primary(response):
+    """Envoie au primaire les lectures des requêtes du navigateur pendant REPLICA_PIN_SECONDS"""
+    response.set_cookie(
+        PIN_COOKIE, '1',
+        max_age=getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS),
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def reads_replica(request):
+    """Vrai si les lectures de cette requête peuvent aller au réplica"""
+    state = _request_state.get()
+    if not replica_configured() or (state is not None and state.wrote):
+        return False
+    return not is_pinned(request)
+
+
+def _replica_stream(content):
+    # Les requêtes d'une réponse en flux s'exécutent pendant l'envoi, après la vue
+    iterator, end = iter(content), object()
+    while True:
+        with use_replica():
+            chunk = next(iterator, end)
+        if chunk is end:
+            return
+        yield chunk
+
+
+def _from_replica(response):
+    if getattr(response, 'streaming', False) and not response.is_async:
+        response.streaming_content = _replica_stream(response.streaming_content)
+    return response
+
+
+def replica_reads(view):
+    """Envoie au réplica les lectures d'une vue en lecture seule (et de son flux de réponse)"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not reads_replica(request):
+                return await view(request, *args, **kwargs)
+            with use_replica():
+                return _from_replica(await view(request, *args, **kwargs))
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not reads_replica(request):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return _from_replica(view(request, *args, **kwargs))
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """Lectures des vues replica_reads sur le réplica, le reste sur le primaire"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS and _use_replica.get():
+            state = _request_state.get()
+            if state is None or not state.wrote:
+                return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label in REPLICA_APPS:
+            # Les lectures suivantes de la requête voient cette écriture (la
+            # validation des contraintes d'un formulaire compte aussi)
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Le réplica est une copie du primaire: mêmes lignes des deux côtés
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Le réplica reçoit le schéma par réplication, jamais par migrate
+        return False if db == REPLICA else None
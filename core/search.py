@@ -0,0 +1,123 @@
+"""Recherche plein texte dans les descriptions de transactions
+
+SQLite: table virtuelle FTS5 à contenu externe, tenue à jour par des
+déclencheurs sur core_transaction. PostgreSQL: index GIN sur l'expression
+to_tsvector de la description. Les deux moteurs gèrent le classement et la
+recherche par préfixe; sans index disponible, un repli en Python parcourt
+les descriptions de l'utilisateur.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_transaction_fts'
+PG_CONFIG = 'french'
+# Même expression que l'index GIN de la migration 0007, sans quoi il n'est pas utilisé
+PG_VECTOR = "to_tsvector('french'::regconfig, \"core_transaction\".\"description\")"
+MAX_TERMS = 8
+
+_backends = {}
+
+
+def strip_accents(text):
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Mots d'une recherche ou d'une description, en minuscules"""
+    return re.findall(r'\w+', text.casefold())
+
+
+def search_backend(alias='default'):
+    """'fts5', 'postgresql' ou 'python' selon la base et les index présents"""
+    if alias not in _backends:
+        connection = connections[alias]
+        if connection.vendor == 'postgresql':
+            _backends[alias] = 'postgresql'
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            _backends[alias] = 'fts5'
+        else:
+            _backends[alias] = 'python'
+    return _backends[alias]
+
+
+def fts5_match(terms):
+    # Chaque mot entre guillemets (pas d'opérateur FTS5), suivi de * pour le préfixe
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def python_scores(queryset, terms):
+    """{pk: score} des transactions dont chaque terme préfixe un mot de la description"""
+    terms = [strip_accents(term) for term in terms]
+    scores = {}
+    rows = queryset.order_by().values_list('pk', 'description').iterator(chunk_size=5000)
+    for pk, description in rows:
+        words = tokenize(strip_accents(description))
+        hits = [sum(word.startswith(term) for word in words) for term in terms]
+        if all(hits):
+            scores[pk] = sum(hits) / len(words)
+    return scores
+
+
+def search_transactions(queryset, query):
+    """Restreint un queryset de transactions à celles dont la description correspond à `query`"""
+    terms = tokenize(query or '')[:MAX_TERMS]
+    if not terms:
+        return queryset
+    backend = search_backend(queryset.db)
+    if backend == 'fts5':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts5_match(terms)]
+        ))
+    if backend == 'postgresql':
+        return queryset.filter(RawSQL(
+            f"{PG_VECTOR} @@ to_tsquery('{PG_CONFIG}', %s)", [tsquery(terms)], output_field=BooleanField()
+        ))
+    return queryset.filter(pk__in=list(python_scores(queryset, terms)))
+
+
+def ranked_transactions(queryset, query, limit):
+    """Les `limit` transactions les plus pertinentes pour `query`, les plus récentes à pertinence égale"""
+    terms = tokenize(query or '')[:MAX_TERMS]
+    if not terms:
+        return list(queryset[:limit])
+    backend = search_backend(queryset.db)
+    if backend == 'fts5':
+        # Jointure avec la table FTS5, qui pilote la requête: le rang (bm25,
+        # négatif, meilleur quand il est petit) n'est calculé que pour les
+        # lignes trouvées. Une sous-requête corrélée le recalculerait par ligne.
+        ranked = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = core_transaction.id', f'{FTS_TABLE} MATCH %s'],
+            params=[fts5_match(terms)],
+            select={'search_rank': f'-{FTS_TABLE}.rank'},
+        )
+    elif backend == 'postgresql':
+        ranked = search_transactions(queryset, query).annotate(search_rank=RawSQL(
+            f"ts_rank({PG_VECTOR}, to_tsquery('{PG_CONFIG}', %s))", [tsquery(terms)], output_field=FloatField()
+        ))
+    else:
+        scores = python_scores(queryset, terms)
+        best = sorted(scores, key=lambda pk: (-scores[pk], -pk))[:limit]
+        transactions = queryset.in_bulk(best)
+        return [transactions[pk] for pk in best]
+    return list(ranked.order_by('-search_rank', '-date', '-created_at')[:limit])
+
+
+def rebuild_search_index(alias='default'):
+    """Reconstruit l'index plein texte depuis les descriptions; retourne le moteur utilisé"""
+    backend = search_backend(alias)
+    with connections[alias].cursor() as cursor:
+        if backend == 'fts5':
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        elif backend == 'postgresql':
+            cursor.execute('REINDEX INDEX transaction_description_fts_idx')
+    return backend
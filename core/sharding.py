@@ -0,0 +1,294 @@
+"""Partitionnement des données financières par utilisateur sur plusieurs bases
+
+Toutes les lignes des modèles de SHARDED_MODELS portent un user_id: celles
+d'un utilisateur vivent sur une seule base (« shard ») parmi settings.SHARDS.
+L'annuaire UserShard (base par défaut) donne cette base; sans entrée, les
+données sont sur `default` (comptes antérieurs au partitionnement). Un
+nouvel utilisateur est placé par hachage cohérent (jump hash): ajouter un
+shard ne déplace qu'environ 1/N des utilisateurs, ce que fait la commande
+rebalance_shards.
+
+Authentification, sessions et profils restent sur `default`. Chaque shard
+garde une copie de la ligne User et du profil de ses utilisateurs (clés
+étrangères et sous-requêtes sur la devise du profil), et une copie de la
+table des taux de change. Les identifiants des tables partitionnées sont
+disjoints d'un shard à l'autre (SHARD_ID_SPACE), ce qui permet de déplacer
+les lignes sans les renuméroter.
+
+Le routeur ne voit pas les filtres des requêtes: la base est celle de
+l'utilisateur courant, posé par ShardMiddleware pour une requête HTTP et par
+for_user / on_shard dans les commandes.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from .caching import bump_data_version, get_cache
+from .models import (Category, Transaction, RecurringTransaction, Budget, BudgetAlert, MonthlySummary,
+                     BalanceCheckpoint, ExchangeRate, CategoryForecast, SpendingAnomaly, UserShard)
+
+DEFAULT = 'default'
+# Ordre des clés étrangères: copie dans cet ordre, suppression dans l'ordre inverse
+SHARDED_MODELS = [
+    Category, RecurringTransaction, Transaction, Budget, BudgetAlert, MonthlySummary, BalanceCheckpoint,
+    CategoryForecast, SpendingAnomaly,
+]
+# Copiés sur chaque shard, écrits par load_rates sur tous
+REFERENCE_MODELS = [ExchangeRate]
+# Identifiants du shard n: [n * SHARD_ID_SPACE, (n + 1) * SHARD_ID_SPACE)
+SHARD_ID_SPACE = 2 ** 48
+SHARD_CACHE_KEY = 'finance:shard:{user_id}'
+COPY_BATCH_SIZE = 2000
+
+_current = contextvars.ContextVar('current_shard', default=None)
+
+
+def shard_aliases():
+    """Bases des shards, `default` en premier"""
+    return list(getattr(settings, 'SHARDS', [DEFAULT]))
+
+
+def sharding_enabled():
+    return len(shard_aliases()) > 1
+
+
+def jump_hash(key, buckets):
+    """Hachage cohérent de Lamping et Veach: seau de `key` parmi `buckets`"""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def placement(user_id):
+    """Shard cible d'un utilisateur selon le nombre de shards configurés"""
+    aliases = shard_aliases()
+    return aliases[jump_hash(user_id, len(aliases))]
+
+
+def shard_for_user(user_id):
+    """Shard qui contient les données de l'utilisateur (annuaire, en cache)"""
+    if not sharding_enabled():
+        return DEFAULT
+    cache = get_cache()
+    key = SHARD_CACHE_KEY.format(user_id=user_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = UserShard.objects.using(DEFAULT).filter(user_id=user_id).values_list('database', flat=True).first()
+        alias = alias or DEFAULT
+        cache.set(key, alias, timeout=None)
+    return alias
+
+
+def current_database():
+    """Base des données de l'utilisateur courant (`default` hors contexte)"""
+    return _current.get() or DEFAULT
+
+
+@contextmanager
+def on_shard(alias):
+    """Requêtes sur les modèles partitionnés envoyées à `alias` dans ce bloc"""
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def for_user(user_id):
+    """on_shard sur le shard de l'utilisateur"""
+    return on_shard(shard_for_user(user_id))
+
+
+class ShardRouter:
+    """Modèles partitionnés sur le shard courant ou celui de l'instance, le reste aux routeurs suivants"""
+
+    sharded = {model._meta.label_lower for model in SHARDED_MODELS}
+    reference = {model._meta.label_lower for model in REFERENCE_MODELS}
+
+    def instance_shard(self, hints):
+        instance = hints.get('instance')
+        if isinstance(instance, User):
+            return shard_for_user(instance.pk)
+        user_id = getattr(instance, 'user_id', None)
+        return shard_for_user(user_id) if user_id is not None else None
+
+    def db_for_read(self, model, **hints):
+        label = model._meta.label_lower
+        if label in self.sharded:
+            return self.instance_shard(hints) or current_database()
+        if label in self.reference:
+            return _current.get()
+        # Routeurs suivants (réplica), sinon `default`
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower in self.sharded:
+            return self.instance_shard(hints) or current_database()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les utilisateurs sont copiés sur leur shard
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schéma complet sur chaque shard (copies des utilisateurs et des taux)
+        return None
+
+
+def _upsert(model, objects, alias):
+    fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+    model._base_manager.using(alias).bulk_create(
+        objects, batch_size=COPY_BATCH_SIZE,
+        update_conflicts=True, unique_fields=[model._meta.pk.name], update_fields=fields,
+    )
+
+
+def mirror_users(user_ids, alias):
+    """Copie (ou met à jour) les lignes User et UserProfile sur le shard `alias`"""
+    if alias == DEFAULT or not user_ids:
+        return
+    _upsert(User, list(User.objects.using(DEFAULT).filter(pk__in=user_ids)), alias)
+    _upsert(UserProfile, list(UserProfile.objects.using(DEFAULT).filter(user_id__in=user_ids)), alias)
+
+
+def assign_shards(user_ids):
+    """Place de nouveaux utilisateurs (jump hash): annuaire et copies sur leur shard"""
+    if not sharding_enabled():
+        return
+    by_shard = {}
+    for user_id in user_ids:
+        by_shard.setdefault(placement(user_id), []).append(user_id)
+    UserShard.objects.using(DEFAULT).bulk_create(
+        [UserShard(user_id=user_id, database=placement(user_id)) for user_id in user_ids], ignore_conflicts=True,
+    )
+    get_cache().delete_many([SHARD_CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
+    for alias, ids in by_shard.items():
+        mirror_users(ids, alias)
+
+
+def purge_user(user_id, alias):
+    """Supprime les données et la copie d'un utilisateur sur le shard `alias` (SQL direct).
+
+    Sans post_delete ni cascade: SHARDED_MODELS est parcouru en ordre inverse
+    des dépendances et contient toutes les tables liées à l'utilisateur, et
+    les données dérivées (synthèses, soldes, budgets) partent avec lui. Rien
+    n'est à recalculer sur un shard qui ne contient plus ses données.
+    """
+    with transaction.atomic(using=alias):
+        for model in reversed(SHARDED_MODELS):
+            queryset = model._base_manager.using(alias).filter(user_id=user_id)
+            queryset._raw_delete(alias)
+        if alias != DEFAULT:
+            for queryset in (UserProfile.objects.using(alias).filter(user_id=user_id),
+                             User.objects.using(alias).filter(pk=user_id)):
+                queryset._raw_delete(alias)
+
+
+def copy_rows(model, user_id, source, target, batch_size=COPY_BATCH_SIZE):
+    """Copie les lignes d'un utilisateur d'une base à l'autre, identifiants conservés"""
+    fields = [field.attname for field in model._meta.concrete_fields]
+    rows = model._base_manager.using(source).filter(user_id=user_id).order_by('pk').values_list(*fields)
+    batch, copied = [], 0
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(model(**dict(zip(fields, row))))
+        if len(batch) == batch_size:
+            model._base_manager.using(target).bulk_create(batch)
+            copied, batch = copied + len(batch), []
+    if batch:
+        model._base_manager.using(target).bulk_create(batch)
+        copied += len(batch)
+    return copied
+
+
+def move_user(user_id, source, target, batch_size=COPY_BATCH_SIZE):
+    """Déplace toutes les données d'un utilisateur de `source` vers `target`.
+
+    Copie par bulk_create puis suppression SQL directe à la source, dans une
+    transaction sur chaque base: une interruption laisse l'utilisateur sur sa
+    source, et une nouvelle exécution repart de zéro. Les écritures de
+    l'utilisateur pendant le déplacement ne sont pas copiées: à lancer hors
+    trafic ou sur des comptes inactifs.
+
+    Sous SQLite, AUTOINCREMENT repart du plus grand identifiant présent dans
+    la table: des lignes venues d'une plage supérieure feraient sortir les
+    nouveaux identifiants de la cible de sa plage. Ce sens est refusé
+    (rebalance_shards ne déplace que vers le shard ajouté, en dernier).
+    """
+    aliases = shard_aliases()
+    if connections[target].vendor == 'sqlite' and aliases.index(target) < aliases.index(source):
+        raise ValueError(
+            f"SQLite: déplacement de {source} vers {target} impossible, les identifiants copiés "
+            f"dépassent la plage de {target}"
+        )
+    copied = 0
+    with transaction.atomic(using=DEFAULT), transaction.atomic(using=source), transaction.atomic(using=target):
+        mirror_users([user_id], target)
+        # Restes d'un déplacement précédent interrompu (SQL direct, comme purge_user:
+        # ces lignes n'ont jamais été servies, aucun signal à envoyer)
+        for model in reversed(SHARDED_MODELS):
+            model._base_manager.using(target).filter(user_id=user_id)._raw_delete(target)
+        for model in SHARDED_MODELS:
+            copied += copy_rows(model, user_id, source, target, batch_size)
+        UserShard.objects.using(DEFAULT).update_or_create(
+            user_id=user_id, defaults={'database': target, 'moved_at': timezone.now()},
+        )
+        purge_user(user_id, source)
+    get_cache().delete(SHARD_CACHE_KEY.format(user_id=user_id))
+    restore_id_offsets(target)
+    bump_data_version(user_id)
+    return copied
+
+
+def set_id_offsets(alias):
+    """Fait démarrer les identifiants des tables partitionnées du shard dans sa plage"""
+    index = shard_aliases().index(alias)
+    if not index:
+        return
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                    f'GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)} '
+                    f'WHERE id < %s)))',
+                    [table, 'id', index * SHARD_ID_SPACE, (index + 1) * SHARD_ID_SPACE],
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s AND seq < %s', [table, index * SHARD_ID_SPACE])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                    [table, index * SHARD_ID_SPACE, table],
+                )
+
+
+def restore_id_offsets(alias):
+    """Après une copie: ramène le compteur SQLite dans la plage du shard.
+
+    AUTOINCREMENT de SQLite avance au plus grand identifiant inséré, même
+    venu d'un autre shard d'une plage inférieure; les séquences PostgreSQL
+    ne bougent pas.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return
+    index = shard_aliases().index(alias)
+    low, high = index * SHARD_ID_SPACE, (index + 1) * SHARD_ID_SPACE
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            cursor.execute(
+                f'UPDATE sqlite_sequence SET seq = (SELECT COALESCE(MAX(id), %s) FROM '
+                f'{connection.ops.quote_name(table)} WHERE id >= %s AND id < %s) WHERE name = %s',
+                [low, low, high, table],
+            )
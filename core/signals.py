@@ -0,0 +1,163 @@
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver, Signal
+from django.db.models import QuerySet
+from accounts.models import UserProfile
+from .models import Transaction, Category, Budget
+from . import budgets, ledger, rollups
+from .caching import bump_data_version
+from .sharding import (DEFAULT, assign_shards, current_database, mirror_users, on_shard, purge_user, shard_for_user,
+                       sharding_enabled)
+
+SNAPSHOT_FIELDS = Transaction.SNAPSHOT_FIELDS
+
+# Envoyé après un bulk_create de transactions, qui ne déclenche pas post_save.
+# Arguments: transactions (liste des instances insérées)
+transactions_bulk_created = Signal()
+
+
+def deleted_directly(model, origin):
+    """Vrai si la suppression part du modèle lui-même et non d'une cascade"""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+def maintain_derived_data(previous, current, using):
+    """Synthèse mensuelle, registre des soldes puis budgets, dans une même transaction.
+
+    `previous` est l'instantané avant modification (ou None), `current` la
+    transaction enregistrée (ou None après suppression). Une erreur annule
+    les trois mises à jour avec l'écriture de la transaction elle-même.
+    """
+    with on_shard(using), transaction.atomic(using=using, savepoint=False):
+        # Mois dont la synthèse existait déjà: leur point de solde aussi
+        existing_months = rollups.record_transaction_change(previous, current)
+        ledger.record_balance_change(previous, current, existing_months)
+        budgets.record_budget_change(previous, current)
+    user_ids = {previous['user_id']} if previous is not None else set()
+    if current is not None:
+        user_ids.add(current.user_id)
+    for user_id in user_ids:
+        bump_data_version(user_id)
+
+
+def saved_values(previous, instance, update_fields):
+    """Valeurs de SNAPSHOT_FIELDS désormais en base: celles de l'instance, sauf
+    les champs qu'une sauvegarde partielle (update_fields) n'a pas écrits"""
+    written = SNAPSHOT_FIELDS if update_fields is None else [
+        instance._meta.get_field(name).attname for name in update_fields
+    ]
+    values = dict(previous or {})
+    values.update({name: getattr(instance, name) for name in written if name in SNAPSHOT_FIELDS})
+    return values
+
+# L'état précédent est relu et verrouillé par Transaction.save (_previous_state)
+@receiver(post_save, sender=Transaction)
+def maintain_on_save(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    current = instance
+    if previous is not None:
+        values = saved_values(previous, instance, update_fields)
+        if values == previous:
+            # Aucun champ suivi n'a changé (description...): rien à recalculer
+            bump_data_version(instance.user_id)
+            return
+        if update_fields is not None:
+            current = SimpleNamespace(**values)
+    maintain_derived_data(previous, current, using)
+
+@receiver(post_delete, sender=Transaction)
+def maintain_on_delete(sender, instance, origin=None, using=None, **kwargs):
+    if not deleted_directly(Transaction, origin):
+        bump_data_version(instance.user_id)
+        return
+    if hasattr(instance, '_previous_state'):
+        # Transaction.delete: ligne relue en base, None si déjà supprimée
+        previous = instance._previous_state
+        if previous is None:
+            bump_data_version(instance.user_id)
+            return
+    else:
+        # QuerySet.delete: instances lues par la suppression elle-même
+        previous = {field: getattr(instance, field) for field in SNAPSHOT_FIELDS}
+    maintain_derived_data(previous, None, using)
+
+# Insertion en masse (bulk_create n'envoie pas post_save), mêmes étapes
+@receiver(transactions_bulk_created)
+def maintain_on_bulk_create(sender, transactions, **kwargs):
+    with transaction.atomic(using=current_database(), savepoint=False):
+        rollups.record_bulk_insert(transactions)
+        ledger.record_balance_bulk_insert(transactions)
+        budgets.record_budget_bulk_insert(transactions)
+    for user_id in {trans.user_id for trans in transactions}:
+        bump_data_version(user_id)
+
+# Un budget créé ou modifié (montant, seuil) est évalué immédiatement
+@receiver(post_save, sender=Budget)
+def evaluate_budget_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    budgets.evaluate_budgets(Budget.objects.filter(pk=instance.pk))
+
+# Les transactions d'une catégorie supprimée passent sans catégorie
+@receiver(post_delete, sender=Category)
+def rebuild_summary_on_category_delete(sender, instance, origin=None, **kwargs):
+    if not deleted_directly(Category, origin):
+        return
+    rollups.rebuild_monthly_summaries(user_ids=[instance.user_id])
+
+# Un changement de devise du profil change tous les montants convertis de l'utilisateur
+@receiver(pre_save, sender=UserProfile)
+def snapshot_profile_currency(sender, instance, raw=False, **kwargs):
+    instance._previous_currency = None
+    if instance.pk and not raw:
+        # Valeur chargée avec le profil (suivi des modifications), sinon relue en base
+        loaded = getattr(instance, '_loaded_values', {})
+        if 'currency' in loaded:
+            instance._previous_currency = loaded['currency']
+        else:
+            instance._previous_currency = sender.objects.filter(pk=instance.pk).values_list('currency', flat=True).first()
+
+@receiver(post_save, sender=UserProfile)
+def convert_on_currency_change(sender, instance, created, raw=False, **kwargs):
+    if raw or created or getattr(instance, '_previous_currency', None) in (None, instance.currency):
+        return
+    budgets.evaluate_budgets(Budget.objects.filter(user_id=instance.user_id))
+    bump_data_version(instance.user_id)
+
+# Invalide les résultats en cache de l'utilisateur à chaque écriture (transactions: voir maintain_derived_data)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_user_cache(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+
+# Place un nouvel utilisateur sur son shard, et y tient à jour la copie de l'utilisateur et du profil
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def mirror_user_on_shard(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not sharding_enabled():
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    if sender is User and created:
+        assign_shards([user_id])
+    elif (alias := shard_for_user(user_id)) != DEFAULT:
+        mirror_users([user_id], alias)
+
+@receiver(pre_delete, sender=User)
+def snapshot_user_shard(sender, instance, **kwargs):
+    instance._shard = shard_for_user(instance.pk)
+
+# Les données d'un utilisateur supprimé sur un autre shard n'ont pas de cascade
+@receiver(post_delete, sender=User)
+def purge_user_shard(sender, instance, **kwargs):
+    alias = getattr(instance, '_shard', DEFAULT)
+    if alias != DEFAULT:
+        purge_user(instance.pk, alias)
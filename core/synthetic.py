@@ -0,0 +1,248 @@
+"""Générateur déterministe de données de démonstration à grande échelle
+
+Chaque utilisateur est généré à partir de (graine, rang de l'utilisateur):
+deux exécutions avec la même graine produisent exactement les mêmes
+catégories, budgets et transactions, quel que soit le nombre de workers.
+"""
+import calendar
+import random
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+
+from accounts.models import UserProfile
+
+from .budgets import evaluate_budgets
+from .caching import bump_data_version
+from .ledger import rebuild_balance_checkpoints
+from .models import (BalanceCheckpoint, Budget, BudgetAlert, Category, CategoryForecast, MonthlySummary,
+                     RecurringTransaction, SpendingAnomaly, Transaction)
+from .rollups import rebuild_monthly_summaries
+from .sharding import assign_shards, current_database, for_user
+
+DEFAULT_PASSWORD = 'demo123'
+DEFAULT_BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class CategorySpec:
+    name: str
+    type: str
+    icon: str
+    color: str
+    # Montant typique (min, max) et poids de tirage par mois (1 = janvier)
+    amount: tuple = (10, 100)
+    weight: float = 0
+    seasonal: tuple = (1,) * 12
+
+
+INCOME_CATEGORIES = [
+    CategorySpec('Salaire', 'INCOME', '💼', '#10b981'),
+    CategorySpec('Freelance', 'INCOME', '💻', '#059669', amount=(150, 1200), weight=0.5),
+    CategorySpec('Investissements', 'INCOME', '📈', '#34d399'),
+    CategorySpec('Autres revenus', 'INCOME', '💰', '#6ee7b7', amount=(20, 300), weight=0.2),
+]
+
+EXPENSE_CATEGORIES = [
+    CategorySpec('Alimentation', 'EXPENSE', '🍔', '#ef4444', amount=(8, 140), weight=10,
+                 seasonal=(1, 1, 1, 1, 1, 1, 1.1, 1.1, 1, 1, 1.1, 1.4)),
+    CategorySpec('Transport', 'EXPENSE', '🚗', '#f97316', amount=(2, 80), weight=3,
+                 seasonal=(1, 1, 1, 1, 1, 1.1, 1.4, 1.4, 1, 1, 1, 1.2)),
+    CategorySpec('Logement', 'EXPENSE', '🏠', '#dc2626', amount=(20, 250), weight=0.5,
+                 seasonal=(1.6, 1.5, 1.2, 1, 0.8, 0.7, 0.7, 0.7, 0.8, 1, 1.3, 1.6)),
+    CategorySpec('Loisirs', 'EXPENSE', '🎮', '#f59e0b', amount=(10, 120), weight=3,
+                 seasonal=(0.8, 0.8, 0.9, 1, 1.1, 1.3, 1.7, 1.8, 1, 0.9, 0.9, 1.3)),
+    CategorySpec('Santé', 'EXPENSE', '⚕️', '#ec4899', amount=(10, 90), weight=0.7,
+                 seasonal=(1.4, 1.3, 1.1, 1, 0.9, 0.8, 0.7, 0.7, 1, 1.1, 1.2, 1.3)),
+    CategorySpec('Shopping', 'EXPENSE', '🛍️', '#8b5cf6', amount=(15, 200), weight=2,
+                 seasonal=(1.6, 1, 0.9, 1, 1, 1.1, 1.5, 0.9, 1, 1, 1.4, 2.2)),
+    CategorySpec('Éducation', 'EXPENSE', '📚', '#6366f1', amount=(15, 250), weight=0.3,
+                 seasonal=(1, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2, 0.8, 4, 1.2, 0.8, 0.5)),
+    CategorySpec('Abonnements', 'EXPENSE', '📱', '#3b82f6'),
+]
+
+SUBSCRIPTIONS = [
+    ('Netflix', Decimal('13.49')), ('Spotify', Decimal('10.99')), ('Téléphone', Decimal('19.99')),
+    ('Internet', Decimal('29.99')), ('Salle de sport', Decimal('34.90')), ('Presse', Decimal('9.99')),
+]
+
+DESCRIPTIONS = {
+    'Alimentation': ['Courses', 'Supermarché', 'Boulangerie', 'Marché', 'Restaurant', 'Livraison repas'],
+    'Transport': ['Carburant', 'Péage', 'Ticket de métro', 'Taxi', 'Billet de train', 'Parking'],
+    'Logement': ['Électricité', 'Gaz', 'Eau', 'Assurance habitation', 'Bricolage'],
+    'Loisirs': ['Cinéma', 'Concert', 'Sortie', 'Jeux vidéo', 'Livres', 'Week-end'],
+    'Santé': ['Pharmacie', 'Médecin', 'Dentiste', 'Opticien'],
+    'Shopping': ['Vêtements', 'Chaussures', 'Électronique', 'Cadeaux', 'Décoration'],
+    'Éducation': ['Fournitures', 'Formation', 'Inscription', 'Manuels'],
+    'Freelance': ['Mission freelance', 'Facture client'],
+    'Autres revenus': ['Remboursement', 'Vente d\'occasion', 'Cadeau'],
+}
+
+
+def user_rng(seed, index):
+    """Générateur aléatoire propre à un utilisateur, indépendant de l'ordre de traitement"""
+    return random.Random(f'{seed}:{index}')
+
+
+def money(value):
+    return Decimal(str(round(value, 2)))
+
+
+def random_day(rng, month_start, low=1, high=None):
+    last_day = calendar.monthrange(month_start.year, month_start.month)[1]
+    return month_start.replace(day=rng.randint(low, min(high or last_day, last_day)))
+
+
+def recurring_transactions(rng, months):
+    """Revenus et dépenses récurrents: salaire, loyer, abonnements, pass transport, dividendes"""
+    salary = rng.uniform(1800, 4500)
+    rent = money(rng.uniform(450, 1400))
+    pass_price = money(rng.choice([0, 75.2, 86.4]))
+    subscriptions = rng.sample(SUBSCRIPTIONS, rng.randint(2, 4))
+
+    rows = []
+    for month_start in months:
+        if month_start.month == 1:
+            salary *= 1 + rng.uniform(0, 0.03)  # revalorisation annuelle
+        pay = salary * (2 if month_start.month == 12 and rng.random() < 0.3 else 1)  # 13e mois
+        rows.append(('Salaire', random_day(rng, month_start, 1, 3), money(pay), 'Salaire mensuel'))
+        rows.append(('Logement', random_day(rng, month_start, 3, 6), rent, 'Loyer'))
+        for name, price in subscriptions:
+            rows.append(('Abonnements', random_day(rng, month_start, 8, 12), price, name))
+        if pass_price:
+            rows.append(('Transport', random_day(rng, month_start, 1, 4), pass_price, 'Abonnement transport'))
+        if month_start.month in (3, 6, 9, 12):
+            rows.append(('Investissements', random_day(rng, month_start, 15, 28),
+                         money(rng.uniform(50, 400)), 'Dividendes'))
+    return rows
+
+
+def allocate(total, weights):
+    """Répartit `total` unités proportionnellement aux poids (plus forts restes)"""
+    weight_sum = sum(weights) or 1
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    remainders = sorted(range(len(weights)), key=lambda i: counts[i] - shares[i])
+    for i in remainders[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def generate_user_rows(seed, index, transaction_count, months_count, today=None):
+    """Retourne les lignes (catégorie, date, montant, description) d'un utilisateur, triées par date"""
+    rng = user_rng(seed, index)
+    today = today or date.today()
+    first_month = today.replace(day=1) - relativedelta(months=months_count - 1)
+    months = [first_month + relativedelta(months=i) for i in range(months_count)]
+
+    rows = recurring_transactions(rng, months)
+    rows = [row for row in rows if row[1] <= today]
+    if len(rows) > transaction_count:
+        rows = sorted(rows, key=lambda row: row[1])[-transaction_count:]
+
+    variable = [spec for spec in INCOME_CATEGORIES + EXPENSE_CATEGORIES if spec.weight]
+    month_weights = [
+        sum(spec.weight * spec.seasonal[month.month - 1] for spec in variable)
+        for month in months
+    ]
+    for month_start, count in zip(months, allocate(transaction_count - len(rows), month_weights)):
+        last_day = today.day if month_start == months[-1] else None
+        weights = [spec.weight * spec.seasonal[month_start.month - 1] for spec in variable]
+        for spec in rng.choices(variable, weights=weights, k=count):
+            low, high = spec.amount
+            # Distribution asymétrique: beaucoup de petits montants, quelques gros
+            amount = low + (high - low) * rng.random() ** 2
+            rows.append((
+                spec.name,
+                random_day(rng, month_start, 1, last_day),
+                money(amount),
+                rng.choice(DESCRIPTIONS[spec.name]),
+            ))
+    rows.sort(key=lambda row: row[1])
+    return rows
+
+
+def create_users(count, prefix='demo', password=DEFAULT_PASSWORD):
+    """Crée (ou retrouve) les utilisateurs demo, demo2, demo3... et leurs profils"""
+    usernames = [prefix if i == 0 else f'{prefix}{i + 1}' for i in range(count)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    # Un seul hachage du mot de passe pour tous les comptes
+    password_hash = make_password(password)
+    User.objects.bulk_create([
+        User(username=username, email=f'{username}@example.com', password=password_hash,
+             first_name='Utilisateur', last_name=f'Demo {i + 1}')
+        for i, username in enumerate(usernames)
+        if username not in existing
+    ])
+    users = {user.username: user.pk for user in User.objects.filter(username__in=usernames)}
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id) for user_id in users.values()],
+        ignore_conflicts=True,
+    )
+    # bulk_create n'envoie pas post_save: placement des nouveaux comptes sur leur shard
+    assign_shards([user_id for username, user_id in users.items() if username not in existing])
+    return [(index, users[username]) for index, username in enumerate(usernames)]
+
+
+def populate_user(user_id, index, seed, transaction_count, months_count, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """Génère les catégories, transactions et budgets d'un utilisateur existant.
+
+    Les données précédentes de l'utilisateur sont remplacées. Les insertions
+    passent par bulk_create sans signal par lot: la synthèse mensuelle, le
+    registre des soldes et l'état des budgets sont recalculés une seule fois
+    à la fin.
+    """
+    today = today or date.today()
+    rows = generate_user_rows(seed, index, transaction_count, months_count, today)
+    rng = user_rng(seed, f'{index}:budgets')
+
+    with for_user(user_id), db_transaction.atomic(using=current_database()):
+        # Suppression SQL directe: ni chargement des lignes ni signal par ligne
+        for model in (MonthlySummary, BalanceCheckpoint, BudgetAlert, Budget, CategoryForecast, SpendingAnomaly,
+                      Transaction, RecurringTransaction, Category):
+            queryset = model.objects.filter(user_id=user_id)
+            queryset._raw_delete(queryset.db)
+
+        Category.objects.bulk_create([
+            Category(user_id=user_id, name=spec.name, type=spec.type, icon=spec.icon, color=spec.color)
+            for spec in INCOME_CATEGORIES + EXPENSE_CATEGORIES
+        ])
+        category_ids = {
+            name: (pk, trans_type)
+            for pk, name, trans_type in Category.objects.filter(user_id=user_id).values_list('pk', 'name', 'type')
+        }
+
+        for start in range(0, len(rows), batch_size):
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user_id=user_id,
+                    category_id=category_ids[name][0],
+                    type=category_ids[name][1],
+                    amount=amount,
+                    date=trans_date,
+                    description=description,
+                )
+                for name, trans_date, amount, description in rows[start:start + batch_size]
+            ])
+
+        # Budgets des trois derniers mois sur les principales dépenses
+        budgets = []
+        for months_ago in range(3):
+            period = (today - relativedelta(months=months_ago)).strftime('%Y-%m')
+            for name, low, high in [('Alimentation', 300, 600), ('Transport', 60, 200),
+                                    ('Loisirs', 80, 250), ('Shopping', 100, 300)]:
+                budgets.append(Budget(
+                    user_id=user_id, category_id=category_ids[name][0], period=period,
+                    amount=money(rng.uniform(low, high)), alert_threshold=rng.choice([75, 80, 85, 90]),
+                ))
+        Budget.objects.bulk_create(budgets)
+        rebuild_monthly_summaries([user_id])
+        rebuild_balance_checkpoints([user_id])
+        evaluate_budgets(Budget.objects.filter(user_id=user_id), record_events=False)
+    bump_data_version(user_id)
+    return len(rows)
@@ -1,3 +1,1471 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import re
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections, transaction as db_transaction
+from asgiref.sync import sync_to_async
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+from .analytics import compute_trends, load_columns, rolling_sums
+from .benchmarks import BENCHMARK_SETTINGS, run_benchmarks
+from .caching import (bump_data_version, cached_for_user, get_cache, get_cache_stats, get_data_version,
+                      reset_cache_stats, user_etag)
+from .checks import check_shared_cache
+from .budgets import PERCENTAGE_LIMIT, get_budget_alerts
+from .currency import load_rates, rate_cache, read_rates
+from .dashboard import compute_dashboard_stats, get_category_data, get_dashboard_stats, get_months_data, get_totals
+from .exports import CSV_HEADER
+from .forecasting import compute_forecasts, get_anomalies, get_forecasts
+from .forms import BudgetForm
+from .importers import import_file, read_ofx
+from .ledger import (get_balance, get_balance_at, get_balance_history, rebuild_balance_checkpoints,
+                     verify_balance_checkpoints)
+from .middleware import fingerprint
+from . import urls as core_urls, views
+from .models import (Budget, BudgetAlert, Category, CategoryForecast, ExchangeRate, MonthlySummary,
+                     RecurringTransaction, SpendingAnomaly, Transaction, UserShard)
+from .pagination import KeysetPaginator
+from .recurring import materialize_due
+from .reports import ZERO, compute_report, get_report
+from . import search
+from .routers import PIN_COOKIE, ReadReplicaRouter, track_writes, use_replica
+from .rollups import rebuild_monthly_summaries, verify_monthly_summaries
+from .sharding import (SHARD_CACHE_KEY, SHARD_ID_SPACE, SHARDED_MODELS, ShardRouter, for_user, jump_hash,
+                       mirror_users, move_user, on_shard, placement, purge_user, set_id_offsets, shard_for_user)
+from .signals import transactions_bulk_created
+from .synthetic import create_users, generate_user_rows, populate_user
+from .utils import month_range, month_range_filter
+
+
+class MonthlySummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rollup', password='x')
+        self.food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        self.leisure = Category.objects.create(user=self.user, name='Loisirs', type='EXPENSE')
+        self.salary = Category.objects.create(user=self.user, name='Salaire', type='INCOME')
+        self.trans = Transaction.objects.create(
+            user=self.user, category=self.food, type='EXPENSE', amount=Decimal('40.00'), date=date(2026, 1, 10),
+        )
+        Transaction.objects.create(
+            user=self.user, category=self.food, type='EXPENSE', amount=Decimal('15.00'), date=date(2026, 1, 20),
+        )
+
+    def summaries(self):
+        return sorted(MonthlySummary.objects.filter(count__gt=0).values_list(
+            'month', 'category_id', 'type', 'currency', 'total', 'count',
+        ))
+
+    def assertMatchesRebuild(self):
+        incremental = self.summaries()
+        rebuild_monthly_summaries([self.user.pk])
+        self.assertEqual(incremental, self.summaries())
+        self.assertEqual(verify_balance_checkpoints([self.user.pk]), [])
+
+    def move(self, **changes):
+        trans = Transaction.objects.get(pk=self.trans.pk)
+        for name, value in changes.items():
+            setattr(trans, name, value)
+        trans.save()
+        self.assertMatchesRebuild()
+
+    def test_moves_match_rebuild(self):
+        self.move(date=date(2026, 2, 3))
+        self.move(category=self.leisure)
+        self.move(type='INCOME', category=self.salary, amount=Decimal('1200.00'))
+        self.move(currency='USD')
+        self.assertIn(
+            (date(2026, 2, 1), self.salary.pk, 'INCOME', 'USD', Decimal('1200.00'), 1), self.summaries(),
+        )
+
+    def test_delete_matches_rebuild(self):
+        self.trans.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.summaries(), [(date(2026, 1, 1), self.food.pk, 'EXPENSE', 'EUR', Decimal('15.00'), 1)])
+        Transaction.objects.filter(user=self.user).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.summaries(), [])
+
+    def test_stale_copies_use_the_stored_row(self):
+        first = Transaction.objects.get(pk=self.trans.pk)
+        second = Transaction.objects.get(pk=self.trans.pk)
+        first.amount = Decimal('20.00')
+        first.save()
+        # Formulaire soumis deux fois: la seconde copie a encore chargé 40
+        second.amount = Decimal('30.00')
+        second.save()
+        self.assertMatchesRebuild()
+        self.assertIn((date(2026, 1, 1), self.food.pk, 'EXPENSE', 'EUR', Decimal('45.00'), 2), self.summaries())
+        # Sauvegarde partielle d'une copie périmée: le montant non écrit reste 30
+        first.date = date(2026, 2, 1)
+        first.save(update_fields=['date'])
+        self.assertMatchesRebuild()
+        self.assertIn((date(2026, 2, 1), self.food.pk, 'EXPENSE', 'EUR', Decimal('30.00'), 1), self.summaries())
+
+        # La copie périmée à 20 retire les 30 enregistrés, une seconde suppression ne retire rien
+        first.delete()
+        second.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.summaries(), [(date(2026, 1, 1), self.food.pk, 'EXPENSE', 'EUR', Decimal('15.00'), 1)])
+        self.assertEqual(get_balance(self.user), Decimal('-15.00'))
+
+    def test_update_in_a_known_month_and_rollback(self):
+        trans = Transaction.objects.get(pk=self.trans.pk)
+        trans.amount = Decimal('45.00')
+        # Ligne enregistrée (verrouillée), transaction, synthèse, point de solde (net et cumul), budgets
+        with self.assertNumQueries(5):
+            trans.save()
+        # Description seule: aucune donnée dérivée à recalculer
+        trans.description = 'Marché'
+        with self.assertNumQueries(2):
+            trans.save()
+
+        before = self.summaries()
+        with mock.patch('core.budgets.record_budget_change', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), db_transaction.atomic():
+                Transaction.objects.create(
+                    user=self.user, category=self.food, type='EXPENSE', amount=Decimal('5.00'), date=date(2026, 3, 1),
+                )
+        # Ni la transaction ni sa synthèse ni son point de solde
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.summaries(), before)
+        self.assertMatchesRebuild()
+
+
+class DashboardStatsTests(TestCase):
+    today = date(2026, 3, 15)
+
+    def setUp(self):
+        self.user = User.objects.create_user('dashboard', password='x')
+        self.salary = Category.objects.create(user=self.user, name='Salaire', type='INCOME')
+        self.food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        self.rent = Category.objects.create(user=self.user, name='Loyer', type='EXPENSE')
+
+    def add(self, category, amount, day):
+        return Transaction.objects.create(
+            user=self.user, category=category, type=category.type, amount=Decimal(amount), date=day,
+        )
+
+    def test_statistics_use_a_fixed_number_of_queries(self):
+        self.add(self.salary, '2000.00', date(2026, 3, 1))
+        self.add(self.food, '45.50', date(2026, 3, 4))
+        self.add(self.rent, '700.00', date(2026, 3, 5))
+        self.add(self.food, '30.00', date(2026, 2, 20))
+        with CaptureQueriesContext(connection) as few:
+            stats = compute_dashboard_stats(self.user, self.today)
+        self.assertEqual(stats['income_month'], Decimal('2000.00'))
+        self.assertEqual(stats['expense_month'], Decimal('745.50'))
+        self.assertEqual(stats['balance'], Decimal('1254.50'))
+        self.assertEqual(stats['total_balance'], Decimal('1224.50'))
+        self.assertEqual(
+            [(row['name'], row['amount']) for row in get_category_data(self.user, self.today)],
+            [('Courses', 45.5), ('Loyer', 700.0)],
+        )
+        months = get_months_data(self.user, self.today, months=2)
+        self.assertEqual([(row['income'], row['expense']) for row in months], [(0.0, 30.0), (2000.0, 745.5)])
+
+        for day in range(1, 29):
+            self.add(self.food, '1.00', date(2026, 3, day))
+        with CaptureQueriesContext(connection) as many:
+            compute_dashboard_stats(self.user, self.today)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_cache_per_user_and_date_until_next_write(self):
+        other = User.objects.create_user('other', password='x')
+        self.add(self.food, '10.00', date(2026, 3, 2))
+        self.assertEqual(get_dashboard_stats(self.user, self.today)['expense_month'], Decimal('10.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(self.user, self.today)['expense_month'], Decimal('10.00'))
+        # Autre utilisateur ou autre date: autre clé
+        self.assertEqual(get_dashboard_stats(other, self.today)['expense_month'], Decimal('0.00'))
+        self.assertEqual(get_dashboard_stats(self.user, date(2026, 4, 15))['expense_month'], Decimal('0.00'))
+
+        self.add(self.food, '5.00', date(2026, 3, 3))
+        self.assertEqual(get_dashboard_stats(self.user, self.today)['expense_month'], Decimal('15.00'))
+
+
+class BudgetProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('progress', password='x')
+        self.category = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+
+    def progress(self, amount, spent, threshold=80):
+        Budget.objects.all().delete()
+        Transaction.objects.all().delete()
+        budget = Budget.objects.create(
+            user=self.user, category=self.category, amount=Decimal(amount), period='2026-03',
+            alert_threshold=threshold,
+        )
+        if Decimal(spent):
+            Transaction.objects.create(user=self.user, category=self.category, type='EXPENSE',
+                                       amount=Decimal(spent), date=date(2026, 3, 10))
+        # Dépense d'une autre période: ignorée
+        Transaction.objects.create(user=self.user, category=self.category, type='EXPENSE',
+                                   amount=Decimal('500.00'), date=date(2026, 4, 1))
+        return Budget.objects.with_progress().get(pk=budget.pk)
+
+    def test_annotations(self):
+        budget = self.progress('200.00', '50.00')
+        self.assertEqual(budget.spent, Decimal('50.00'))
+        self.assertEqual(budget.percentage, Decimal('25'))
+        self.assertEqual(budget.remaining, Decimal('150.00'))
+        self.assertFalse(budget.exceeded)
+        self.assertFalse(budget.over_threshold)
+
+        budget = self.progress('200.00', '0')
+        self.assertEqual((budget.spent, budget.remaining), (Decimal('0.00'), Decimal('200.00')))
+
+    def test_threshold_and_exceeded_boundaries(self):
+        self.assertFalse(self.progress('100.00', '79.99').over_threshold)
+        self.assertTrue(self.progress('100.00', '80.00').over_threshold)
+        at_limit = self.progress('100.00', '100.00')
+        self.assertEqual((at_limit.exceeded, at_limit.remaining), (False, Decimal('0.00')))
+        over = self.progress('100.00', '100.01')
+        # SQLite calcule les expressions en flottants: arrondi au centime comme à l'enregistrement
+        self.assertEqual((over.exceeded, over.remaining.quantize(Decimal('0.01'))), (True, Decimal('-0.01')))
+
+    def test_zero_amount_budget(self):
+        budget = self.progress('0.00', '10.00')
+        self.assertEqual(budget.percentage, Decimal('0'))
+        self.assertTrue(budget.exceeded)
+        self.assertFalse(budget.over_threshold)
+        self.assertTrue(self.progress('0.00', '0', threshold=0).over_threshold)
+
+    def test_period_is_validated_and_normalized(self):
+        def form(period):
+            return BudgetForm(self.user, data={
+                'category': self.category.pk, 'amount': '100.00', 'period': period, 'alert_threshold': 80,
+            })
+
+        for period in ['mars', '2026-13', '2026-03-01', '26-3x', '']:
+            self.assertFalse(form(period).is_valid(), period)
+        budget_form = form(' 2026-3')
+        self.assertTrue(budget_form.is_valid(), budget_form.errors)
+        budget = budget_form.save(commit=False)
+        budget.user = self.user
+        budget.save()
+        self.assertEqual(budget.period, '2026-03')
+
+        # Même contrôle sur le modèle (admin, code)
+        with self.assertRaises(ValidationError):
+            Budget(user=self.user, category=self.category, amount=Decimal('1.00'), period='mars').full_clean()
+        with self.assertRaises(ValueError):
+            Budget.objects.create(user=self.user, category=self.category, amount=Decimal('1.00'), period='2026')
+
+        Transaction.objects.create(user=self.user, category=self.category, type='EXPENSE',
+                                   amount=Decimal('150.00'), date=date(2026, 3, 10))
+        budget = Budget.objects.with_progress().get(pk=budget.pk)
+        self.assertEqual(budget.spent, Decimal('150.00'))
+        self.assertTrue(budget.exceeded)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('report', password='x')
+        self.categories = [
+            Category.objects.create(user=self.user, name=name, type=trans_type)
+            for name, trans_type in [('Salaire', 'INCOME'), ('Courses', 'EXPENSE'), ('Loyer', 'EXPENSE'),
+                                     ('Loisirs', 'EXPENSE')]
+        ]
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=category, type=category.type if category else 'EXPENSE',
+                amount=Decimal(index * 37 % 500) + Decimal('0.35'), date=date(2026, 1 + index % 3, 1 + index % 28),
+            )
+            for index, category in enumerate((self.categories + [None]) * 12)
+        ])
+
+    def naive_report(self, transactions):
+        totals, by_category = {'INCOME': ZERO, 'EXPENSE': ZERO}, {}
+        for trans in transactions.select_related('category'):
+            totals[trans.type] += trans.amount
+            if trans.category:
+                by_category[trans.category.name] = by_category.get(trans.category.name, ZERO) + trans.amount
+        return totals, by_category
+
+    def test_grouped_totals_match_naive_sum(self):
+        for transactions in [
+            Transaction.objects.filter(user=self.user),
+            Transaction.objects.filter(user=self.user, date__month=2),
+            Transaction.objects.filter(user=self.user, category=self.categories[1]),
+        ]:
+            report = compute_report(transactions, 'EUR')
+            totals, by_category = self.naive_report(transactions)
+            self.assertEqual(report['transaction_count'], transactions.count())
+            self.assertEqual(report['total_income'], totals['INCOME'])
+            self.assertEqual(report['total_expense'], totals['EXPENSE'])
+            self.assertEqual(report['net_balance'], totals['INCOME'] - totals['EXPENSE'])
+            grouped = {row['name']: row['amount'] for row in report['categories_income'] + report['categories_expense']}
+            self.assertEqual(grouped, {name: float(total) for name, total in by_category.items()})
+
+    def test_report_is_cached_per_filter(self):
+        transactions = Transaction.objects.filter(user=self.user)
+        filters = {'start_date': None, 'end_date': None, 'category': None, 'type': None, 'q': None}
+        report = get_report(self.user, transactions, filters)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_report(self.user, transactions, filters), report)
+
+        february = transactions.filter(date__month=2)
+        february_report = get_report(self.user, february, {**filters, 'start_date': '2026-02-01'})
+        self.assertLess(february_report['transaction_count'], report['transaction_count'])
+
+        Transaction.objects.create(
+            user=self.user, category=self.categories[0], type='INCOME', amount=Decimal('10.00'), date=date(2026, 1, 5),
+        )
+        self.assertEqual(get_report(self.user, transactions, filters)['total_income'], report['total_income'] + 10)
+
+
+class MonthRangeTests(TestCase):
+    def test_month_range(self):
+        self.assertEqual(month_range('2026-01'), (date(2026, 1, 1), date(2026, 2, 1)))
+        self.assertEqual(month_range('2025-12'), (date(2025, 12, 1), date(2026, 1, 1)))
+
+    def test_month_range_filter(self):
+        self.assertEqual(
+            month_range_filter('2026-02', field='date'),
+            {'date__gte': date(2026, 2, 1), 'date__lt': date(2026, 3, 1)},
+        )
+
+    def test_invalid_month(self):
+        for value in ['', '2026', '2026-13', 'abcd-ef', None]:
+            with self.assertRaises(ValueError):
+                month_range(value)
+
+
+class TransactionIndexTests(TestCase):
+    """Vérifie avec EXPLAIN que les filtres de plage utilisent les index composites"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('index', password='x')
+        other = User.objects.create_user('other', password='x')
+        cls.category = Category.objects.create(user=cls.user, name='Courses', type='EXPENSE')
+        other_category = Category.objects.create(user=other, name='Courses', type='EXPENSE')
+        start = date(2025, 1, 1)
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=user, category=category, type='EXPENSE',
+                amount=Decimal('10.00'), date=start + timedelta(days=i % 400),
+            )
+            for i in range(600)
+            for user, category in [(cls.user, cls.category), (other, other_category)]
+        ])
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Sur une petite table, PostgreSQL préférerait un parcours séquentiel
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET enable_seqscan = on')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"EXPLAIN non vérifié pour {connection.vendor}")
+        plan = self.explain(queryset)
+        self.assertIn(index_name, plan)
+
+    def test_user_date_index(self):
+        transactions = Transaction.objects.filter(user=self.user, **month_range_filter('2025-03'))
+        self.assertUsesIndex(transactions, 'transaction_user_date_idx')
+
+    def test_user_type_date_index(self):
+        transactions = Transaction.objects.filter(
+            user=self.user, type='EXPENSE', **month_range_filter('2025-03')
+        )
+        self.assertUsesIndex(transactions, 'transaction_user_type_date_idx')
+
+    def test_user_category_date_index(self):
+        transactions = Transaction.objects.filter(
+            user=self.user, category=self.category, **month_range_filter('2025-03')
+        )
+        self.assertUsesIndex(transactions, 'transaction_user_cat_date_idx')
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pages', password='x')
+        # Plusieurs transactions partagent la même date pour tester le départage
+        Transaction.objects.bulk_create([
+            Transaction(user=cls.user, type='INCOME', amount=Decimal('1.00'), date=date(2025, 1, 1 + i % 3))
+            for i in range(11)
+        ])
+
+    def test_walks_forward_and_back(self):
+        transactions = Transaction.objects.filter(user=self.user)
+        expected = list(transactions.order_by('-date', '-created_at', 'id').values_list('id', flat=True))
+        paginator = KeysetPaginator(transactions, per_page=4)
+
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous)
+        pages = [page]
+        while page.has_next:
+            page = paginator.get_page(after=page.next_cursor)
+            pages.append(page)
+        self.assertEqual([t.id for p in pages for t in p], expected)
+
+        back = paginator.get_page(before=pages[-1].previous_cursor)
+        self.assertEqual([t.id for t in back], [t.id for t in pages[-2]])
+        self.assertTrue(back.has_next)
+
+
+@override_settings(**BENCHMARK_SETTINGS)
+class CSVExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('export', password='x')
+        food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        salary = Category.objects.create(user=self.user, name='Salaire', type='INCOME')
+        Transaction.objects.create(user=self.user, category=food, type='EXPENSE', amount=Decimal('12.50'),
+                                   date=date(2026, 3, 2), description='Marché, "bio"')
+        Transaction.objects.create(user=self.user, category=salary, type='INCOME', amount=Decimal('2000.00'),
+                                   date=date(2026, 3, 1))
+        other = User.objects.create_user('other', password='x')
+        Transaction.objects.create(user=other, type='EXPENSE', amount=Decimal('99.00'), date=date(2026, 3, 3))
+        self.client.force_login(self.user)
+
+    def rows(self, content):
+        return list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+
+    def test_streamed_csv(self):
+        response = self.client.get(reverse('core:export_csv'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(self.rows(b''.join(response.streaming_content)), [
+            CSV_HEADER,
+            ['2026-03-02', 'Dépense', 'Courses', '12.50', 'EUR', 'Marché, "bio"'],
+            ['2026-03-01', 'Revenu', 'Salaire', '2000.00', 'EUR', ''],
+        ])
+
+    def test_gzip_stream_with_filter(self):
+        response = self.client.get(reverse('core:export_csv'), {'type': 'INCOME', 'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(self.rows(content), [CSV_HEADER, ['2026-03-01', 'Revenu', 'Salaire', '2000.00', 'EUR', '']])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get(reverse('core:export_csv'), {'start_date': 'hier', 'type': 'INCOME'})
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(response, 'start_date', status_code=400)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generation_is_deterministic(self):
+        today = date(2026, 3, 15)
+        rows = generate_user_rows(7, 0, 300, 12, today)
+        self.assertEqual(rows, generate_user_rows(7, 0, 300, 12, today))
+        self.assertNotEqual(rows, generate_user_rows(8, 0, 300, 12, today))
+        self.assertEqual(len(rows), 300)
+        self.assertTrue(all(row[1] <= today for row in rows))
+
+    def test_populate_user(self):
+        [(index, user_id)] = create_users(1, prefix='synthetic')
+        populate_user(user_id, index, seed=1, transaction_count=250, months_count=6)
+        populate_user(user_id, index, seed=1, transaction_count=250, months_count=6)
+        self.assertEqual(Transaction.objects.filter(user_id=user_id).count(), 250)
+        self.assertEqual(verify_monthly_summaries([user_id]), [])
+
+
+class BenchmarkQueryBudgetTests(TestCase):
+    def test_views_stay_within_query_budgets(self):
+        # Latence ignorée ici: seule la croissance du nombre de requêtes est vérifiée
+        report = run_benchmarks(sizes=[300], repeat=1, latency_factor=1000)
+        self.assertTrue(report['passed'], [row['violations'] for row in report['results']])
+        self.assertEqual({row['status'] for row in report['results']}, {200})
+
+
+class SQLInstrumentationTests(TestCase):
+    def test_fingerprint_groups_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND name = \'y\' LIMIT 1'),
+        )
+
+    @override_settings(SQL_INSTRUMENTATION=True, SQL_INSTRUMENTATION_QUERY_THRESHOLD=0, **BENCHMARK_SETTINGS)
+    def test_server_timing_and_repeated_queries_logged(self):
+        user = User.objects.create_user('sql', password='x')
+        client = Client()
+        client.force_login(user)
+        with self.assertLogs('core.sql', level='INFO') as logs:
+            response = client.get('/categories/')
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ queries"')
+        self.assertTrue(any('path=/categories/' in line for line in logs.output))
+        self.assertTrue(any('seuil: 0' in line for line in logs.output))
+
+
+@override_settings(**BENCHMARK_SETTINGS)
+class CacheLayerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cache', password='x')
+        self.food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        get_cache().clear()
+        reset_cache_stats()
+        self.addCleanup(reset_cache_stats)
+
+    def expenses(self, **options):
+        return cached_for_user(self.user.pk, 'expenses', lambda: Transaction.objects.filter(
+            user=self.user, type='EXPENSE',
+        ).count(), **options)
+
+    def test_write_invalidates_cached_results(self):
+        self.assertEqual(self.expenses(), 0)
+        etag = user_etag(self.user.pk, 'expenses')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.expenses(), 0)
+        Transaction.objects.create(
+            user=self.user, category=self.food, type='EXPENSE', amount=Decimal('10.00'), date=date(2026, 3, 1),
+        )
+        self.assertEqual(self.expenses(), 1)
+        self.assertNotEqual(user_etag(self.user.pk, 'expenses'), etag)
+
+        # Les données des autres utilisateurs ne sont pas invalidées
+        other_version = get_data_version(self.user.pk + 1)
+        bump_data_version(self.user.pk)
+        self.assertEqual(get_data_version(self.user.pk + 1), other_version)
+
+    def test_entries_expire_after_timeout(self):
+        now = time.time()
+        self.assertEqual(self.expenses(timeout=60), 0)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=now + 59):
+            with self.assertNumQueries(0):
+                self.expenses(timeout=60)
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=now + 61):
+            with self.assertNumQueries(1):
+                self.expenses(timeout=60)
+
+    def test_hit_and_miss_counters(self):
+        self.expenses()
+        self.expenses()
+        self.expenses()
+        cached_for_user(self.user.pk, 'other', lambda: 1)
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_ratio']), (2, 2, 0.5))
+        self.assertEqual(stats['by_name'], {
+            'expenses': {'hits': 2, 'misses': 1}, 'other': {'hits': 0, 'misses': 1},
+        })
+        self.assertEqual(stats['backend'], 'django.core.cache.backends.locmem.LocMemCache')
+        reset_cache_stats()
+        self.assertEqual(get_cache_stats()['hit_ratio'], None)
+
+    def test_version_bumped_through_another_cache_instance(self):
+        # Un autre processus (commande, worker) a sa propre instance du cache:
+        # seule la version stockée dans le cache partagé les relie
+        self.assertEqual(self.expenses(), 0)
+        other = caches.create_connection('default')
+        self.assertIsNot(other, get_cache())
+        Transaction.objects.bulk_create([Transaction(
+            user=self.user, category=self.food, type='EXPENSE', amount=Decimal('10.00'), date=date(2026, 3, 1),
+        )])
+        with mock.patch('core.caching.get_cache', return_value=other):
+            bump_data_version(self.user.pk)
+        self.assertEqual(self.expenses(), 1)
+
+    def test_check_warns_about_process_cache(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['core.W001'])
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy_cache):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class ChartEndpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('charts', password='x')
+        self.category = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        Transaction.objects.create(user=self.user, category=self.category, type='EXPENSE',
+                                   amount=Decimal('12.50'), date=date.today())
+        self.client.force_login(self.user)
+
+    def test_etag_returns_304_until_data_changes(self):
+        response = self.client.get('/charts/categories/')
+        self.assertEqual(response.json()['categories'][0]['amount'], 12.5)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/charts/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Un renommage de catégorie ne touche aucune transaction mais change le graphique
+        self.category.name = 'Alimentation'
+        self.category.save()
+        response = self.client.get('/charts/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['categories'][0]['name'], 'Alimentation')
+
+    def test_etag_follows_writes_from_other_processes(self):
+        etag = self.client.get('/charts/monthly/')['ETag']
+        # Écriture d'une commande dans un autre processus: aucune version incrémentée ici
+        with mock.patch('core.signals.bump_data_version'):
+            Transaction.objects.create(user=self.user, category=self.category, type='EXPENSE',
+                                       amount=Decimal('3.00'), date=date.today())
+        self.assertEqual(self.client.get('/charts/monthly/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with mock.patch('core.signals.bump_data_version'):
+            Transaction.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get('/charts/monthly/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_shared_cache_etag_needs_no_query(self):
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=shared), self.assertNumQueries(0):
+            user_etag(self.user.pk, 'chart_monthly')
+        with self.assertNumQueries(1):
+            user_etag(self.user.pk, 'chart_monthly')
+
+    def test_etag_depends_on_parameters(self):
+        six = self.client.get('/charts/monthly/')
+        twelve = self.client.get('/charts/monthly/?months=12')
+        self.assertEqual(len(twelve.json()['months']), 12)
+        self.assertNotEqual(six['ETag'], twelve['ETag'])
+
+
+class AsyncURLConf:
+    """ROOT_URLCONF de déploiement ASGI: core.urls choisit ses vues au chargement selon ASYNC_VIEWS"""
+    urlpatterns = [
+        path('', include(([
+            path('', views.dashboard_async_view, name='dashboard'),
+            path('reports/', views.reports_async_view, name='reports'),
+            *core_urls.urlpatterns,
+        ], 'core'))),
+        path('accounts/', include('accounts.urls')),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf, **BENCHMARK_SETTINGS)
+class AsyncViewTests(TransactionTestCase):
+    # Les blocs tournent dans d'autres threads, avec leur propre connexion:
+    # les données doivent être validées, d'où TransactionTestCase
+    def setUp(self):
+        self.user = User.objects.create_user('async', password='x')
+        category = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        Transaction.objects.create(user=self.user, category=category, type='EXPENSE',
+                                   amount=Decimal('42.00'), date=date.today(), description='Marché du samedi')
+
+    async def test_dashboard_async_view(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('core:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(response.resolver_match.func, views.dashboard_async_view)
+        self.assertContains(response, 'Marché du samedi')
+        self.assertContains(response, '42,00')
+
+    async def test_reports_async_view(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('core:reports'), {'type': 'EXPENSE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Transactions (1)')
+
+    def logged_queries(self, logs):
+        [line] = [line for line in logs.output if 'path=/ ' in line]
+        return int(re.search(r'queries=(\d+)', line).group(1))
+
+    @override_settings(SQL_INSTRUMENTATION=True)
+    async def test_block_queries_are_instrumented(self):
+        client = Client()
+        await sync_to_async(client.force_login)(self.user)
+        with override_settings(ROOT_URLCONF='finance_manager.urls'), \
+                self.assertLogs('core.sql', level='INFO') as sync_logs:
+            self.assertEqual((await sync_to_async(client.get)('/')).status_code, 200)
+
+        await sync_to_async(get_cache().clear)()
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs('core.sql', level='INFO') as async_logs:
+            self.assertEqual((await self.async_client.get('/')).status_code, 200)
+        # Les requêtes des blocs exécutés dans les threads du pool sont comptées
+        self.assertEqual(self.logged_queries(async_logs), self.logged_queries(sync_logs))
+
+    async def test_anonymous_user_is_redirected(self):
+        response = await self.async_client.get(reverse('core:reports'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('accounts:login')))
+
+
+class BalanceLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ledger', password='x')
+
+    def add(self, trans_type, amount, day):
+        return Transaction.objects.create(user=self.user, type=trans_type, amount=Decimal(amount), date=day)
+
+    def test_incremental_updates_match_rebuild(self):
+        self.add('INCOME', '1000.00', date(2026, 1, 5))
+        rent = self.add('EXPENSE', '400.00', date(2026, 1, 10))
+        self.add('EXPENSE', '50.00', date(2026, 3, 2))
+        self.assertEqual(get_balance(self.user), Decimal('550.00'))
+
+        # Déplacement vers un mois sans point de solde, changement de type, suppression
+        rent.date = date(2026, 2, 10)
+        rent.save()
+        rent.type = 'INCOME'
+        rent.save()
+        self.assertEqual(get_balance(self.user), Decimal('1350.00'))
+        rent.delete()
+        self.assertEqual(get_balance(self.user), Decimal('950.00'))
+        self.assertEqual(verify_balance_checkpoints([self.user.pk]), [])
+
+        rebuild_balance_checkpoints([self.user.pk])
+        rebuild_balance_checkpoints([self.user.pk])
+        self.assertEqual(get_balance(self.user), Decimal('950.00'))
+
+    def test_balance_at_date_and_history(self):
+        self.add('INCOME', '100.00', date(2026, 1, 5))
+        self.add('EXPENSE', '30.00', date(2026, 3, 2))
+        self.add('EXPENSE', '20.00', date(2026, 3, 20))
+        self.assertEqual(get_balance_at(self.user, date(2025, 12, 31)), Decimal('0.00'))
+        self.assertEqual(get_balance_at(self.user, date(2026, 2, 28)), Decimal('100.00'))
+        self.assertEqual(get_balance_at(self.user, date(2026, 3, 10)), Decimal('70.00'))
+
+        history = get_balance_history(self.user, today=date(2026, 4, 15))
+        self.assertEqual([month['balance'] for month in history], [100.0, 100.0, 50.0, 50.0])
+
+
+class MultiCurrencyTests(TestCase):
+    def setUp(self):
+        rate_cache.clear()
+        load_rates(read_rates(io.StringIO("date,base,quote,rate\n2026-01-01,EUR,XOF,655.957\n")))
+        self.user = User.objects.create_user('xof', password='x')
+        self.user.profile.currency = 'XOF'
+        self.user.profile.save()
+        self.category = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        Transaction.objects.create(
+            user=self.user, type='INCOME', amount=Decimal('655957.00'), currency='XOF', date=date(2026, 1, 5),
+        )
+        Transaction.objects.create(
+            user=self.user, category=self.category, type='EXPENSE', amount=Decimal('100.00'), currency='EUR',
+            date=date(2026, 1, 10),
+        )
+
+    def test_rate_file_adds_inverse_pair(self):
+        self.assertEqual(ExchangeRate.objects.count(), 2)
+        self.assertEqual(rate_cache.convert(Decimal('655957'), 'XOF', 'EUR', date(2026, 3, 1)), Decimal('1000.00'))
+        with self.assertRaises(ValueError):
+            read_rates(io.StringIO("date,base,quote,rate\n2026-01-01,EUR,JPY,160\n"))
+
+    def test_consolidated_totals_in_profile_currency(self):
+        report = compute_report(Transaction.objects.filter(user=self.user), 'XOF')
+        self.assertEqual(report['total_income'], Decimal('655957.00'))
+        self.assertEqual(report['total_expense'], Decimal('65595.70'))
+        totals = get_totals(self.user, today=date(2026, 1, 20))
+        self.assertEqual(totals['expense_month'], Decimal('65595.70'))
+        self.assertEqual(get_balance(self.user, today=date(2026, 1, 20)), Decimal('590361.30'))
+        self.assertEqual(get_balance(self.user, 'EUR', date(2026, 1, 20)), Decimal('900.00'))
+
+    def test_budget_follows_profile_currency(self):
+        budget = Budget.objects.create(user=self.user, category=self.category, amount=Decimal('131191.40'),
+                                       period='2026-01')
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent_amount, Decimal('65595.70'))
+        self.assertEqual(budget.percentage_used, Decimal('50.00'))
+
+        self.user.profile.currency = 'EUR'
+        self.user.profile.save()
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent_amount, Decimal('100.00'))
+
+
+class TrendAnalyticsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('trends', password='x')
+        food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        salary = Category.objects.create(user=self.user, name='Salaire', type='INCOME')
+        for category, trans_type, amount, day in [
+            (salary, 'INCOME', '1000.00', date(2026, 1, 1)),
+            (food, 'EXPENSE', '100.00', date(2026, 1, 10)),
+            (food, 'EXPENSE', '50.50', date(2026, 2, 5)),
+            (food, 'EXPENSE', '300.00', date(2026, 3, 20)),
+            (None, 'EXPENSE', '10.00', date(2026, 3, 21)),
+        ]:
+            Transaction.objects.create(user=self.user, category=category, type=trans_type,
+                                       amount=Decimal(amount), date=day)
+
+    def test_rolling_sums_truncate_the_first_window(self):
+        self.assertEqual(rolling_sums([1, 2, 3, 4], 2).tolist(), [1, 3, 5, 7])
+
+    def test_trends_from_columns(self):
+        columns = load_columns(self.user, 'EUR')
+        self.assertEqual(columns.origin, date(2026, 1, 1))
+        self.assertEqual(int(columns.cents.sum()), 53950)
+
+        trends = compute_trends(columns, date(2026, 3, 31))
+        last = trends['daily'][-1]
+        self.assertEqual((last['rolling_30'], last['rolling_90'], last['balance']), (310.0, 460.5, 539.5))
+        self.assertEqual([month['expense'] for month in trends['months']], [100.0, 50.5, 310.0])
+        self.assertEqual([month['change'] for month in trends['months']], [None, -49.5, 513.9])
+        self.assertEqual(trends['categories'], [
+            {'name': 'Courses', 'color': columns.category_labels[0][1], 'total': 450.5,
+             'averages': [100.0, 75.25, 150.17]},
+        ])
+
+    @override_settings(**BENCHMARK_SETTINGS)
+    def test_trends_page(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get('/reports/trends/'), 'Dépenses sur 30 jours')
+        self.assertEqual(self.client.get('/charts/trends/').json()['currency'], 'EUR')
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('forecast', password='x')
+        self.food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        leisure = Category.objects.create(user=self.user, name='Loisirs', type='EXPENSE')
+        expenses = [(self.food, '100.00', date(2026, month, day)) for month in (1, 2, 3) for day in (5, 20)]
+        expenses.append((self.food, '100.00', date(2026, 4, 5)))
+        expenses += [(leisure, f'{20 + index}.00', date(2026, 2 + index // 5, 1 + index)) for index in range(10)]
+        self.outlier = date(2026, 4, 8)
+        expenses.append((leisure, '300.00', self.outlier))
+        for category, amount, day in expenses:
+            Transaction.objects.create(user=self.user, category=category, type='EXPENSE',
+                                       amount=Decimal(amount), date=day)
+        Budget.objects.create(user=self.user, category=self.food, amount=Decimal('150.00'), period='2026-04')
+
+    def test_forecast_and_anomalies_are_stored(self):
+        today = date(2026, 4, 10)
+        result = compute_forecasts(User.objects.filter(pk=self.user.pk), today)
+        self.assertEqual((result.users, result.anomalies), (1, 1))
+
+        # Moitié des dépenses habituellement faite au 10 du mois: 100 dépensés + 200 x 0,5 attendus
+        food = CategoryForecast.objects.get(user=self.user, category=self.food)
+        self.assertEqual((food.spent, food.projected), (Decimal('100.00'), Decimal('200.00')))
+        forecasts = get_forecasts(self.user, today)
+        self.assertTrue(next(forecast for forecast in forecasts if forecast.category == self.food).over_budget)
+
+        [anomaly] = get_anomalies(self.user, today)
+        self.assertEqual((anomaly.transaction.date, anomaly.baseline), (self.outlier, Decimal('25.00')))
+
+        # Idempotent: les résultats du mois sont remplacés
+        compute_forecasts(User.objects.filter(pk=self.user.pk), today)
+        self.assertEqual(SpendingAnomaly.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(CategoryForecast.objects.filter(user=self.user).count(), len(forecasts))
+
+
+class BudgetAlertStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('budget', password='x')
+        self.category = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        self.budget = Budget.objects.create(
+            user=self.user, category=self.category, amount=Decimal('100.00'), period='2026-03', alert_threshold=80,
+        )
+
+    def spend(self, amount, day=date(2026, 3, 10)):
+        return Transaction.objects.create(
+            user=self.user, category=self.category, type='EXPENSE', amount=Decimal(amount), date=day,
+        )
+
+    def test_state_follows_transaction_writes(self):
+        self.spend('50.00')
+        self.spend('20.00', day=date(2026, 4, 1))
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_state, Budget.STATE_OK)
+        self.assertEqual(self.budget.spent_amount, Decimal('50.00'))
+
+        groceries = self.spend('55.00')
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_state, Budget.STATE_EXCEEDED)
+        self.assertEqual(get_budget_alerts(self.user, '2026-03'), [self.budget])
+
+        groceries.amount = Decimal('30.00')
+        groceries.save()
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_state, Budget.STATE_ALERT)
+        self.assertEqual(self.budget.percentage_used, Decimal('80.00'))
+
+        groceries.delete()
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_state, Budget.STATE_OK)
+        self.assertEqual(
+            list(BudgetAlert.objects.order_by('pk').values_list('previous_state', 'state')),
+            [('OK', 'EXCEEDED'), ('EXCEEDED', 'ALERT'), ('ALERT', 'OK')],
+        )
+
+    def test_stored_percentage_is_capped(self):
+        self.budget.amount = Decimal('0.01')
+        self.budget.save()
+        self.spend('99999999.99')
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_state, Budget.STATE_EXCEEDED)
+        self.assertEqual(self.budget.spent_amount, Decimal('99999999.99'))
+        self.assertEqual(self.budget.percentage_used, PERCENTAGE_LIMIT)
+        self.assertEqual(BudgetAlert.objects.get(budget=self.budget).percentage, PERCENTAGE_LIMIT)
+
+    @override_settings(**BENCHMARK_SETTINGS)
+    def test_unpadded_period_still_raises_alerts(self):
+        leisure = Category.objects.create(user=self.user, name='Loisirs', type='EXPENSE')
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('core:budget_create'), {
+            'category': leisure.pk, 'amount': '40.00', 'period': '2026-3', 'alert_threshold': 80,
+        })
+        self.assertRedirects(response, reverse('core:budget_list'))
+        budget = Budget.objects.get(category=leisure)
+        self.assertEqual(budget.period, '2026-03')
+
+        # L'évaluation à l'écriture compare la clé 'YYYY-MM' de la dépense à la période enregistrée
+        Transaction.objects.create(
+            user=self.user, category=leisure, type='EXPENSE', amount=Decimal('50.00'), date=date(2026, 3, 10),
+        )
+        budget.refresh_from_db()
+        self.assertEqual((budget.spent_amount, budget.alert_state), (Decimal('50.00'), Budget.STATE_EXCEEDED))
+        self.assertEqual(list(BudgetAlert.objects.filter(budget=budget).values_list('state', flat=True)), ['EXCEEDED'])
+
+        out = io.StringIO()
+        call_command('evaluate_budgets', period='2026-3', stdout=out)
+        self.assertIn('✓ 2 budget(s)', out.getvalue())
+
+    def test_budget_change_is_evaluated(self):
+        self.spend('60.00')
+        self.budget.amount = Decimal('50.00')
+        self.budget.save()
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_state, Budget.STATE_EXCEEDED)
+
+
+class RecurringTransactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('recurring', password='x')
+        self.rent = Category.objects.create(user=self.user, name='Logement', type='EXPENSE')
+
+    def test_monthly_schedule_is_materialized_once(self):
+        schedule = RecurringTransaction.objects.create(
+            user=self.user, category=self.rent, type='EXPENSE', amount=Decimal('800.00'),
+            description='Loyer', day_of_month=31, start_date=date(2026, 1, 5), end_date=date(2026, 4, 30),
+        )
+        self.assertEqual(schedule.next_date, date(2026, 1, 31))
+
+        result = materialize_due(date(2026, 3, 15))
+        self.assertEqual(result.created, 2)
+        self.assertEqual(
+            list(schedule.transactions.order_by('date').values_list('date', flat=True)),
+            [date(2026, 1, 31), date(2026, 2, 28)],
+        )
+        self.assertEqual(materialize_due(date(2026, 3, 15)).created, 0)
+
+        # Une échéance déjà présente (exécution interrompue) n'est pas recréée
+        schedule.refresh_from_db()
+        schedule.next_date = date(2026, 2, 28)
+        schedule.save()
+        result = materialize_due(date(2026, 6, 1))
+        self.assertEqual((result.created, result.skipped, result.finished), (2, 1, 1))
+        schedule.refresh_from_db()
+        self.assertFalse(schedule.is_active)
+        self.assertEqual(Transaction.objects.filter(recurring=schedule).count(), 4)
+        self.assertEqual(verify_monthly_summaries([self.user.pk]), [])
+        self.assertEqual(verify_balance_checkpoints([self.user.pk]), [])
+
+    @override_settings(**BENCHMARK_SETTINGS)
+    def test_moving_an_occurrence_onto_another_is_a_form_error(self):
+        schedule = RecurringTransaction.objects.create(
+            user=self.user, category=self.rent, type='EXPENSE', amount=Decimal('800.00'),
+            description='Loyer', day_of_month=1, start_date=date(2026, 1, 1),
+        )
+        materialize_due(date(2026, 2, 15))
+        january, february = schedule.transactions.order_by('date')
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('core:transaction_update', args=[february.pk]), {
+            'type': 'EXPENSE', 'category': self.rent.pk, 'amount': '800.00', 'currency': february.currency,
+            'date': '2026-01-01', 'description': 'Loyer',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('date', response.context['form'].errors)
+        february.refresh_from_db()
+        self.assertEqual(february.date, date(2026, 2, 1))
+
+    def test_weekly_interval(self):
+        RecurringTransaction.objects.create(
+            user=self.user, type='INCOME', amount=Decimal('50.00'), frequency=RecurringTransaction.WEEKLY,
+            interval=2, start_date=date(2026, 3, 2),
+        )
+        materialize_due(date(2026, 3, 31))
+        self.assertEqual(
+            list(Transaction.objects.order_by('date').values_list('date', flat=True)),
+            [date(2026, 3, 2), date(2026, 3, 16), date(2026, 3, 30)],
+        )
+
+    def test_large_backlog_uses_bulk_maintenance(self):
+        Transaction.objects.create(user=self.user, type='INCOME', amount=Decimal('900.00'), date=date(2025, 6, 3))
+        Transaction.objects.create(user=self.user, category=self.rent, type='EXPENSE', amount=Decimal('10.00'),
+                                   date=date(2026, 2, 1))
+        budget = Budget.objects.create(user=self.user, category=self.rent, amount=Decimal('50.00'), period='2026-02')
+        RecurringTransaction.objects.create(
+            user=self.user, category=self.rent, type='EXPENSE', amount=Decimal('12.50'),
+            frequency=RecurringTransaction.WEEKLY, start_date=date(2025, 1, 6),
+        )
+        result = materialize_due(date(2026, 12, 31))
+        self.assertEqual(result.created, 104)
+        self.assertEqual(verify_monthly_summaries([self.user.pk]), [])
+        self.assertEqual(verify_balance_checkpoints([self.user.pk]), [])
+        budget.refresh_from_db()
+        self.assertEqual((budget.spent_amount, budget.alert_state), (Decimal('60.00'), Budget.STATE_EXCEEDED))
+
+
+class ImporterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('importer', password='x')
+        self.food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+
+    def run_import(self, content, fmt='csv', **options):
+        return import_file(self.user, io.BytesIO(content.encode('utf-8')), fmt=fmt, batch_size=2, **options)
+
+    def rows(self):
+        return list(Transaction.objects.filter(user=self.user).order_by('date', 'amount').values_list(
+            'date', 'type', 'amount', 'category__name', 'description',
+        ))
+
+    def test_csv_french_and_english_formats(self):
+        french = (
+            'Date;Type;Catégorie;Montant;Libellé\n'
+            '03/04/2026;Dépense;courses;1 234,56;Marché\n'
+            '05/04/2026;Revenu;Salaire;2 000,00;Avril\n'
+        )
+        english = (
+            'date,category,amount,memo\n'
+            '2026-04-10,Courses,"-1,234.56",Market\n'
+            '2026-04-11,,12.5,Refund\n'
+        )
+        self.assertEqual(self.run_import(french).created, 2)
+        result = self.run_import(english)
+        self.assertEqual((result.created, result.errors), (2, []))
+        self.assertEqual(self.rows(), [
+            (date(2026, 4, 3), 'EXPENSE', Decimal('1234.56'), 'Courses', 'Marché'),
+            (date(2026, 4, 5), 'INCOME', Decimal('2000.00'), 'Salaire', 'Avril'),
+            (date(2026, 4, 10), 'EXPENSE', Decimal('1234.56'), 'Courses', 'Market'),
+            (date(2026, 4, 11), 'INCOME', Decimal('12.50'), None, 'Refund'),
+        ])
+        # La catégorie existante est réutilisée, seule Salaire est créée
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+
+    def test_ofx_split_across_read_chunks(self):
+        content = '<OFX><BANKTRANLIST>' + ''.join(
+            f'<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>2026040{day}120000<TRNAMT>-{day}.25'
+            f'<NAME>Boutique {day}<MEMO>Carte</STMTTRN>\n'
+            for day in range(1, 6)
+        ) + '</BANKTRANLIST></OFX>'
+        expected = list(read_ofx(io.StringIO(content)))
+        self.assertEqual(len(expected), 5)
+        for chunk_size in (1, 7, 9, 50):
+            self.assertEqual(list(read_ofx(io.StringIO(content), chunk_size=chunk_size)), expected)
+
+        result = self.run_import(content, fmt='ofx')
+        self.assertEqual(result.created, 5)
+        self.assertEqual(self.rows()[0], (date(2026, 4, 1), 'EXPENSE', Decimal('1.25'), None, 'Boutique 1 - Carte'))
+
+    def test_qif_dates_and_amounts(self):
+        content = (
+            '!Type:Bank\n'
+            'D03/04/2026\nT-1,234.56\nPMarché\nLCourses:Fruits\n^\n'
+            'D04/05\'26\nU2 000,00\nPEmployeur\nMAvril\nLSalaire\n^\n'
+            'D2026-04-07\nT-50.00\nL[Épargne]\n^\n'
+        )
+        result = self.run_import(content, fmt='qif')
+        self.assertEqual((result.created, result.errors), (3, []))
+        self.assertEqual(self.rows(), [
+            (date(2026, 4, 3), 'EXPENSE', Decimal('1234.56'), 'Courses', 'Marché'),
+            (date(2026, 4, 5), 'INCOME', Decimal('2000.00'), 'Salaire', 'Employeur - Avril'),
+            (date(2026, 4, 7), 'EXPENSE', Decimal('50.00'), None, ''),
+        ])
+
+    def test_errors_are_reported_per_line(self):
+        content = (
+            'Date,Type,Montant\n'
+            '2026-04-01,EXPENSE,10.00\n'
+            '31/02/2026,EXPENSE,10.00\n'
+            '2026-04-02,Virement,10.00\n'
+            '2026-04-03,EXPENSE,0.001\n'
+            '2026-04-04,EXPENSE,abc\n'
+            '\n'
+            '2026-04-05,INCOME,5.00\n'
+        )
+        result = self.run_import(content)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.rows, 6)
+        self.assertEqual([error.line for error in result.errors], [3, 4, 5, 6])
+        self.assertIn('Date invalide', result.errors[0].message)
+        self.assertIn('Type inconnu', result.errors[1].message)
+        self.assertIn('supérieur à zéro', result.errors[2].message)
+        self.assertIn('Montant invalide', result.errors[3].message)
+
+        result = self.run_import('Libellé;Montant\nMarché;10,00\n')
+        self.assertEqual([(error.line, error.message[:16]) for error in result.errors], [(1, 'En-tête CSV inva')])
+
+    def test_dry_run_makes_no_writes(self):
+        content = 'Date,Catégorie,Montant\n2026-04-01,Nouvelle,-10.00\n2026-04-02,Courses,-5.00\n'
+        with CaptureQueriesContext(connection) as queries:
+            result = self.run_import(content, dry_run=True)
+        self.assertEqual((result.created, result.categories_created, result.dry_run), (2, 1, True))
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) for query in queries))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+        self.assertFalse(MonthlySummary.objects.filter(user=self.user).exists())
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 1)
+
+    def test_unknown_categories_are_rejected_without_create(self):
+        Category.objects.create(user=self.user, name='Salaire', type='INCOME')
+        content = (
+            'Date,Catégorie,Montant\n'
+            '2026-04-01,Courses,-10.00\n'
+            '2026-04-02,Nouvelle,-5.00\n'
+            '2026-04-03,Salaire,-5.00\n'
+        )
+        result = self.run_import(content, create_categories=False)
+        self.assertEqual((result.created, result.categories_created), (1, 0))
+        self.assertEqual([(error.line, error.message) for error in result.errors], [
+            (3, 'Catégorie inconnue: Nouvelle'),
+            (4, 'Le type de transaction doit correspondre au type de catégorie'),
+        ])
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_import_keeps_derived_data_consistent(self):
+        budget = Budget.objects.create(user=self.user, category=self.food, amount=Decimal('100.00'), period='2026-04')
+        Transaction.objects.create(
+            user=self.user, category=self.food, type='EXPENSE', amount=Decimal('30.00'), date=date(2026, 4, 2),
+        )
+        content = 'Date;Catégorie;Montant\n' + ''.join(
+            f'{day:02d}/{month:02d}/2026;Courses;-{day},00\n' for month in (3, 4, 5) for day in (1, 15, 28)
+        ) + '20/04/2026;;1 000,00\n'
+        received = []
+        handler = lambda sender, transactions, **kwargs: received.append(len(transactions))
+        transactions_bulk_created.connect(handler)
+        self.addCleanup(transactions_bulk_created.disconnect, handler)
+
+        result = self.run_import(content)
+        self.assertEqual(result.created, 10)
+        # Un signal par lot de batch_size lignes
+        self.assertEqual(received, [2, 2, 2, 2, 2])
+        self.assertEqual(verify_monthly_summaries([self.user.pk]), [])
+        self.assertEqual(verify_balance_checkpoints([self.user.pk]), [])
+        self.assertEqual(get_balance(self.user), Decimal('1000.00') - Decimal('30.00') - 3 * Decimal('44.00'))
+        budget.refresh_from_db()
+        self.assertEqual(budget.spent_amount, Decimal('74.00'))
+        self.assertEqual(budget.alert_state, Budget.STATE_OK)
+
+
+class TransactionSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('search', password='x')
+        other = User.objects.create_user('other', password='x')
+        for owner, description, day in [
+            (self.user, 'Facture électricité EDF', 3),
+            (self.user, 'Électricien: réparation tableau électrique', 9),
+            (self.user, 'Courses au marché', 12),
+            (other, 'Électricité', 4),
+        ]:
+            Transaction.objects.create(user=owner, type='EXPENSE', amount=Decimal('10.00'),
+                                       date=date(2026, 3, day), description=description)
+
+    def descriptions(self, query, ranked=False):
+        transactions = Transaction.objects.filter(user=self.user)
+        if ranked:
+            return [trans.description for trans in search.ranked_transactions(transactions, query, 10)]
+        return sorted(search.search_transactions(transactions, query).values_list('description', flat=True))
+
+    def check_search(self):
+        self.assertEqual(self.descriptions('electri'), [
+            'Facture électricité EDF', 'Électricien: réparation tableau électrique',
+        ])
+        self.assertEqual(self.descriptions('ELEC edf'), ['Facture électricité EDF'])
+        self.assertEqual(self.descriptions('"edf" OR'), [])
+        self.assertEqual(self.descriptions('electri', ranked=True)[0], 'Électricien: réparation tableau électrique')
+
+        courses = Transaction.objects.get(description='Courses au marché')
+        courses.description = 'Boulangerie'
+        courses.save()
+        self.assertEqual(self.descriptions('boul'), ['Boulangerie'])
+        courses.delete()
+        self.assertEqual(self.descriptions('boul'), [])
+
+    def test_fts5_index(self):
+        self.assertEqual(search.search_backend(), 'fts5')
+        self.check_search()
+
+    def test_python_fallback(self):
+        search._backends['default'] = 'python'
+        try:
+            self.check_search()
+        finally:
+            search._backends.clear()
+
+
+@override_settings(**BENCHMARK_SETTINGS)
+class TransactionAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='x')
+        self.users = [User.objects.create_user(f'client{i}', password='x') for i in range(3)]
+        self.food, self.leisure = [
+            Category.objects.create(user=self.users[0], name=name, type='EXPENSE') for name in ('Courses', 'Loisirs')
+        ]
+        for user in self.users:
+            Transaction.objects.bulk_create([
+                Transaction(user=user, category=self.food if user == self.users[0] else None, type='EXPENSE',
+                            amount=Decimal('10.00'), date=date(2026, 1 + i % 3, 1), description=f'Achat {i}')
+                for i in range(30)
+            ])
+        rebuild_monthly_summaries()
+        rebuild_balance_checkpoints()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:core_transaction_changelist')
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        Transaction.objects.bulk_create([
+            Transaction(user=user, type='EXPENSE', amount=Decimal('1.00'), date=date(2026, 2, 1))
+            for user in self.users for _ in range(20)
+        ])
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(self.url, {'q': 'achat', 'user__id__exact': self.users[0].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 30)
+        self.assertLessEqual(len(second), len(first) + 1)
+
+    def test_bulk_actions_keep_derived_data_consistent(self):
+        selected = Transaction.objects.filter(user=self.users[0], date__month=2).values_list('pk', flat=True)
+        self.client.post(self.url, {
+            'action': 'recategorize', 'category': self.leisure.pk, '_selected_action': list(selected),
+        })
+        self.assertEqual(Transaction.objects.filter(category=self.leisure).count(), 10)
+
+        data = {'action': 'delete_transactions', 'select_across': '1', '_selected_action': selected[0]}
+        response = self.client.post(f'{self.url}?user__id__exact={self.users[1].pk}', data)
+        self.assertContains(response, 'Supprimer définitivement 30 transaction(s)')
+        self.client.post(f'{self.url}?user__id__exact={self.users[1].pk}', {**data, 'post': 'yes'})
+        self.assertFalse(Transaction.objects.filter(user=self.users[1]).exists())
+        self.assertEqual(Transaction.objects.count(), 60)
+        self.assertEqual(verify_monthly_summaries(), [])
+        self.assertEqual(verify_balance_checkpoints(), [])
+
+    def test_bulk_delete_replaces_post_delete_maintenance(self):
+        budget = Budget.objects.create(user=self.users[0], category=self.food, amount=Decimal('50.00'), period='2026-02')
+        budget.refresh_from_db()
+        self.assertEqual(budget.alert_state, Budget.STATE_EXCEEDED)
+        selected = list(Transaction.objects.filter(user=self.users[0], date__month=2).values_list('pk', flat=True))
+        SpendingAnomaly.objects.create(
+            user=self.users[0], transaction_id=selected[0], baseline=Decimal('1.00'), score=Decimal('9.00'),
+            detected_at=timezone.now(),
+        )
+        version = get_data_version(self.users[0].pk)
+
+        self.client.post(self.url, {'action': 'delete_transactions', 'post': 'yes', '_selected_action': selected})
+        self.assertFalse(Transaction.objects.filter(pk__in=selected).exists())
+        self.assertFalse(SpendingAnomaly.objects.exists())
+        budget.refresh_from_db()
+        self.assertEqual((budget.spent_amount, budget.alert_state), (Decimal('0.00'), Budget.STATE_OK))
+        self.assertNotEqual(get_data_version(self.users[0].pk), version)
+        self.assertEqual(verify_monthly_summaries([self.users[0].pk]), [])
+        self.assertEqual(verify_balance_checkpoints([self.users[0].pk]), [])
+
+
+class ReadReplicaRouterTests(TestCase):
+    def test_reads_stay_on_primary_after_a_write(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Transaction))
+        with use_replica(), track_writes() as state:
+            self.assertEqual(router.db_for_read(Transaction), 'replica')
+            # Sessions et utilisateurs ne sont jamais lus sur le réplica
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Transaction), 'default')
+            self.assertTrue(state.wrote)
+            self.assertIsNone(router.db_for_read(Transaction))
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+
+
+@override_settings(DATABASE_ROUTERS=['core.routers.ReadReplicaRouter'], **BENCHMARK_SETTINGS)
+class ReadReplicaIntegrationTests(TransactionTestCase):
+    # Deuxième alias sur la base de test en mémoire partagée: mêmes données,
+    # mais des requêtes comptées séparément. Il est ajouté après la mise en
+    # place des bases de test, qui ne le connaissent pas.
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connections.settings['replica'] = {**connections['default'].settings_dict}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user('replica', password='x')
+        self.food = Category.objects.create(user=self.user, name='Courses', type='EXPENSE')
+        self.client.force_login(self.user)
+
+    def get_reports(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(reverse('core:reports')).status_code, 200)
+        return [query['sql'] for query in primary if 'core_' in query['sql']], replica.captured_queries
+
+    def test_read_after_write_goes_to_primary(self):
+        primary, replica = self.get_reports()
+        self.assertTrue(replica)
+        self.assertEqual(primary, [])
+
+        response = self.client.post(reverse('core:transaction_create'), {
+            'type': 'EXPENSE', 'category': self.food.pk, 'amount': '12.50', 'currency': 'EUR',
+            'date': '2026-03-01', 'description': 'Marché',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        # Le cookie suit le navigateur, quel que soit le worker qui répond
+        primary, replica = self.get_reports()
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
+
+        # Épinglage expiré: retour au réplica
+        del self.client.cookies[PIN_COOKIE]
+        primary, replica = self.get_reports()
+        self.assertTrue(replica)
+        self.assertEqual(primary, [])
+
+
+class ShardingTests(TestCase):
+    def test_jump_hash_moves_only_a_share_of_users(self):
+        before = [jump_hash(user_id, 3) for user_id in range(1, 3001)]
+        after = [jump_hash(user_id, 4) for user_id in range(1, 3001)]
+        moved = [(old, new) for old, new in zip(before, after) if old != new]
+        # Ajouter un 4e shard ne déplace qu'environ un quart des utilisateurs, tous vers lui
+        self.assertTrue(600 < len(moved) < 900)
+        self.assertEqual({new for _, new in moved}, {3})
+
+    def test_router_follows_user_shard(self):
+        user = User.objects.create_user('sharded')
+        UserShard.objects.update_or_create(user=user, defaults={'database': 'shard_1'})
+        self.addCleanup(get_cache().delete, SHARD_CACHE_KEY.format(user_id=user.pk))
+        router = ShardRouter()
+        # Sans shard configuré, tout reste sur `default`
+        self.assertEqual(router.db_for_read(Transaction, instance=Transaction(user=user)), 'default')
+        with override_settings(SHARDS=['default', 'shard_1']):
+            self.assertEqual(router.db_for_write(Transaction, instance=Transaction(user=user)), 'shard_1')
+            self.assertEqual(router.db_for_read(Category, instance=user), 'shard_1')
+            self.assertEqual(router.db_for_read(Budget), 'default')
+            with on_shard('shard_1'):
+                self.assertEqual(router.db_for_read(MonthlySummary), 'shard_1')
+                self.assertEqual(router.db_for_read(ExchangeRate), 'shard_1')
+                self.assertIsNone(router.db_for_read(User))
+                self.assertIsNone(router.db_for_write(ExchangeRate))
+
+
+@override_settings(SHARDS=['default', 'shard_1'], DATABASE_ROUTERS=['core.sharding.ShardRouter'], **BENCHMARK_SETTINGS)
+class ShardMoveTests(TransactionTestCase):
+    # Comme ReadReplicaIntegrationTests, un second alias ajouté après la mise
+    # en place des bases de test, mais sur une vraie base distincte (fichier
+    # SQLite) pour que les lignes changent réellement de base
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        connections.settings['shard_1'] = {**connections['default'].settings_dict, 'NAME': f'{cls.directory}/shard_1.sqlite3'}
+        call_command('migrate', database='shard_1', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['shard_1'].close()
+        del connections['shard_1']
+        del connections.settings['shard_1']
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        call_command('flush', database='shard_1', interactive=False, inhibit_post_migrate=True, verbosity=0)
+        set_id_offsets('shard_1')
+        get_cache().clear()
+
+    def create_user(self, username, alias=None):
+        """Utilisateur avec une catégorie, un budget et quatre transactions sur `alias` (défaut: son placement)"""
+        user = User.objects.create_user(username)
+        if alias is not None:
+            UserShard.objects.update_or_create(user=user, defaults={'database': alias})
+            mirror_users([user.pk], alias)
+            get_cache().delete(SHARD_CACHE_KEY.format(user_id=user.pk))
+        with for_user(user.pk):
+            food = Category.objects.create(user=user, name='Courses', type='EXPENSE')
+            Budget.objects.create(user=user, category=food, amount=Decimal('25.00'), period='2026-02')
+            for day in (date(2026, 1, 5), date(2026, 1, 20), date(2026, 2, 3), date(2026, 2, 17)):
+                Transaction.objects.create(user=user, category=food, type='EXPENSE', amount=Decimal('10.00'), date=day)
+        return user
+
+    def rows(self, user_id, alias):
+        counts = {model.__name__: model._base_manager.using(alias).filter(user_id=user_id).count()
+                  for model in SHARDED_MODELS}
+        return {name: count for name, count in counts.items() if count}
+
+    def test_move_user_keeps_ids_and_derived_data(self):
+        user = self.create_user('nomade', 'default')
+        ids = list(Transaction.objects.using('default').filter(user=user).order_by('pk').values_list('pk', flat=True))
+        before = self.rows(user.pk, 'default')
+        self.assertEqual(shard_for_user(user.pk), 'default')
+
+        self.assertEqual(move_user(user.pk, 'default', 'shard_1', batch_size=3), sum(before.values()))
+        # Annuaire relu malgré l'entrée en cache
+        self.assertEqual(shard_for_user(user.pk), 'shard_1')
+        self.assertEqual(self.rows(user.pk, 'default'), {})
+        self.assertEqual(self.rows(user.pk, 'shard_1'), before)
+        self.assertEqual(
+            list(Transaction.objects.using('shard_1').filter(user=user).order_by('pk').values_list('pk', flat=True)), ids,
+        )
+        self.assertTrue(User.objects.using('shard_1').filter(pk=user.pk).exists())
+        with on_shard('shard_1'):
+            self.assertEqual(verify_monthly_summaries([user.pk]), [])
+            self.assertEqual(verify_balance_checkpoints([user.pk]), [])
+            self.assertEqual(Budget.objects.get(user=user).spent_amount, Decimal('20.00'))
+
+        # Les identifiants copiés ne décalent pas la plage de chaque base
+        with for_user(user.pk):
+            added = Transaction.objects.create(user=user, type='INCOME', amount=Decimal('5.00'), date=date(2026, 3, 1))
+        self.assertTrue(SHARD_ID_SPACE <= added.pk < 2 * SHARD_ID_SPACE)
+        other = self.create_user('sedentaire', 'default')
+        self.assertLess(Transaction.objects.using('default').filter(user=other).latest('pk').pk, SHARD_ID_SPACE)
+        # SQLite reprendrait après `added` sur `default`: retour refusé, rien n'est modifié
+        with self.assertRaises(ValueError):
+            move_user(user.pk, 'shard_1', 'default')
+        self.assertEqual(shard_for_user(user.pk), 'shard_1')
+        self.assertEqual(self.rows(user.pk, 'shard_1')['Transaction'], 5)
+
+    def test_purge_user(self):
+        user, other = self.create_user('parti', 'shard_1'), self.create_user('reste', 'shard_1')
+        purge_user(user.pk, 'shard_1')
+        self.assertEqual(self.rows(user.pk, 'shard_1'), {})
+        self.assertFalse(User.objects.using('shard_1').filter(pk=user.pk).exists())
+        self.assertTrue(User.objects.using('default').filter(pk=user.pk).exists())
+        self.assertEqual(self.rows(other.pk, 'shard_1')['Transaction'], 4)
+
+        # Suppression du compte: ses données partent aussi de son shard
+        other_id = other.pk
+        other.delete()
+        self.assertEqual(self.rows(other_id, 'shard_1'), {})
+        self.assertFalse(User.objects.using('shard_1').exists())
+
+    def test_rebalance_shards_moves_users_to_their_placement(self):
+        # Comptes créés avant le partitionnement: tout est sur `default`, sans annuaire
+        with override_settings(SHARDS=['default']):
+            users = [self.create_user(f'ancien{i}') for i in range(6)]
+        self.assertFalse(UserShard.objects.exists())
+        moved = [user for user in users if placement(user.pk) == 'shard_1']
+        self.assertTrue(0 < len(moved) < len(users))
+        copied = sum(sum(self.rows(user.pk, 'default').values()) for user in moved)
+
+        out = io.StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn(f'✓ {len(moved)} utilisateur(s) déplacé(s), {copied} ligne(s) copiée(s)', out.getvalue())
+        for user in users:
+            alias = placement(user.pk)
+            self.assertEqual(shard_for_user(user.pk), alias)
+            self.assertEqual(self.rows(user.pk, alias)['Transaction'], 4)
+        self.assertEqual(set(UserShard.objects.values_list('user_id', flat=True)), {user.pk for user in moved})
+
+        out = io.StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn('✓ 0 utilisateur(s) déplacé(s)', out.getvalue())
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -5,11 +6,12 @@ app_name = 'core'
 
 urlpatterns = [
     # Dashboard
-    path('', views.dashboard_view, name='dashboard'),
+    path('', views.dashboard_async_view if settings.ASYNC_VIEWS else views.dashboard_view, name='dashboard'),
     
     # Transactions
     path('transactions/', views.transaction_list_view, name='transaction_list'),
     path('transactions/add/', views.transaction_create_view, name='transaction_create'),
+    path('transactions/import/', views.transaction_import_view, name='transaction_import'),
     path('transactions/<int:pk>/edit/', views.transaction_update_view, name='transaction_update'),
     path('transactions/<int:pk>/delete/', views.transaction_delete_view, name='transaction_delete'),
     
@@ -24,6 +26,17 @@ urlpatterns = [
     path('budgets/<int:pk>/delete/', views.budget_delete_view, name='budget_delete'),
     
     # Reports
-    path('reports/', views.reports_view, name='reports'),
+    path('reports/', views.reports_async_view if settings.ASYNC_VIEWS else views.reports_view, name='reports'),
+    path('reports/trends/', views.trends_view, name='trends'),
     path('export/csv/', views.export_transactions_csv, name='export_csv'),
+    
+    # Données des graphiques (JSON, ETag)
+    path('charts/monthly/', views.chart_monthly_view, name='chart_monthly'),
+    path('charts/categories/', views.chart_categories_view, name='chart_categories'),
+    path('charts/balance/', views.chart_balance_view, name='chart_balance'),
+    path('charts/report/', views.chart_report_view, name='chart_report'),
+    path('charts/trends/', views.chart_trends_view, name='chart_trends'),
+    
+    # Supervision
+    path('internal/cache-stats/', views.cache_stats_view, name='cache_stats'),
 ]
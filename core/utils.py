@@ -0,0 +1,24 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+
+
+def month_range(value):
+    """Convertit "YYYY-MM" en intervalle [premier jour du mois, premier jour du mois suivant["""
+    try:
+        year, month = map(int, value.split('-'))
+        start = date(year, month, 1)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f"Période invalide: {value!r} (format attendu: YYYY-MM)")
+    return start, start + relativedelta(months=1)
+
+
+def normalize_period(value):
+    """Période "YYYY-MM" canonique (2026-3 -> 2026-03), ou ValueError"""
+    start, _ = month_range(value.strip() if isinstance(value, str) else value)
+    return f'{start.year:04d}-{start.month:02d}'
+
+
+def month_range_filter(value, field='date'):
+    """Filtre de plage utilisable par l'index (field__gte / field__lt) pour un mois "YYYY-MM" """
+    start, end = month_range(value)
+    return {f'{field}__gte': start, f'{field}__lt': end}
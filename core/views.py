@@ -1,106 +1,53 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Q
-from django.http import HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from datetime import datetime, date
-from dateutil.relativedelta import relativedelta
-import csv
 import json
-from decimal import Decimal
 
 from .models import Transaction, Category, Budget
-from .forms import TransactionForm, CategoryForm, BudgetForm, ReportFilterForm
+from .forms import TransactionForm, CategoryForm, BudgetForm, ReportFilterForm, TransactionImportForm
+from .dashboard import dashboard_blocks, dashboard_context, get_monthly_chart, get_category_chart, get_balance_chart
+from .utils import month_range_filter
+from .pagination import KeysetPaginator, InvalidCursor
+from .exports import csv_rows, gzip_stream
+from .importers import import_file
+from .analytics import get_trends
+from .reports import get_report, normalize_filters, report_blocks, report_context
+from .budgets import get_alert_history
+from .search import search_transactions
+from .concurrency import async_login_required, run_concurrently
+from .caching import get_cache_stats, user_etag
+from .routers import replica_reads
+
+TRANSACTIONS_PER_PAGE = 50
+IMPORT_ERRORS_DISPLAYED = 200
+REPORT_TRANSACTIONS_DISPLAYED = 100
+CHART_MAX_MONTHS = 24
 
 
 @login_required
 def dashboard_view(request):
     """Tableau de bord principal"""
-    user = request.user
-    today = date.today()
-    current_month = today.strftime('%Y-%m')
-    
-    # Statistiques du mois en cours
-    current_month_transactions = Transaction.objects.filter(
-        user=user,
-        date__year=today.year,
-        date__month=today.month
-    )
-    
-    income_month = current_month_transactions.filter(type='INCOME').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-    expense_month = current_month_transactions.filter(type='EXPENSE').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-    balance = income_month - expense_month
-    
-    # Solde total (tous les temps)
-    total_income = Transaction.objects.filter(user=user, type='INCOME').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-    total_expense = Transaction.objects.filter(user=user, type='EXPENSE').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-    total_balance = total_income - total_expense
-    
-    # Dernières transactions
-    recent_transactions = Transaction.objects.filter(user=user)[:10]
-    
-    # Budgets avec alertes
-    budgets = Budget.objects.filter(user=user, period=current_month)
-    budget_alerts = [b for b in budgets if b.is_over_threshold()]
-    
-    # Données pour les graphiques (6 derniers mois)
-    months_data = []
-    for i in range(5, -1, -1):
-        month_date = today - relativedelta(months=i)
-        month_str = month_date.strftime('%Y-%m')
-        month_label = month_date.strftime('%b %Y')
-        
-        month_income = Transaction.objects.filter(
-            user=user,
-            type='INCOME',
-            date__year=month_date.year,
-            date__month=month_date.month
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        month_expense = Transaction.objects.filter(
-            user=user,
-            type='EXPENSE',
-            date__year=month_date.year,
-            date__month=month_date.month
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        months_data.append({
-            'label': month_label,
-            'income': float(month_income),
-            'expense': float(month_expense)
-        })
-    
-    # Répartition par catégorie (mois en cours)
-    expense_categories = Category.objects.filter(user=user, type='EXPENSE')
-    category_data = []
-    for cat in expense_categories:
-        cat_total = current_month_transactions.filter(category=cat).aggregate(
-            total=Sum('amount'))['total'] or Decimal('0.00')
-        if cat_total > 0:
-            category_data.append({
-                'name': cat.name,
-                'amount': float(cat_total),
-                'color': cat.color
-            })
-    
-    context = {
-        'income_month': income_month,
-        'expense_month': expense_month,
-        'balance': balance,
-        'total_balance': total_balance,
-        'recent_transactions': recent_transactions,
-        'budget_alerts': budget_alerts,
-        'months_data': months_data,
-        'category_data': category_data,
-    }
-    
+    # Totaux du mois, dernières transactions et alertes (les graphiques sont chargés en JSON)
+    blocks = dashboard_blocks(request.user, date.today())
+    context = dashboard_context({name: block() for name, block in blocks.items()})
     return render(request, 'dashboard.html', context)
 
 
+@async_login_required
+async def dashboard_async_view(request):
+    """Tableau de bord principal, blocs exécutés en parallèle"""
+    blocks = dashboard_blocks(request.user, date.today())
+    context = dashboard_context(await run_concurrently(blocks))
+    return await sync_to_async(render)(request, 'dashboard.html', context)
+
+
 @login_required
 def transaction_list_view(request):
     """Liste des transactions avec filtres"""
@@ -110,6 +57,7 @@ def transaction_list_view(request):
     type_filter = request.GET.get('type')
     category_filter = request.GET.get('category')
     month_filter = request.GET.get('month')
+    search_query = request.GET.get('q', '').strip()
     
     if type_filter:
         transactions = transactions.filter(type=type_filter)
@@ -117,10 +65,12 @@ def transaction_list_view(request):
         transactions = transactions.filter(category_id=category_filter)
     if month_filter:
         try:
-            year, month = map(int, month_filter.split('-'))
-            transactions = transactions.filter(date__year=year, date__month=month)
-        except:
+            transactions = transactions.filter(**month_range_filter(month_filter))
+        except ValueError:
             pass
+    if search_query:
+        # Index plein texte (FTS5 / tsvector), l'ordre par date est conservé
+        transactions = search_transactions(transactions, search_query)
     
     categories = Category.objects.filter(user=request.user)
     # Pré-calcul du selected pour chaque catégorie
@@ -130,25 +80,29 @@ def transaction_list_view(request):
         else:
             cat.selected = ""
     
-    # transactions = Transaction.objects.all()
-
-    for t in transactions:
-        if t.type == "INCOME":
-            t.css_class = "text-success"
-            t.sign = "+"
-        else:
-            t.css_class = "text-danger"
-            t.sign = "-"
-
-    # FORMATAGE DU MONTANT CÔTÉ PYTHON
-    # t.display_amount = f"{t.amount:.2f}"
+    # Pagination par curseur: coût constant quelle que soit la profondeur
+    paginator = KeysetPaginator(transactions.select_related('category'), per_page=TRANSACTIONS_PER_PAGE)
+    try:
+        page = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.get_page()
+    
+    filter_query = urlencode({
+        key: value for key, value in [
+            ('type', type_filter), ('category', category_filter), ('month', month_filter),
+            ('q', search_query),
+        ] if value
+    })
     
     context = {
-        'transactions': transactions,
+        'transactions': page,
+        'page': page,
+        'filter_query': filter_query,
         'categories': categories,
         'type_filter': type_filter,
         'category_filter': category_filter,
         'month_filter': month_filter,
+        'search_query': search_query,
         "is_income": type_filter == "INCOME",
         "is_expense": type_filter == "EXPENSE",
     }
@@ -203,6 +157,37 @@ def transaction_delete_view(request, pk):
     return render(request, 'transactions/delete.html', {'transaction': transaction})
 
 
+@login_required
+def transaction_import_view(request):
+    """Importer un relevé bancaire (CSV, OFX, QIF)"""
+    result = None
+    if request.method == 'POST':
+        form = TransactionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            uploaded = form.cleaned_data['file']
+            result = import_file(
+                request.user,
+                uploaded.file,
+                fmt=form.cleaned_data['format'] or None,
+                filename=uploaded.name,
+                encoding=form.cleaned_data['encoding'],
+                create_categories=form.cleaned_data['create_categories'],
+            )
+            if result.created:
+                messages.success(request, f'{result.created} transaction(s) importée(s) avec succès!')
+            if result.errors:
+                messages.warning(request, f'{len(result.errors)} ligne(s) ignorée(s), voir le rapport ci-dessous.')
+    else:
+        form = TransactionImportForm()
+    
+    return render(request, 'transactions/import.html', {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:IMPORT_ERRORS_DISPLAYED] if result else [],
+        'max_errors': IMPORT_ERRORS_DISPLAYED,
+    })
+
+
 @login_required
 def category_list_view(request):
     """Liste des catégories"""
@@ -230,19 +215,23 @@ def category_create_view(request):
 @login_required
 def budget_list_view(request):
     """Liste des budgets"""
-    budgets = Budget.objects.filter(user=request.user)
+    budgets = Budget.objects.filter(user=request.user).select_related('category')
     
-    # Ajouter les informations de dépenses pour chaque budget
+    # Dépenses et pourcentage enregistrés à chaque écriture de transaction
     budgets_with_data = []
     for budget in budgets:
         budgets_with_data.append({
             'budget': budget,
-            'spent': budget.get_spent_amount(),
-            'percentage': budget.get_percentage_used(),
-            'remaining': budget.amount - budget.get_spent_amount(),
+            'spent': budget.spent_amount,
+            'percentage': budget.percentage_used,
+            'remaining': budget.amount - budget.spent_amount,
         })
     
-    return render(request, 'budgets/list.html', {'budgets_with_data': budgets_with_data})
+    context = {
+        'budgets_with_data': budgets_with_data,
+        'alert_history': get_alert_history(request.user),
+    }
+    return render(request, 'budgets/list.html', context)
 
 
 @login_required
@@ -292,93 +281,138 @@ def budget_delete_view(request, pk):
     return render(request, 'budgets/delete.html', {'budget': budget})
 
 
+def report_filters(user, form):
+    """Transactions filtrées et filtres normalisés d'un formulaire de rapport"""
+    transactions = Transaction.objects.filter(user=user)
+    if form.is_valid():
+        return form.filter_queryset(transactions), normalize_filters(form.cleaned_data)
+    return transactions, {}
+
+
 @login_required
+@replica_reads
 def reports_view(request):
     """Vue des rapports et analyses"""
-    user = request.user
-    form = ReportFilterForm(user=user, data=request.GET or None)
-    
-    # Filtres par défaut: mois en cours
-    transactions = Transaction.objects.filter(user=user)
-    
-    if form.is_valid():
-        if form.cleaned_data.get('start_date'):
-            transactions = transactions.filter(date__gte=form.cleaned_data['start_date'])
-        if form.cleaned_data.get('end_date'):
-            transactions = transactions.filter(date__lte=form.cleaned_data['end_date'])
-        if form.cleaned_data.get('category'):
-            transactions = transactions.filter(category=form.cleaned_data['category'])
-        if form.cleaned_data.get('type'):
-            transactions = transactions.filter(type=form.cleaned_data['type'])
-    
-    # Statistiques
-    total_income = transactions.filter(type='INCOME').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-    total_expense = transactions.filter(type='EXPENSE').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-    net_balance = total_income - total_expense
-    
-    # Répartition par catégorie
-    categories_income = []
-    categories_expense = []
-    
-    for cat in Category.objects.filter(user=user, type='INCOME'):
-        cat_total = transactions.filter(category=cat).aggregate(
-            total=Sum('amount'))['total'] or Decimal('0.00')
-        if cat_total > 0:
-            categories_income.append({
-                'name': cat.name,
-                'amount': float(cat_total),
-                'color': cat.color
-            })
-    
-    for cat in Category.objects.filter(user=user, type='EXPENSE'):
-        cat_total = transactions.filter(category=cat).aggregate(
-            total=Sum('amount'))['total'] or Decimal('0.00')
-        if cat_total > 0:
-            categories_expense.append({
-                'name': cat.name,
-                'amount': float(cat_total),
-                'color': cat.color
-            })
-
-    # categories_income_json = json.dumps(categories_income)
-    # categories_expense_json = json.dumps(categories_expense)
+    form = ReportFilterForm(user=request.user, data=request.GET or None)
+    transactions, filters = report_filters(request.user, form)
     
+    # Totaux et répartition par catégorie, en cache tant que les données ne changent pas
+    blocks = report_blocks(request.user, transactions, filters, REPORT_TRANSACTIONS_DISPLAYED)
+    context = report_context(form, {name: block() for name, block in blocks.items()})
+    return render(request, 'reports/reports.html', context)
+
+
+@async_login_required
+@replica_reads
+async def reports_async_view(request):
+    """Vue des rapports, agrégats et liste exécutés en parallèle"""
+    form = ReportFilterForm(user=request.user, data=request.GET or None)
+    # La validation interroge les catégories: elle reste sur le thread de la requête
+    transactions, filters = await sync_to_async(report_filters)(request.user, form)
+    
+    blocks = report_blocks(request.user, transactions, filters, REPORT_TRANSACTIONS_DISPLAYED)
+    context = report_context(form, await run_concurrently(blocks))
+    return await sync_to_async(render)(request, 'reports/reports.html', context)
+
+
+@login_required
+@replica_reads
+def trends_view(request):
+    """Tendances: dépenses glissantes, variations mensuelles, moyennes par catégorie"""
+    trends = get_trends(request.user, date.today())
+    months = trends['months']
     context = {
-        'form': form,
-        'transactions': transactions,
-        'total_income': total_income,
-        'total_expense': total_expense,
-        'net_balance': net_balance,
-        'categories_income': categories_income,
-        'categories_expense': categories_expense,
-        # 'categories_income': categories_income_json,
-        # 'categories_expense': categories_expense_json,
+        'latest': trends['daily'][-1] if trends['daily'] else None,
+        'months': months[::-1],
+        'current_month': months[-1] if months else None,
+        'categories': trends['categories'],
     }
-    
-    return render(request, 'reports/reports.html', context)
+    return render(request, 'reports/trends.html', context)
 
 
 @login_required
+@replica_reads
 def export_transactions_csv(request):
-    """Exporter les transactions en CSV"""
-    transactions = Transaction.objects.filter(user=request.user).order_by('-date')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
-    response.write('\ufeff')  # BOM pour Excel
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Type', 'Catégorie', 'Montant', 'Description'])
-    
-    for trans in transactions:
-        writer.writerow([
-            trans.date.strftime('%Y-%m-%d'),
-            trans.get_type_display(),
-            trans.category.name if trans.category else '',
-            str(trans.amount),
-            trans.description
-        ])
-    
+    """Exporter les transactions en CSV (flux, filtres identiques aux rapports)"""
+    transactions = Transaction.objects.filter(user=request.user)
+    form = ReportFilterForm(user=request.user, data=request.GET or None)
+    if form.is_bound and not form.is_valid():
+        # Jamais d'export complet à la place d'un export filtré
+        return HttpResponseBadRequest(
+            f"Filtres invalides:\n{form.errors.as_text()}", content_type='text/plain; charset=utf-8'
+        )
+    if form.is_bound:
+        transactions = form.filter_queryset(transactions)
+    
+    rows = csv_rows(transactions)
+    if request.GET.get('compress') == 'gzip':
+        response = StreamingHttpResponse(gzip_stream(rows), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="transactions.csv.gz"'
+    else:
+        response = StreamingHttpResponse(rows, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
     return response
+
+
+def chart_etag(request, *args, **kwargs):
+    """ETag des données de graphique: version des données, paramètres et jour courant"""
+    return user_etag(
+        request.user.pk,
+        request.resolver_match.url_name,
+        {'query': sorted(request.GET.lists()), 'today': date.today()},
+    )
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chart_etag)
+def chart_monthly_view(request):
+    """Revenus et dépenses des derniers mois (JSON)"""
+    try:
+        months = min(max(int(request.GET.get('months', 6)), 1), CHART_MAX_MONTHS)
+    except ValueError:
+        months = 6
+    return JsonResponse({'months': get_monthly_chart(request.user, date.today(), months)})
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chart_etag)
+def chart_categories_view(request):
+    """Dépenses du mois en cours par catégorie (JSON)"""
+    return JsonResponse({'categories': get_category_chart(request.user, date.today())})
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chart_etag)
+def chart_balance_view(request):
+    """Solde en fin de mois sur toute la durée du compte (JSON)"""
+    return JsonResponse({'months': get_balance_chart(request.user, date.today())})
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chart_etag)
+@replica_reads
+def chart_report_view(request):
+    """Répartition des revenus et dépenses par catégorie, filtres des rapports (JSON)"""
+    form = ReportFilterForm(user=request.user, data=request.GET or None)
+    transactions, filters = report_filters(request.user, form)
+    report = get_report(request.user, transactions, filters)
+    return JsonResponse({'income': report['categories_income'], 'expense': report['categories_expense']})
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chart_etag)
+@replica_reads
+def chart_trends_view(request):
+    """Séries de la page Tendances (JSON)"""
+    return JsonResponse(get_trends(request.user, date.today()))
+
+
+@staff_member_required
+def cache_stats_view(request):
+    """Compteurs du cache de ce processus (supervision)"""
+    return JsonResponse(get_cache_stats())
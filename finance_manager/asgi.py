@@ -3,6 +3,11 @@ ASGI config for finance_manager project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+ASGI is opt-in: the Procfile serves finance_manager.wsgi. To serve this
+module instead (uvicorn and uvicorn-worker are in requirements.txt):
+
+    gunicorn finance_manager.asgi:application -k uvicorn_worker.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +17,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finance_manager.settings')
+# Sous ASGI, le tableau de bord et les rapports exécutent leurs requêtes en parallèle
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -66,8 +67,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.SQLInstrumentationMiddleware',
+    'core.middleware.PrimaryPinningMiddleware',
+    'core.middleware.ShardMiddleware',
 ]
 
+# Instrumentation SQL par requête (en-tête Server-Timing + journal core.sql)
+SQL_INSTRUMENTATION = os.environ.get("SQL_INSTRUMENTATION", "False") == "True"
+SQL_INSTRUMENTATION_QUERY_THRESHOLD = int(os.environ.get("SQL_INSTRUMENTATION_QUERY_THRESHOLD", 50))
+SQL_INSTRUMENTATION_HEADERS = os.environ.get("SQL_INSTRUMENTATION_HEADERS", "True") == "True"
+
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 
@@ -83,6 +92,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.currency',
             ],
         },
     },
@@ -90,6 +100,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'finance_manager.wsgi.application'
 
+# Vues asynchrones du tableau de bord et des rapports (activées par finance_manager.asgi)
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -101,6 +114,118 @@ DATABASES = {
     )
 }
 
+# Réplica en lecture seule pour les rapports, tendances et exports (core.routers)
+READ_REPLICA_URL = os.environ.get("READ_REPLICA_URL")
+# Durée pendant laquelle un utilisateur qui vient d'écrire lit le primaire
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 10))
+
+DATABASE_ROUTERS = []
+
+if READ_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(READ_REPLICA_URL, conn_max_age=600)
+    # Les tests n'ont qu'une base: le réplica y pointe
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS.append('core.routers.ReadReplicaRouter')
+
+# Shards des données financières, en plus de `default` (core.sharding): URLs séparées par des virgules
+SHARD_DATABASE_URLS = [url.strip() for url in os.environ.get("SHARD_DATABASE_URLS", "").split(",") if url.strip()]
+SHARDS = ['default']
+
+for index, url in enumerate(SHARD_DATABASE_URLS, start=1):
+    DATABASES[f'shard_{index}'] = dj_database_url.parse(url, conn_max_age=600)
+    SHARDS.append(f'shard_{index}')
+
+if SHARD_DATABASE_URLS:
+    # Avant le réplica: les modèles partitionnés ne sont jamais lus sur le réplica, le reste lui est laissé
+    DATABASE_ROUTERS.insert(0, 'core.sharding.ShardRouter')
+
+
+# Cache
+# locmem: mémoire du processus, un seul processus uniquement (runserver, tests).
+# Chaque worker gunicorn aurait ses propres versions des données: un worker
+# servirait des tableaux de bord, rapports et ETags périmés après une écriture
+# traitée par un autre. En production multi-workers, définir REDIS_URL (redis
+# devient le défaut) ou utiliser file/db (db nécessite `python manage.py createcachetable`)
+
+REDIS_URL = os.environ.get("REDIS_URL", "")
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "redis" if REDIS_URL else "locmem")
+CACHE_TIMEOUT = int(os.environ.get("CACHE_TIMEOUT", 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 5000))
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'finance-manager',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL or 'redis://127.0.0.1:6379/0',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get("CACHE_LOCATION", str(BASE_DIR / '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.environ.get("CACHE_LOCATION", 'finance_cache'),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+}
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': CACHE_TIMEOUT,
+    }
+}
+
+# L'annuaire des shards est mis en cache sans expiration (core.sharding): avec
+# locmem, après rebalance_shards les autres processus enverraient encore
+# l'utilisateur déplacé vers son ancien shard
+if SHARD_DATABASE_URLS and CACHE_BACKEND == 'locmem':
+    raise ImproperlyConfigured(
+        "SHARD_DATABASE_URLS nécessite un cache partagé entre les processus: définissez REDIS_URL "
+        "ou CACHE_BACKEND=file/db"
+    )
+
+
+# Chemin des requêtes: sessions en cache (repli en base) et utilisateur de la
+# session relu depuis le cache avec son profil (accounts.backends).
+# Désactivé par défaut: une déconnexion, un changement de mot de passe ou une
+# désactivation ne retirent l'entrée que du cache qui les a traités. Avec un
+# cache propre à chaque worker, les autres continueraient d'accepter l'ancienne
+# session jusqu'à CACHE_TIMEOUT: seul Redis (partagé) est donc accepté.
+
+REQUEST_CACHE = os.environ.get("REQUEST_CACHE", "False") == "True"
+
+if REQUEST_CACHE:
+    if CACHE_BACKEND != 'redis':
+        raise ImproperlyConfigured(
+            "REQUEST_CACHE=True nécessite un cache partagé entre les workers: définissez REDIS_URL"
+        )
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTHENTICATION_BACKENDS = ['accounts.backends.CachedModelBackend']
+
+
+# Logging
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.sql': {
+            'handlers': ['console'],
+            'level': os.environ.get("SQL_LOG_LEVEL", "INFO"),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
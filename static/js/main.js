@@ -1,5 +1,16 @@
 // Finance Manager - Main JavaScript
 
+// Données d'un graphique servies en JSON (revalidées par ETag par le navigateur)
+function fetchChartData(url) {
+    return fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Graphique indisponible (${response.status})`);
+            }
+            return response.json();
+        });
+}
+
 document.addEventListener('DOMContentLoaded', function () {
     // Auto-dismiss alerts after 5 seconds
     const alerts = document.querySelectorAll('.alert');